@@ -18,6 +18,9 @@ SUPABASE_SERVICE_KEY = os.getenv('SUPABASE_SERVICE_KEY')
 # Gemini LLM configuration
 GOOGLE_GEMINI_API_KEY = os.getenv('GOOGLE_GEMINI_API_KEY')
 
+# Local state (ledgers, caches, snapshots) written by the app
+LOCAL_DATA_DIR = os.getenv('LOCAL_DATA_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data'))
+
 # Initialize Supabase client
 def get_supabase_client(service_key=False):
     """Get Supabase client with appropriate key"""
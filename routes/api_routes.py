@@ -1,30 +1,54 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from supabase import create_client, Client
 import os
+import importlib.util
 from datetime import datetime, timedelta
 import logging
 import pandas as pd
+import numpy as np
 import re
 import time
 import threading
 import traceback
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
-import tempfile
-import uuid
 from werkzeug.utils import secure_filename
 import json
+from services.pdf_extraction import read_upload, extract_pages, read_zip_pdfs, InvalidArchiveError
+from services.llm_extraction import extract_transactions, make_gemini_generator, merge_transactions
+from services.broker_parsers import parse_statement
+from services.myprofit_client import submit_transactions
+from services.evolution_series import (
+    get_series as get_evolution_series, downsample as downsample_evolution,
+    EVOLUTION_DEFAULT_POINTS, EVOLUTION_MAX_POINTS
+)
+from services.risk_metrics import compute_risk, memoized as memoized_risk
+from services.projection_engine import estimate_inputs as projection_inputs, project as project_patrimony
+from services.position_engine import update_book, position_rows
+from services.ir_calculator import monthly_tax, annual_report
+from services.dividend_index import get_index as get_dividend_index
+from services.dividend_calendar import get_calendar as get_dividend_calendar, resolve_range, summarize as summarize_calendar
+from services.dividend_forecast import update_state as update_dividend_forecast, forecast as forecast_dividends
+from services.composition_engine import get_cube as get_composition_cube, cached_cube, COMPOSITION_LEVELS
+from services.rebalance_engine import rebalance, target_vector
+from services.performance_engine import compute_performance, get_cached_performance, allocate_flows
+from services.benchmark_store import get_benchmark, available_benchmarks, store_version as benchmark_store_version
+from services.renda_fixa_cache import get_featured_investments
+from services.renda_fixa_history import rate_series, offer_versions
+from services.renda_fixa_index import get_offer_index, MAX_PER_PAGE as OFFERS_MAX_PER_PAGE
+from services.renda_fixa_engine import simulate as simulate_renda_fixa, simulate_grid as simulate_renda_fixa_grid
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
-# LLM and PDF imports
+# LLM and PDF support (os módulos são importados em services/pdf_extraction e services/llm_extraction)
 try:
-    import PyPDF2
-    import google.generativeai as genai
-    HAVE_LLM_SUPPORT = True
+    HAVE_LLM_SUPPORT = all(importlib.util.find_spec(name) for name in ('PyPDF2', 'google.generativeai'))
 except ImportError:
+    # find_spec de um submódulo importa o pacote pai ('google')
     HAVE_LLM_SUPPORT = False
+if not HAVE_LLM_SUPPORT:
     logger.warning("LLM support not available - install PyPDF2 and google-generativeai for full functionality")
 
 # Cache simples para otimizar performance
@@ -87,6 +111,8 @@ def execute_optimized_query(table_name, select_clause='*', filters=None, order_b
                         query = query.eq(field, value)
                     elif filter_type == 'gte':
                         query = query.gte(field, value)
+                    elif filter_type == 'gt':
+                        query = query.gt(field, value)
                     elif filter_type == 'lte':
                         query = query.lte(field, value)
                     elif filter_type == 'ilike':
@@ -145,6 +171,8 @@ def execute_optimized_query(table_name, select_clause='*', filters=None, order_b
                         query = query.eq(field, value)
                     elif filter_type == 'gte':
                         query = query.gte(field, value)
+                    elif filter_type == 'gt':
+                        query = query.gt(field, value)
                     elif filter_type == 'lte':
                         query = query.lte(field, value)
                     elif filter_type == 'ilike':
@@ -187,6 +215,15 @@ else:
 # Create blueprint
 api_bp = Blueprint('api', __name__)
 
+def _data_version(tables):
+    """Cheap fingerprint of tables: (row count, latest marker) per table"""
+    version = []
+    for table_name, marker in tables:
+        response = supabase.table(table_name).select(marker, count='exact').order(marker, desc=True).limit(1).execute()
+        latest = response.data[0][marker] if response.data else None
+        version.append((table_name, response.count, latest))
+    return tuple(version)
+
 @api_bp.route('/summary', methods=['GET'])
 @smart_cache(ttl=30)
 @optimized_cache_headers
@@ -386,41 +423,157 @@ def get_portfolio_details():
 @api_bp.route('/portfolio/evolution', methods=['GET'])
 @optimized_cache_headers
 def get_portfolio_evolution():
-    """Get portfolio evolution over time"""
+    """Get portfolio evolution over time.
+
+    Query params: from, to (ISO dates), fields (comma separated),
+    resolution (daily|weekly|monthly|auto) and points (max points for auto,
+    LTTB over total_patrimony). Weekly/monthly keep the last row of each period.
+    """
     try:
-        response = execute_optimized_query('portfolio_evolution', '*', order_by='reference_date')
-        return jsonify(response.data)
+        _, series = _evolution_series()
+        
+        fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+        points = min(max(request.args.get('points', EVOLUTION_DEFAULT_POINTS, type=int), 3), EVOLUTION_MAX_POINTS)
+        rows = downsample_evolution(
+            series,
+            start=request.args.get('from'),
+            end=request.args.get('to'),
+            fields=fields or None,
+            resolution=request.args.get('resolution', 'daily'),
+            points=points
+        )
+        return jsonify(rows)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error getting portfolio evolution: {e}")
         return jsonify({'error': 'Failed to get portfolio evolution'}), 500
 
+def _evolution_series():
+    """Cached portfolio_evolution arrays for the current data version"""
+    version = _data_version([('portfolio_evolution', 'updated_at')])
+    series = get_evolution_series(
+        version,
+        lambda: execute_optimized_query('portfolio_evolution', '*', order_by='reference_date').data
+    )
+    return version, series
+
+@api_bp.route('/portfolio/risk', methods=['GET'])
+@optimized_cache_headers
+def get_portfolio_risk():
+    """Volatility, max drawdown, rolling 12m return and Sharpe/Sortino over portfolio_evolution.
+
+    Query params: from, to (ISO dates), window (rolling volatility window in
+    periods), rf (cdi = excess over cdi_acum_perc, none = raw returns).
+    Contributions from transactions are stripped from the returns.
+    """
+    try:
+        start, end = request.args.get('from'), request.args.get('to')
+        window = request.args.get('window', type=int)
+        risk_free = request.args.get('rf', 'cdi')
+        
+        evolution_version, series = _evolution_series()
+        version = evolution_version + _data_version([('transactions', 'updated_at')])
+        
+        def compute():
+            lo, hi = series.window(start, end)
+            dates = series.dates[lo:hi]
+            values = series.columns['total_patrimony'][lo:hi]
+            
+            transactions = execute_optimized_query('transactions', 'transaction_date, total_value, type').data
+            flow_dates = [tx['transaction_date'][:10] for tx in transactions if tx.get('transaction_date')]
+            flow_amounts = [
+                (-1 if tx.get('type') == 'Venda' else 1) * abs(float(tx.get('total_value') or 0))
+                for tx in transactions if tx.get('transaction_date')
+            ]
+            flows = allocate_flows(dates, flow_dates, flow_amounts)
+            
+            rf_returns = None
+            if risk_free == 'cdi' and 'cdi_acum_perc' in series.columns:
+                cdi_index = 1 + np.nan_to_num(series.columns['cdi_acum_perc'][lo:hi]) / 100
+                rf_returns = np.concatenate([[0.0], cdi_index[1:] / cdi_index[:-1] - 1])
+            return compute_risk(dates, values, flows, rf_returns, window)
+        
+        result = memoized_risk((version, start, end, window, risk_free), compute)
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting portfolio risk: {e}")
+        return jsonify({'error': 'Failed to get portfolio risk'}), 500
+
+@api_bp.route('/portfolio/projection', methods=['GET'])
+@optimized_cache_headers
+def get_portfolio_projection():
+    """Monte Carlo projection of total_patrimony with percentile bands.
+
+    Query params: years (horizon, default 10), paths (default 10000), seed,
+    method (bootstrap = resample historical monthly returns, normal),
+    reinvest (1/0, reinvest the trailing dividend yield), contribution
+    (monthly contribution override; defaults to the last 12 months' average).
+    """
+    try:
+        years = request.args.get('years', 10, type=float)
+        paths = request.args.get('paths', 10000, type=int)
+        seed = request.args.get('seed', type=int)
+        method = request.args.get('method', 'bootstrap')
+        reinvest = request.args.get('reinvest', '1') != '0'
+        contribution = request.args.get('contribution', type=float)
+        
+        evolution_version, series = _evolution_series()
+        version = evolution_version + _data_version([('transactions', 'updated_at'), ('dividends', 'updated_at')])
+        
+        def load_inputs():
+            transactions = execute_optimized_query('transactions', 'transaction_date, total_value, type').data
+            transactions = [tx for tx in transactions if tx.get('transaction_date')]
+            dividends = execute_optimized_query('dividends', 'payment_date, net_value').data
+            today = datetime.now().date()
+            # Só dividendos já pagos entram no yield
+            dividends = [d for d in dividends if d.get('payment_date') and d['payment_date'][:10] <= today.isoformat()]
+            return projection_inputs(
+                series.dates,
+                series.columns['total_patrimony'],
+                [tx['transaction_date'][:10] for tx in transactions],
+                [(-1 if tx.get('type') == 'Venda' else 1) * abs(float(tx.get('total_value') or 0)) for tx in transactions],
+                [d['payment_date'][:10] for d in dividends],
+                [float(d.get('net_value') or 0) for d in dividends],
+                today
+            )
+        
+        inputs = dict(memoized_risk(('projection_inputs', version), load_inputs))
+        if contribution is not None:
+            inputs['monthly_contribution'] = contribution
+        
+        def compute():
+            return project_patrimony(inputs, round(years * 12), paths, seed, method, reinvest)
+        
+        # Sem seed o resultado é aleatório a cada chamada: só memoiza projeções reprodutíveis
+        if seed is None:
+            result = compute()
+        else:
+            result = memoized_risk(('projection', version, years, paths, seed, method, reinvest, contribution), compute)
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error projecting portfolio: {e}")
+        return jsonify({'error': 'Failed to project portfolio'}), 500
+
+def _dividends_rollup():
+    """Rows of the trigger-maintained dividends_monthly_rollup (sql/dividends_monthly_rollup.sql)"""
+    return execute_optimized_query('dividends_monthly_rollup', 'ticker, month, paid_value, pending_value, paid_count',
+                                   order_by='month').data
+
 @api_bp.route('/dividends/monthly', methods=['GET'])
 @optimized_cache_headers
 def get_dividends_monthly():
     """Get monthly dividends aggregated data with paid/pending status"""
     try:
-        from datetime import datetime, date
-        
-        # Get all dividends
-        response = execute_optimized_query('dividends', 'payment_date, net_value', order_by='payment_date')
-        
         monthly_data = {}
-        today = date.today()
-        
-        for dividend in response.data:
-            payment_date = dividend['payment_date']
-            if payment_date:
-                month_key = payment_date[:7]  # YYYY-MM
-                net_value = float(dividend['net_value'] or 0)
-                
-                # Determine status based on payment date
-                payment_date_obj = datetime.strptime(payment_date, '%Y-%m-%d').date()
-                status = 'Pago' if payment_date_obj <= today else 'A Pagar'
-                
-                if month_key not in monthly_data:
-                    monthly_data[month_key] = {'Pago': 0, 'A Pagar': 0}
-                
-                monthly_data[month_key][status] += net_value
+        for row in _dividends_rollup():
+            totals = monthly_data.setdefault(row['month'], {'Pago': 0, 'A Pagar': 0})
+            totals['Pago'] += float(row['paid_value'] or 0)
+            totals['A Pagar'] += float(row['pending_value'] or 0)
         
         return jsonify(monthly_data)
     except Exception as e:
@@ -432,54 +585,37 @@ def get_dividends_monthly():
 def get_dividends_annual_summary():
     """Get annual dividends summary with paid/pending status"""
     try:
-        from datetime import datetime, date
-        
-        # Get all dividends
-        response = execute_optimized_query('dividends', 'payment_date, net_value', order_by='payment_date')
-        
         annual_data = {}
-        today = date.today()
-        
-        for dividend in response.data:
-            payment_date = dividend['payment_date']
-            if payment_date:
-                year = payment_date[:4]
-                net_value = float(dividend['net_value'] or 0)
-                
-                # Determine status based on payment date
-                payment_date_obj = datetime.strptime(payment_date, '%Y-%m-%d').date()
-                status = 'Pago' if payment_date_obj <= today else 'A Pagar'
-                
-                if year not in annual_data:
-                    annual_data[year] = {'Pago': 0, 'A Pagar': 0}
-                
-                annual_data[year][status] += net_value
+        for row in _dividends_rollup():
+            totals = annual_data.setdefault(row['month'][:4], {'Pago': 0, 'A Pagar': 0})
+            totals['Pago'] += float(row['paid_value'] or 0)
+            totals['A Pagar'] += float(row['pending_value'] or 0)
         
         return jsonify(annual_data)
     except Exception as e:
         logger.error(f"Error getting annual dividends summary: {e}")
         return jsonify({'error': 'Failed to get annual dividends summary'}), 500
 
+def _transactions_monthly(transaction_type):
+    """Rows of the trigger-maintained transactions_monthly rollup (sql/transactions_monthly.sql)"""
+    return execute_optimized_query('transactions_monthly', 'month, category_l1, total_value, transaction_count',
+                                   filters=[('eq', 'type', transaction_type)], order_by='month').data
+
+def _monthly_totals(rows, exclude_category=None):
+    """{YYYY-MM: total} from rollup rows, optionally skipping one category_l1"""
+    monthly_data = {}
+    for row in rows:
+        if exclude_category and row['category_l1'] == exclude_category:
+            continue
+        monthly_data[row['month']] = monthly_data.get(row['month'], 0) + float(row['total_value'] or 0)
+    return monthly_data
+
 @api_bp.route('/transactions/monthly-contributions', methods=['GET'])
 @optimized_cache_headers
 def get_monthly_contributions():
     """Get monthly contributions (purchases) data"""
     try:
-        response = execute_optimized_query('transactions', 'transaction_date, total_value', 
-                                     filters=[('eq', 'type', 'Compra')], 
-                                     order_by='transaction_date')
-        
-        monthly_data = {}
-        for transaction in response.data:
-            transaction_date = transaction['transaction_date']
-            if transaction_date:
-                month_key = transaction_date[:7]  # YYYY-MM
-                if month_key in monthly_data:
-                    monthly_data[month_key] += float(transaction['total_value'] or 0)
-                else:
-                    monthly_data[month_key] = float(transaction['total_value'] or 0)
-        
-        return jsonify(monthly_data)
+        return jsonify(_monthly_totals(_transactions_monthly('Compra')))
     except Exception as e:
         logger.error(f"Error getting monthly contributions: {e}")
         return jsonify({'error': 'Failed to get monthly contributions'}), 500
@@ -1111,19 +1247,13 @@ def get_monthly_investment():
 def get_yearly_investment_average():
     """Get yearly average investment amounts"""
     try:
-        response = execute_optimized_query('transactions', 'transaction_date, total_value', 
-                                     filters=[('eq', 'type', 'Compra')], 
-                                     order_by='transaction_date')
-        
         yearly_data = {}
-        for transaction in response.data:
-            if transaction['transaction_date']:
-                year = transaction['transaction_date'][:4]
-                if year not in yearly_data:
-                    yearly_data[year] = {'total': 0, 'months': set()}
-                yearly_data[year]['total'] += float(transaction['total_value'] or 0)
-                month = transaction['transaction_date'][:7]  # YYYY-MM
-                yearly_data[year]['months'].add(month)
+        for row in _transactions_monthly('Compra'):
+            year = row['month'][:4]
+            if year not in yearly_data:
+                yearly_data[year] = {'total': 0, 'months': set()}
+            yearly_data[year]['total'] += float(row['total_value'] or 0)
+            yearly_data[year]['months'].add(row['month'])
         
         # Calculate averages
         yearly_averages = []
@@ -1470,31 +1600,16 @@ def get_dividends_detailed_paginated():
 def get_dividends_by_category():
     """Get dividends grouped by asset category"""
     try:
-        from datetime import datetime, date
-        
-        # Get all dividends with asset category information
-        dividends_response = execute_optimized_query('dividends', 'ticker, net_value, payment_date')
         categories_response = execute_optimized_query('asset_categories', 'ticker, meta_category')
-        
         category_map = {cat['ticker']: cat['meta_category'] for cat in categories_response.data}
-        category_totals = {}
-        today = date.today()
         
-        for dividend in dividends_response.data:
-            ticker = dividend['ticker']
-            value = float(dividend['net_value'] or 0)
-            payment_date = dividend['payment_date']
-            
-            if payment_date:
-                payment_date_obj = datetime.strptime(payment_date, '%Y-%m-%d').date()
-                # Only count paid dividends
-                if payment_date_obj <= today:
-                    category = category_map.get(ticker, 'Outros')
-                    
-                    if category in category_totals:
-                        category_totals[category] += value
-                    else:
-                        category_totals[category] = value
+        # Only count paid dividends
+        category_totals = {}
+        for row in _dividends_rollup():
+            if not row['paid_count']:
+                continue
+            category = category_map.get(row['ticker'] or None, 'Outros')
+            category_totals[category] = category_totals.get(category, 0) + float(row['paid_value'] or 0)
         
         return jsonify(category_totals)
     except Exception as e:
@@ -1506,13 +1621,8 @@ def get_dividends_by_category():
 def get_dividends_by_asset():
     """Get dividends grouped by individual asset (ticker)"""
     try:
-        from datetime import datetime, date
-        
         category_filter = request.args.get('category', '')
         
-        # Get all dividends
-        dividends_response = execute_optimized_query('dividends', 'ticker, net_value, payment_date')
-        
         # If category filter is specified, get only tickers from that category
         if category_filter:
             categories_response = execute_optimized_query('asset_categories', 'ticker, meta_category', 
@@ -1521,24 +1631,14 @@ def get_dividends_by_asset():
         else:
             allowed_tickers = None
         
+        # Only count paid dividends (ticker vazio no consolidado = dividendo sem ticker)
         asset_totals = {}
-        today = date.today()
-        
-        for dividend in dividends_response.data:
-            ticker = dividend['ticker']
-            value = float(dividend['net_value'] or 0)
-            payment_date = dividend['payment_date']
-            
-            if payment_date:
-                payment_date_obj = datetime.strptime(payment_date, '%Y-%m-%d').date()
-                # Only count paid dividends
-                if payment_date_obj <= today:
-                    # Apply category filter
-                    if allowed_tickers is None or ticker in allowed_tickers:
-                        if ticker in asset_totals:
-                            asset_totals[ticker] += value
-                        else:
-                            asset_totals[ticker] = value
+        for row in _dividends_rollup():
+            if not row['paid_count']:
+                continue
+            ticker = row['ticker'] or None
+            if allowed_tickers is None or ticker in allowed_tickers:
+                asset_totals[ticker] = asset_totals.get(ticker, 0) + float(row['paid_value'] or 0)
         
         return jsonify(asset_totals)
     except Exception as e:
@@ -1550,7 +1650,7 @@ def get_dividends_by_asset():
 def get_dividends_stats():
     """Get dividend statistics for cards"""
     try:
-        from datetime import datetime, date, timedelta
+        from datetime import date, timedelta
         
         today = date.today()
         current_month = today.strftime('%Y-%m')
@@ -1560,63 +1660,35 @@ def get_dividends_stats():
         next_month_date = next_month_date.replace(day=1)
         next_month = next_month_date.strftime('%Y-%m')
         
-        # Calculate 12 months ago
-        twelve_months_ago = today - timedelta(days=365)
-        
-        # Get all dividends
-        response = execute_optimized_query('dividends', 'payment_date, net_value')
+        # Janela de 12 meses em meses inteiros do consolidado: mês atual e os 11 anteriores
+        first_month_number = today.year * 12 + today.month - 12
+        first_month = f'{first_month_number // 12:04d}-{first_month_number % 12 + 1:02d}'
         
-        # Initialize stats
-        stats = {
-            'monthly_average_12m': 0,
-            'total_last_12m': 0,
-            'total_current_month': 0,
-            'total_next_month': 0
-        }
-        
-        # Calculate stats
         last_12m_data = {}
-        current_month_total = 0
+        current_month_paid = 0
         next_month_total = 0
         
-        for dividend in response.data:
-            payment_date = dividend['payment_date']
-            if payment_date:
-                payment_date_obj = datetime.strptime(payment_date, '%Y-%m-%d').date()
-                value = float(dividend['net_value'] or 0)
-                month_key = payment_date[:7]  # YYYY-MM
-                
-                # Current month total (both paid and pending)
-                if month_key == current_month:
-                    current_month_total += value
-                
-                # Next month total (will be pending)
-                if month_key == next_month:
-                    next_month_total += value
-                
-                # Last 12 months (only paid)
-                if payment_date_obj <= today and payment_date_obj >= twelve_months_ago:
-                    if month_key not in last_12m_data:
-                        last_12m_data[month_key] = 0
-                    last_12m_data[month_key] += value
+        for row in _dividends_rollup():
+            month_key = row['month']
+            paid = float(row['paid_value'] or 0)
+            
+            # Current month: only paid dividends
+            if month_key == current_month:
+                current_month_paid += paid
+            
+            # Next month total (paid and pending)
+            if month_key == next_month:
+                next_month_total += paid + float(row['pending_value'] or 0)
+            
+            # Last 12 months (only paid)
+            if first_month <= month_key <= current_month and row['paid_count']:
+                last_12m_data[month_key] = last_12m_data.get(month_key, 0) + paid
         
         # Calculate 12 months totals and average
         total_last_12m = sum(last_12m_data.values())
         months_with_data = len(last_12m_data)
         monthly_average_12m = total_last_12m / months_with_data if months_with_data > 0 else 0
         
-        # Only count paid dividends for current month
-        current_month_paid = 0
-        for dividend in response.data:
-            payment_date = dividend['payment_date']
-            if payment_date:
-                payment_date_obj = datetime.strptime(payment_date, '%Y-%m-%d').date()
-                value = float(dividend['net_value'] or 0)
-                month_key = payment_date[:7]
-                
-                if month_key == current_month and payment_date_obj <= today:
-                    current_month_paid += value
-        
         stats = {
             'monthly_average_12m': monthly_average_12m,
             'total_last_12m': total_last_12m,
@@ -1629,6 +1701,121 @@ def get_dividends_stats():
         logger.error(f"Error getting dividends stats: {e}")
         return jsonify({'error': 'Failed to get dividends stats'}), 500
 
+@api_bp.route('/dividends/forecast', methods=['GET'])
+@optimized_cache_headers
+def get_dividends_forecast():
+    """Projected dividend income for the next months per ticker, category and month.
+
+    Query params: months (default 12), group (category level, default
+    category_l1), rebuild (1 refits every ticker from the full history).
+    """
+    try:
+        months = request.args.get('months', 12, type=int)
+        group_field = request.args.get('group', 'category_l1')
+        if group_field not in COMPOSITION_LEVELS:
+            return jsonify({'error': f'Nível inválido: {group_field}'}), 400
+        
+        (_, total_count, last_updated), = _data_version([('dividends', 'updated_at')])
+        fields = 'id, ticker, payment_date, net_value, updated_at'
+        state = update_dividend_forecast(
+            total_count or 0,
+            last_updated,
+            fetch_changed=lambda since: execute_optimized_query('dividends', fields, filters=[('gt', 'updated_at', since)]).data,
+            fetch_all=lambda: execute_optimized_query('dividends', fields).data,
+            rebuild=request.args.get('rebuild') == '1'
+        )
+        
+        # Só projeta pagamentos futuros para ativos ainda em carteira
+        assets = execute_optimized_query('assets', 'ticker, total_symbols, total_market_value').data
+        held = {asset['ticker'] for asset in assets
+                if float(asset.get('total_symbols') or 0) > 0 or float(asset.get('total_market_value') or 0) > 0}
+        categories = {cat['ticker']: cat for cat in execute_optimized_query('asset_categories', f'ticker, {group_field}').data}
+        
+        result = forecast_dividends(state, months, held, categories, group_field)
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error forecasting dividends: {e}")
+        return jsonify({'error': 'Failed to forecast dividends'}), 500
+
+# Versão da tabela de dividendos: contagem e último updated_at (trigger pega inserts, edições e exclusões)
+DIVIDENDS_VERSION_TABLES = [('dividends', 'updated_at')]
+
+@api_bp.route('/dividends/calendar', methods=['GET'])
+@optimized_cache_headers
+def get_dividends_calendar():
+    """Dividend events in a date range from the in-memory calendar index.
+
+    Query params: range (next_30_days, last_30_days, this_week, next_week,
+    this_month, next_month, this_year) or from/to (ISO dates), by
+    (payment_date|com_date), status (Pago|A Pagar), ticker.
+    """
+    try:
+        field = request.args.get('by', 'payment_date')
+        range_name = request.args.get('range')
+        start, end = request.args.get('from'), request.args.get('to')
+        if range_name:
+            start, end = (day.isoformat() for day in resolve_range(range_name))
+        elif not start and not end:
+            start, end = (day.isoformat() for day in resolve_range('next_30_days'))
+        
+        calendar = get_dividend_calendar(
+            _data_version(DIVIDENDS_VERSION_TABLES),
+            lambda: execute_optimized_query('dividends', 'id, ticker, type, payment_date, com_date, net_value').data
+        )
+        events = calendar.query(start, end, field, status=request.args.get('status') or None,
+                                ticker=request.args.get('ticker') or None)
+        
+        return jsonify({
+            'from': start,
+            'to': end,
+            'by': field,
+            'count': len(events),
+            'events': events,
+            **summarize_calendar(events, field)
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting dividends calendar: {e}")
+        return jsonify({'error': 'Failed to get dividends calendar'}), 500
+
+@api_bp.route('/dividends/by-asset/series', methods=['GET'])
+@optimized_cache_headers
+def get_dividends_by_asset_series():
+    """Monthly dividend series per ticker with yield-on-cost and trailing 12m yield.
+
+    Query params: ticker (one ticker with its full monthly series; omitted =
+    every ticker), from/to (YYYY-MM, single ticker), monthly (1 includes the
+    sparse monthly totals when listing every ticker).
+    """
+    try:
+        version = _data_version(DIVIDENDS_VERSION_TABLES + [('assets', 'updated_at')])
+        index = get_dividend_index(version, lambda: (
+            execute_optimized_query('dividends', 'ticker, payment_date, net_value').data,
+            execute_optimized_query('assets', 'ticker, total_cost, total_market_value').data
+        ))
+        
+        ticker = request.args.get('ticker')
+        if ticker:
+            try:
+                ticker = ticker if ticker in index.ticker_index else ticker.upper()
+                return jsonify(index.ticker(ticker, request.args.get('from'), request.args.get('to')))
+            except KeyError:
+                return jsonify({'error': f'Ticker não encontrado: {ticker}'}), 404
+        
+        rows = index.all_tickers(include_monthly=request.args.get('monthly') == '1')
+        return jsonify({
+            'data': rows,
+            'count': len(rows),
+            'months': index.months,
+            'portfolio': index.portfolio_totals()
+        })
+    except Exception as e:
+        logger.error(f"Error getting dividends by asset series: {e}")
+        return jsonify({'error': 'Failed to get dividends by asset series'}), 500
+
 @api_bp.route('/dashboard/portfolio-composition-drill-l1', methods=['GET'])
 @optimized_cache_headers
 def get_portfolio_composition_drill_l1():
@@ -1758,38 +1945,136 @@ def get_portfolio_composition_multi_category():
         logger.error(f"Error getting multi-category portfolio composition: {e}")
         return jsonify({'error': 'Failed to get multi-category portfolio composition'}), 500
 
+def _composition_cube():
+    """Cached composition cube (assets x category levels) for the current data version"""
+    version = _data_version([('assets', 'updated_at'), ('asset_categories', 'updated_at')])
+    return get_composition_cube(version, lambda: (
+        execute_optimized_query('assets', 'ticker, total_market_value, market_price').data,
+        {cat['ticker']: cat for cat in execute_optimized_query(
+            'asset_categories', 'ticker, location, macro_category, category_l1, category_l2, category_l3').data}
+    ))
+
+# -----------------------------
+# Metas de alocação e rebalanceamento
+# -----------------------------
+def _stored_targets(level):
+    rows = execute_optimized_query('target_allocations', 'category, target_weight', filters=[('eq', 'level', level)]).data
+    return {row['category']: float(row['target_weight']) for row in rows}
+
+@api_bp.route('/target-allocations', methods=['GET'])
+def get_target_allocations():
+    """List target weights (optionally for one level via ?level=)"""
+    try:
+        level = request.args.get('level')
+        filters = [('eq', 'level', level)] if level else None
+        response = execute_optimized_query('target_allocations', '*', filters=filters, order_by='category')
+        return jsonify(response.data)
+    except Exception as e:
+        logger.error(f"Error getting target allocations: {e}")
+        return jsonify({'error': 'Failed to get target allocations'}), 500
+
+@api_bp.route('/target-allocations', methods=['PUT'])
+def save_target_allocations():
+    """Replace the targets of one level. Body: { level, targets: {category: percent} } (sum 100)"""
+    try:
+        data = request.get_json() or {}
+        level = data.get('level')
+        targets = data.get('targets') or {}
+        if level not in COMPOSITION_LEVELS:
+            return jsonify({'error': f'Nível inválido: {level}'}), 400
+        # Valida soma/negativos com a mesma regra do rebalanceamento
+        target_vector([], targets)
+        
+        client = supabase_service if supabase_service else supabase
+        if not supabase_service:
+            logger.warning("Using anon client for write operation - may fail due to RLS")
+        
+        now = datetime.now().isoformat()
+        rows = [{'level': level, 'category': category, 'target_weight': float(weight), 'updated_at': now}
+                for category, weight in targets.items()]
+        response = client.table('target_allocations').upsert(rows, on_conflict='level,category').execute()
+        # Categorias que saíram das metas
+        removed = [category for category in _stored_targets(level) if category not in targets]
+        if removed:
+            client.table('target_allocations').delete().eq('level', level).in_('category', removed).execute()
+        return jsonify({'success': True, 'data': response.data, 'removed': removed})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error saving target allocations: {e}")
+        return jsonify({'error': 'Failed to save target allocations'}), 500
+
+@api_bp.route('/target-allocations/<int:target_id>', methods=['DELETE'])
+def delete_target_allocation(target_id):
+    """Delete one target weight"""
+    try:
+        client = supabase_service if supabase_service else supabase
+        client.table('target_allocations').delete().eq('id', target_id).execute()
+        return jsonify({'message': 'Target allocation deleted successfully'})
+    except Exception as e:
+        logger.error(f"Error deleting target allocation: {e}")
+        return jsonify({'error': 'Failed to delete target allocation'}), 500
+
+@api_bp.route('/portfolio/rebalance', methods=['POST'])
+def rebalance_portfolio():
+    """Orders that bring one composition level back to its target weights.
+
+    Body: { level (default category_l1), contribution, mode (buy_only|buy_sell),
+    targets: {category: percent} (optional, defaults to target_allocations) }
+    """
+    try:
+        data = request.get_json() or {}
+        level = data.get('level', 'category_l1')
+        if level not in COMPOSITION_LEVELS:
+            return jsonify({'error': f'Nível inválido: {level}'}), 400
+        targets = data.get('targets') or _stored_targets(level)
+        if not targets:
+            return jsonify({'error': f'Nenhuma meta cadastrada para {level}'}), 400
+        
+        result = rebalance(_composition_cube(), level, targets,
+                           contribution=data.get('contribution', 0), mode=data.get('mode', 'buy_only'))
+        return jsonify(result)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Parâmetros inválidos: {e}'}), 400
+    except Exception as e:
+        logger.error(f"Error rebalancing portfolio: {e}")
+        return jsonify({'error': 'Failed to rebalance portfolio'}), 500
+
+@api_bp.route('/portfolio/what-if', methods=['POST'])
+def preview_portfolio_what_if():
+    """Composition at every level after hypothetical trades, applied as deltas to the cached snapshot.
+
+    Body: { trades: [{ticker, type (Compra|Venda), amount | quantity [+ price],
+    location/macro_category/category_l1..l3 for tickers not in the portfolio}],
+    refresh (true checks the data version before previewing) }.
+    Nothing is written; without refresh no query is made once the snapshot is loaded.
+    """
+    try:
+        data = request.get_json() or {}
+        trades = data.get('trades') or []
+        if not trades:
+            return jsonify({'error': 'trades é obrigatório'}), 400
+        
+        cube = None if data.get('refresh') else cached_cube()
+        if cube is None:
+            cube = _composition_cube()
+        
+        result = cube.what_if(trades)
+        result['snapshot_loaded_at'] = cube.loaded_at
+        return jsonify(result)
+    except (TypeError, ValueError, KeyError) as e:
+        return jsonify({'error': f'Parâmetros inválidos: {e}'}), 400
+    except Exception as e:
+        logger.error(f"Error previewing what-if composition: {e}")
+        return jsonify({'error': 'Failed to preview composition'}), 500
+
 @api_bp.route('/transactions/monthly-purchases', methods=['GET'])
 @optimized_cache_headers
 def get_monthly_purchases():
     """Get monthly purchases data (excluding fixed income)"""
     try:
-        # Get all purchases
-        response = execute_optimized_query('transactions', 'ticker, transaction_date, total_value', 
-                                     filters=[('eq', 'type', 'Compra')], 
-                                     order_by='transaction_date')
-        
-        # Get categories to filter out fixed income
-        categories_response = execute_optimized_query('asset_categories', 'ticker, category_l1')
-        categories_dict = {cat['ticker']: cat['category_l1'] for cat in categories_response.data}
-        
-        monthly_data = {}
-        for transaction in response.data:
-            ticker = transaction['ticker']
-            category_l1 = categories_dict.get(ticker, 'Unknown')
-            
-            # Skip fixed income assets
-            if category_l1 == 'Renda Fixa':
-                continue
-                
-            transaction_date = transaction['transaction_date']
-            if transaction_date:
-                month_key = transaction_date[:7]  # YYYY-MM
-                if month_key in monthly_data:
-                    monthly_data[month_key] += float(transaction['total_value'] or 0)
-                else:
-                    monthly_data[month_key] = float(transaction['total_value'] or 0)
-        
-        return jsonify(monthly_data)
+        # Rollup já traz a category_l1 de cada célula: Renda Fixa sai sem join com asset_categories
+        return jsonify(_monthly_totals(_transactions_monthly('Compra'), exclude_category='Renda Fixa'))
     except Exception as e:
         logger.error(f"Error getting monthly purchases: {e}")
         return jsonify({'error': 'Failed to get monthly purchases'}), 500
@@ -1799,33 +2084,8 @@ def get_monthly_purchases():
 def get_monthly_sales():
     """Get monthly sales data (excluding fixed income)"""
     try:
-        # Get all sales
-        response = execute_optimized_query('transactions', 'ticker, transaction_date, total_value', 
-                                     filters=[('eq', 'type', 'Venda')], 
-                                     order_by='transaction_date')
-        
-        # Get categories to filter out fixed income
-        categories_response = execute_optimized_query('asset_categories', 'ticker, category_l1')
-        categories_dict = {cat['ticker']: cat['category_l1'] for cat in categories_response.data}
-        
-        monthly_data = {}
-        for transaction in response.data:
-            ticker = transaction['ticker']
-            category_l1 = categories_dict.get(ticker, 'Unknown')
-            
-            # Skip fixed income assets
-            if category_l1 == 'Renda Fixa':
-                continue
-                
-            transaction_date = transaction['transaction_date']
-            if transaction_date:
-                month_key = transaction_date[:7]  # YYYY-MM
-                if month_key in monthly_data:
-                    monthly_data[month_key] += float(transaction['total_value'] or 0)
-                else:
-                    monthly_data[month_key] = float(transaction['total_value'] or 0)
-        
-        return jsonify(monthly_data)
+        # Rollup já traz a category_l1 de cada célula: Renda Fixa sai sem join com asset_categories
+        return jsonify(_monthly_totals(_transactions_monthly('Venda'), exclude_category='Renda Fixa'))
     except Exception as e:
         logger.error(f"Error getting monthly sales: {e}")
         return jsonify({'error': 'Failed to get monthly sales'}), 500
@@ -1884,161 +2144,432 @@ def debug_transactions_categories():
         logger.error(f"Error in debug route: {e}")
         return jsonify({'error': 'Debug failed'}), 500
 
+# Versão dos dados: muda quando qualquer tabela usada pela rentabilidade muda
+# (updated_at mantido por trigger - sql/updated_at_markers.sql - pega edições, não só inserts)
+PERFORMANCE_VERSION_TABLES = [
+    ('transactions', 'updated_at'),
+    ('dividends', 'updated_at'),
+    ('assets', 'updated_at'),
+    ('portfolio_evolution', 'updated_at'),
+    ('asset_categories', 'updated_at')
+]
+
 @api_bp.route('/performance', methods=['GET'])
 @optimized_cache_headers
 def get_performance_data():
-    """Get performance data for rentabilidade page"""
+    """Get performance data for rentabilidade page (TWR + XIRR, cached per data version).
+
+    Optional benchmark param (CDI, IBOV, IPCA...) compares each row and the
+    total with the locally stored benchmark series.
+    """
     try:
-        # Implementation here
+        aggregation_type = request.args.get('type', 'asset')
+        benchmark_name = (request.args.get('benchmark') or '').upper() or None
+        benchmark = get_benchmark(benchmark_name) if benchmark_name else None
+        version = _data_version(PERFORMANCE_VERSION_TABLES)
+        
+        def compute():
+            transactions = execute_optimized_query('transactions', 'id, ticker, transaction_date, total_value, type').data
+            dividends = execute_optimized_query('dividends', 'ticker, payment_date, net_value').data
+            assets = execute_optimized_query('assets', 'ticker, total_market_value').data
+            evolution = execute_optimized_query('portfolio_evolution', 'reference_date, total_patrimony',
+                                                order_by='reference_date').data
+            categories = {cat['ticker']: cat for cat in execute_optimized_query('asset_categories', '*').data}
+            data, summary = compute_performance(aggregation_type, transactions, assets, dividends, categories, evolution,
+                                                benchmark=benchmark)
+            return {'data': data, 'summary': summary, 'computed_at': datetime.now().isoformat()}
+        
+        result = get_cached_performance(
+            version, (aggregation_type, benchmark_name, benchmark_store_version() if benchmark else None), compute)
+        
         return jsonify({
             'status': 'success',
-            'data': []
+            'data': result['data'],
+            'summary': result['summary'],
+            'type': aggregation_type,
+            'count': len(result['data']),
+            'last_updated': result['computed_at']
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error getting performance data: {e}")
         return jsonify({'error': str(e)}), 500
 
+@api_bp.route('/benchmarks', methods=['GET'])
+def get_benchmarks():
+    """Locally stored benchmark series (data/benchmarks) and their coverage"""
+    try:
+        benchmarks = []
+        for name in available_benchmarks():
+            series = get_benchmark(name)
+            benchmarks.append({
+                'name': name,
+                'first_date': series.first_date,
+                'last_date': series.last_date,
+                'accumulated_perc': round((float(series.index[-1]) - 1) * 100, 4)
+            })
+        return jsonify({'benchmarks': benchmarks, 'count': len(benchmarks)})
+    except Exception as e:
+        logger.error(f"Error listing benchmarks: {e}")
+        return jsonify({'error': 'Failed to list benchmarks'}), 500
+
+# -----------------------------
+# Posições e custo médio (replay de transactions)
+# -----------------------------
+POSITION_TRANSACTION_FIELDS = 'id, ticker, transaction_date, type, quantity, price, total_value, updated_at'
+
+def _position_book(method, rebuild=False):
+    """Position book up to date with transactions (incremental over the local checkpoint)"""
+    (_, total_count, last_updated), = _data_version([('transactions', 'updated_at')])
+    return update_book(
+        method,
+        total_count or 0,
+        last_updated,
+        fetch_changed=lambda since: execute_optimized_query(
+            'transactions', POSITION_TRANSACTION_FIELDS, filters=[('gt', 'updated_at', since)]).data,
+        fetch_all=lambda: execute_optimized_query('transactions', POSITION_TRANSACTION_FIELDS).data,
+        rebuild=rebuild
+    )
+
+@api_bp.route('/positions', methods=['GET'])
+def get_positions():
+    """Positions, average price and unrealized/realized P&L recomputed from transactions.
+
+    Query params: method (average|fifo), rebuild (1 forces a full replay).
+    """
+    try:
+        method = request.args.get('method', 'average')
+        book = _position_book(method, rebuild=request.args.get('rebuild') == '1')
+        assets = execute_optimized_query('assets', 'ticker, market_price, average_price, total_symbols').data
+        
+        rows = position_rows(book, assets)
+        open_rows = [row for row in rows if row['quantity'] > 0]
+        
+        return jsonify({
+            'status': 'success',
+            'method': method,
+            'positions': open_rows,
+            'closed': [row for row in rows if row['quantity'] == 0],
+            'total_cost': round(sum(row['total_cost'] for row in open_rows), 2),
+            'total_market_value': round(sum(row['market_value'] for row in open_rows), 2),
+            'total_unrealized_pnl': round(sum(row['unrealized_pnl'] for row in open_rows), 2),
+            'total_realized_pnl': round(sum(row['realized_pnl'] for row in rows), 2),
+            'applied_transactions': book.applied_count
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting positions: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/positions/realized', methods=['GET'])
+def get_realized_pnl():
+    """Realized P&L per sale, with monthly totals. Query params: method, ticker, year"""
+    try:
+        method = request.args.get('method', 'average')
+        ticker = request.args.get('ticker', '').upper()
+        year = request.args.get('year', '')
+        
+        book = _position_book(method)
+        events = [
+            event for event in book.realized
+            if (not ticker or event['ticker'].upper() == ticker) and (not year or event['date'].startswith(year))
+        ]
+        
+        monthly = {}
+        for event in events:
+            month_key = event['date'][:7]
+            monthly.setdefault(month_key, {'proceeds': 0, 'cost_basis': 0, 'realized_pnl': 0})
+            for field in ('proceeds', 'cost_basis', 'realized_pnl'):
+                monthly[month_key][field] = round(monthly[month_key][field] + event[field], 2)
+        
+        return jsonify({
+            'status': 'success',
+            'method': method,
+            'events': events,
+            'monthly': monthly,
+            'total_realized_pnl': round(sum(event['realized_pnl'] for event in events), 2)
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting realized P&L: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# -----------------------------
+# Imposto de Renda sobre ganho de capital
+# -----------------------------
+def _monthly_tax():
+    """Monthly IR from the weighted-average position book (regra da Receita)"""
+    book = _position_book('average')
+    return monthly_tax(
+        book,
+        _data_version([('asset_categories', 'updated_at')]),
+        lambda: {cat['ticker']: cat for cat in execute_optimized_query('asset_categories', '*').data}
+    )
+
+@api_bp.route('/ir/monthly', methods=['GET'])
+def get_ir_monthly():
+    """Monthly realized gains and IR due per class (swing trade, FIIs, exterior). Query param: year"""
+    try:
+        year = request.args.get('year', '')
+        monthly = _monthly_tax()
+        months = {month: result for month, result in monthly.items() if month.startswith(year)}
+        return jsonify({
+            'status': 'success',
+            'months': months,
+            'total_tax_due': round(sum(row['tax_due'] for result in months.values() for row in result.values()), 2)
+        })
+    except Exception as e:
+        logger.error(f"Error getting monthly IR: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/ir/annual', methods=['GET'])
+def get_ir_annual():
+    """Annual IR report per class. Query param: year (default current year)"""
+    try:
+        year = request.args.get('year', datetime.now().year, type=int)
+        report = annual_report(_monthly_tax(), year)
+        return jsonify({'status': 'success', 'year': year, 'report': report})
+    except Exception as e:
+        logger.error(f"Error getting annual IR report: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # -----------------------------
 # Simulador de Renda Fixa
 # -----------------------------
 @api_bp.route('/renda-fixa/investments', methods=['GET'])
 @optimized_cache_headers
 def get_renda_fixa_investments():
-    """Get featured investments from external API"""
+    """Get featured investments (stale-while-revalidate cache over the external API)"""
     try:
-        import requests
-        
-        # Headers conforme o arquivo MD
-        headers = {
-            'accept': 'application/json, text/plain, */*',
-            'accept-language': 'pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7',
-            'content-type': 'application/json',
-            'g-rcp-tkn': '03AFcWeA6wtX3blg_Uibum9MeoU_WmVT8aUILhI72vL3A70H4teAsgMPqpncyWTRdxinOkU4MniQDSF5ccf3klxBoZk_m8eq8O1ALBfNq283TN8XFCQCTnPeePK2nTFUMjrTkfZk4pPTuEzNGvE9keOpfnndH1af_LotGQiCMyAdvz_HArdC1zzuNRpiMPbreFR9lV9RcGnAGL4CQ_ecUBiHM6wwDA2ASgK4522SBBdSrT-aGxhQhurX-EIZTXEn6BW1QDC9RyLmcu7rXmog3SwTVUq5GxY7lVbUOmzKj3oJfmbaV1flVGVG5dRxOEkonWDKhEeGF53p85OmmyUZgigGFt93L0-K5GvNgckkqMnpeQbuvVlB6zlliZMK_mAvi1LKVYASMm3TTUMqr_XNDjcEjbyJvuRtj2qMxqg6edD28n8URlVTXnHP-0-xOV6W72oZRtwUdlj4mgfNUAbwDxGJyp3CM4459cY9GlQVCVncW48Sz2ik0_XOdQcYNobfGf9S8eOWoiKu8GX_9QcLXB2WsvLb9Zp6Is0evvOa7KLcik7-flR2n7qXEJUAhK0IkWVo40gPyjBVMRP9j962FAjJigAAYXltKpB34QPLh8ZtU9QR2e0qjSqeyDHdCWybq2dDbedvwhzPJPPEerPfQv6lTXoSUvL87e3r-c_97VBTzwpOyAuFdsVB8mvU3jsGk3_KYYzmAztmMOAVIa_OnsMCGuujzVKcEVurHDA-8ctXuWvF9sjS3svFK5aPp9pNJ_qXCZ8WO2to2EwR7PTYBELKtIu6lMsk-IGjR7sNzeunJNzBKrR-hRuCEsOSGC4fFLW0WGWO_xHjKpTa99Y_9Cis45ckAKSyWPv4wHbqNFNOEYfBq4_h_M1UVgJ3Oi60SVQLklTI54je-qAWZHquJrKSp0Tt_DDADG22ROFxg-DjykziJbTyfB969PS5biCpDjpc391t25dWedrCyw5gKedhUCbzUHm-uqbRcbiqhzb3yUYdktJGVqOFc',
-            'origin': 'https://apprendafixa.com.br',
-            'priority': 'u=1, i',
-            'referer': 'https://apprendafixa.com.br/',
-            'sec-ch-ua': '"Not;A=Brand";v="99", "Google Chrome";v="139", "Chromium";v="139"',
-            'sec-ch-ua-mobile': '?1',
-            'sec-ch-ua-platform': '"Android"',
-            'sec-fetch-dest': 'empty',
-            'sec-fetch-mode': 'cors',
-            'sec-fetch-site': 'same-site',
-            'user-agent': 'Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Mobile Safari/537.36'
+        investments, meta = get_featured_investments()
+        return jsonify({
+            'status': 'success',
+            'investments': investments,
+            'count': len(investments),
+            'fetched_at': datetime.fromtimestamp(meta['fetched_at']).isoformat(),
+            'stale': meta['stale']
+        })
+            
+    except requests.exceptions.Timeout:
+        logger.error("Timeout ao acessar API externa")
+        return jsonify({'error': 'Timeout ao buscar investimentos'}), 504
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Request error: {e}")
+        return jsonify({'error': 'Erro de conexão com a API externa'}), 503
+    except RuntimeError as e:
+        return jsonify({'error': 'Erro ao buscar investimentos na API externa', 'details': str(e)}), 500
+    except Exception as e:
+        logger.error(f"Error getting renda fixa investments: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def _query_list(name):
+    """Comma separated / repeated query arg as a list"""
+    values = []
+    for value in request.args.getlist(name):
+        values.extend(item.strip() for item in value.split(',') if item.strip())
+    return values
+
+@api_bp.route('/renda-fixa/offers', methods=['GET'])
+@optimized_cache_headers
+def query_renda_fixa_offers():
+    """Filtered, sorted and paginated offers from the indexed cache.
+
+    Query params: tipo, idx, corretora (comma separated), emissor, liquidez
+    (substring), dc_min, dc_max, taxa_min, rla_min, valor, incentivada,
+    sort (rla|rba|taxa|dc|qtdMinima|tipo|emissor|corretora), direction, page, per_page.
+    Each offer carries rla_equivalente: net-of-tax equivalent annual yield.
+    """
+    try:
+        index, meta = get_offer_index()
+        
+        filters = {
+            'tipo': _query_list('tipo'),
+            'idx': _query_list('idx'),
+            'corretora': _query_list('corretora'),
+            'emissor': request.args.get('emissor'),
+            'liquidez': request.args.get('liquidez'),
+            'dc_min': request.args.get('dc_min', type=int),
+            'dc_max': request.args.get('dc_max', type=int),
+            'taxa_min': request.args.get('taxa_min', type=float),
+            'rla_min': request.args.get('rla_min', type=float),
+            'valor': request.args.get('valor', type=float),
+            'incentivada': request.args.get('incentivada', '').lower() in ('1', 'true')
         }
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 20, type=int)
+        direction = 'asc' if request.args.get('direction', 'desc') == 'asc' else 'desc'
         
-        # Payload conforme o arquivo MD
-        payload = {
-            "idx": [],
-            "corretora": [],
-            "emissor": []
-        }
+        offers, total, page = index.query(filters, request.args.get('sort', 'rla'), direction, page, per_page)
+        per_page = max(1, min(per_page, OFFERS_MAX_PER_PAGE))
         
-        # Fazer request para a API externa
-        response = requests.post(
-            'https://api2.apprendafixa.com.br/vn/get_featured_investments',
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
+        return jsonify({
+            'status': 'success',
+            'investments': offers,
+            'total': total,
+            'available': index.size,
+            'page': page,
+            'per_page': per_page,
+            'pages': (total + per_page - 1) // per_page,
+            'facets': index.facets(),
+            'premissas': index.premissas,
+            'fetched_at': datetime.fromtimestamp(meta['fetched_at']).isoformat(),
+            'stale': meta['stale']
+        })
         
-        if response.status_code == 200:
-            investments = response.json()
-            return jsonify({
-                'status': 'success',
-                'investments': investments,
-                'count': len(investments)
-            })
-        else:
-            logger.error(f"External API error: {response.status_code} - {response.text}")
-            return jsonify({
-                'error': 'Erro ao buscar investimentos na API externa',
-                'status_code': response.status_code
-            }), 500
-            
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except requests.exceptions.Timeout:
         logger.error("Timeout ao acessar API externa")
         return jsonify({'error': 'Timeout ao buscar investimentos'}), 504
     except requests.exceptions.RequestException as e:
         logger.error(f"Request error: {e}")
         return jsonify({'error': 'Erro de conexão com a API externa'}), 503
+    except RuntimeError as e:
+        return jsonify({'error': 'Erro ao buscar investimentos na API externa', 'details': str(e)}), 500
     except Exception as e:
-        logger.error(f"Error getting renda fixa investments: {e}")
+        logger.error(f"Error querying renda fixa offers: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/renda-fixa/history', methods=['GET'])
+def get_renda_fixa_history():
+    """Rate time series from the local snapshot history (no external call).
+
+    Query params: emissor (substring), idx, tipo, from, to (ISO dates).
+    """
+    try:
+        series = rate_series(
+            emissor=request.args.get('emissor'),
+            idx=request.args.get('idx'),
+            tipo=request.args.get('tipo'),
+            start=request.args.get('from'),
+            end=request.args.get('to')
+        )
+        return jsonify({'status': 'success', 'series': series, 'count': len(series)})
+        
+    except ValueError as e:
+        return jsonify({'error': f'Parâmetros inválidos: {e}'}), 400
+    except Exception as e:
+        logger.error(f"Error getting renda fixa history: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/renda-fixa/history/offers', methods=['GET'])
+def get_renda_fixa_history_offers():
+    """Past offer versions with the period each one was listed"""
+    try:
+        versions = offer_versions(
+            emissor=request.args.get('emissor'),
+            idx=request.args.get('idx'),
+            tipo=request.args.get('tipo'),
+            limit=request.args.get('limit', 500, type=int)
+        )
+        return jsonify({'status': 'success', 'offers': versions, 'count': len(versions)})
+        
+    except Exception as e:
+        logger.error(f"Error getting renda fixa offer history: {e}")
         return jsonify({'error': str(e)}), 500
 
 @api_bp.route('/renda-fixa/simulate', methods=['POST'])
 def simulate_renda_fixa_investment():
-    """Simulate investment returns for a specific investment"""
+    """Simulate investment returns for a specific investment (local engine, no external call)"""
     try:
-        import requests
-        
-        data = request.get_json()
+        data = request.get_json() or {}
         investment = data.get('investment')
         amount = data.get('amount')
         
         if not investment or not amount:
             return jsonify({'error': 'Investment e amount são obrigatórios'}), 400
         
-        # Headers conforme o arquivo MD
-        headers = {
-            'accept': 'application/json, text/plain, */*',
-            'accept-language': 'pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7',
-            'content-type': 'application/json',
-            'origin': 'https://apprendafixa.com.br',
-            'priority': 'u=1, i',
-            'referer': 'https://apprendafixa.com.br/',
-            'sec-ch-ua': '"Not;A=Brand";v="99", "Google Chrome";v="139", "Chromium";v="139"',
-            'sec-ch-ua-mobile': '?1',
-            'sec-ch-ua-platform': '"Android"',
-            'sec-fetch-dest': 'empty',
-            'sec-fetch-mode': 'cors',
-            'sec-fetch-site': 'same-site',
-            'user-agent': 'Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Mobile Safari/537.36'
-        }
+        # Premissas opcionais de CDI/IPCA (% a.a.) para produtos pós-fixados
+        simulation = simulate_renda_fixa(investment, float(amount), cdi=data.get('cdi'), ipca=data.get('ipca'))
+        return jsonify(simulation)
+            
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Parâmetros inválidos: {e}'}), 400
+    except Exception as e:
+        logger.error(f"Error simulating renda fixa investment: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# Limites do grid de simulação em lote
+SIMULATE_BATCH_MAX_CELLS = int(os.getenv('SIMULATE_BATCH_MAX_CELLS', 200000))
+
+@api_bp.route('/renda-fixa/simulate-batch', methods=['POST'])
+def simulate_renda_fixa_batch():
+    """Simulate an investments x amounts (x CDI/IPCA scenarios) grid in one call.
+
+    Body: { investments: [...], amounts: [...], scenarios: [{cdi, ipca}, ...] (optional) }
+    Returns per scenario the ranked matrices of net returns.
+    """
+    try:
+        data = request.get_json() or {}
+        investments = data.get('investments') or []
+        amounts = [float(amount) for amount in (data.get('amounts') or [])]
+        scenarios = data.get('scenarios') or None
         
-        # Preparar payload conforme o exemplo do arquivo MD
-        payload = {
-            "corretora": investment.get('corretora', ''),
-            "dc": investment.get('dc', 0),
-            "emissor": investment.get('emissor', ''),
-            "incentivada": investment.get('incentivada', False),
-            "liquidez": investment.get('liquidez', ''),
-            "preco": float(amount),
-            "tipo": investment.get('tipo', ''),
-            "taxa": investment.get('taxa', ''),
-            "idx": investment.get('idx', '')
-        }
+        if not investments or not amounts:
+            return jsonify({'error': 'investments e amounts são obrigatórios'}), 400
         
-        # Fazer request para a API externa
-        response = requests.post(
-            'https://api2.apprendafixa.com.br/vn/compute_private_investment',
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
+        cells = len(investments) * len(amounts) * len(scenarios or [None])
+        if cells > SIMULATE_BATCH_MAX_CELLS:
+            return jsonify({'error': f'Grid muito grande ({cells} células) - limite é {SIMULATE_BATCH_MAX_CELLS}'}), 400
         
-        if response.status_code == 200:
-            simulation = response.json()
-            return jsonify(simulation)
-        else:
-            logger.error(f"External API simulation error: {response.status_code} - {response.text}")
-            return jsonify({
-                'error': 'Erro ao simular investimento na API externa',
-                'status_code': response.status_code
-            }), 500
-            
-    except requests.exceptions.Timeout:
-        logger.error("Timeout ao simular investimento na API externa")
-        return jsonify({'error': 'Timeout ao simular investimento'}), 504
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Request error during simulation: {e}")
-        return jsonify({'error': 'Erro de conexão com a API externa'}), 503
+        grids = simulate_renda_fixa_grid(investments, amounts, scenarios)
+        
+        return jsonify({
+            'investments': [{
+                'index': i,
+                'id': (inv.get('_id') or {}).get('$oid') if isinstance(inv.get('_id'), dict) else inv.get('_id'),
+                'emissor': inv.get('emissor'),
+                'tipo': inv.get('tipo'),
+                'idx': inv.get('idx'),
+                'taxa': inv.get('taxa'),
+                'corretora': inv.get('corretora'),
+                'dc': inv.get('dc')
+            } for i, inv in enumerate(investments)],
+            'amounts': amounts,
+            'scenarios': grids
+        })
+        
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Parâmetros inválidos: {e}'}), 400
     except Exception as e:
-        logger.error(f"Error simulating renda fixa investment: {e}")
+        logger.error(f"Error simulating renda fixa batch: {e}")
         return jsonify({'error': str(e)}), 500
 
 # -----------------------------
 # Investimentos EUA com LLM
 # -----------------------------
+def _mock_usa_analysis(filename, note):
+    """Demo response used only when the statement cannot be read or recognized locally"""
+    mock_transactions = [
+        {
+            'date': '2025-01-15',
+            'asset': 'AAPL',
+            'qty': 10.5,
+            'price': 150.25,
+            'total': 1577.63,
+            'type': 'BUY'
+        },
+        {
+            'date': '2025-01-16', 
+            'asset': 'GOOGL',
+            'qty': 5.0,
+            'price': 2750.80,
+            'total': 13754.00,
+            'type': 'BUY'
+        }
+    ]
+    
+    return jsonify({
+        'success': True,
+        'file': filename,
+        'transactions': mock_transactions,
+        'count': len(mock_transactions),
+        'note': note
+    })
+
 @api_bp.route('/investimentos-eua/analyze', methods=['POST'])
 def analyze_usa_investments():
     """Analyze PDF from USA broker using LLM to extract transactions"""
@@ -2051,210 +2582,86 @@ def analyze_usa_investments():
         if file.filename == '' or not file.filename.lower().endswith('.pdf'):
             return jsonify({'success': False, 'error': 'Por favor, envie um arquivo PDF'}), 400
         
-        # Salvar arquivo temporariamente
+        # Ler arquivo em memória (sem arquivo temporário), respeitando o limite de bytes
         filename = secure_filename(file.filename)
-        temp_id = str(uuid.uuid4())[:8]
-        temp_filename = f"{temp_id}_{filename}"
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            file.save(temp_file.name)
-            temp_path = temp_file.name
-        
-        # Verificar se tem suporte a LLM
-        if not HAVE_LLM_SUPPORT:
-            # Usar dados simulados se não houver suporte a LLM
-            mock_transactions = [
-                {
-                    'date': '2025-01-15',
-                    'asset': 'AAPL',
-                    'qty': 10.5,
-                    'price': 150.25,
-                    'total': 1577.63,
-                    'type': 'BUY'
-                },
-                {
-                    'date': '2025-01-16', 
-                    'asset': 'GOOGL',
-                    'qty': 5.0,
-                    'price': 2750.80,
-                    'total': 13754.00,
-                    'type': 'BUY'
-                }
-            ]
-            
-            return jsonify({
-                'success': True,
-                'file': filename,
-                'transactions': mock_transactions,
-                'count': len(mock_transactions),
-                'note': 'Dados simulados - Instale PyPDF2 e google-generativeai para análise real'
-            })
+        try:
+            pdf_bytes = read_upload(file)
+        except ValueError as size_error:
+            return jsonify({'success': False, 'error': str(size_error)}), 413
         
-        # Extrair texto do PDF
-        pdf_text = ""
+        # Extrair texto do PDF (páginas em paralelo para extratos grandes)
         try:
-            if HAVE_LLM_SUPPORT:
-                with open(temp_path, 'rb') as pdf_file:
-                    pdf_reader = PyPDF2.PdfReader(pdf_file)
-                    for page in pdf_reader.pages:
-                        pdf_text += page.extract_text() + "\n"
-                logger.info(f"Extracted {len(pdf_text)} characters from PDF")
-            else:
-                logger.error("LLM support not available - missing dependencies")
-                return jsonify({'success': False, 'error': 'Dependências PyPDF2 e google-generativeai não estão instaladas'}), 400
+            pdf_pages = extract_pages(pdf_bytes)
+            logger.info(f"Extracted {sum(len(page) for page in pdf_pages)} characters from {len(pdf_pages)} PDF pages")
+        except ValueError as limit_error:
+            return jsonify({'success': False, 'error': str(limit_error)}), 413
+        except RuntimeError:
+            # Sem PyPDF2 não há como ler o extrato
+            return _mock_usa_analysis(filename, 'Dados simulados - Instale PyPDF2 e google-generativeai para análise real')
         except Exception as pdf_error:
             logger.error(f"Error reading PDF: {pdf_error}")
             return jsonify({'success': False, 'error': 'Erro ao ler o arquivo PDF'}), 400
         
+        # Parsers determinísticos para corretoras conhecidas (sem chamar o LLM)
+        broker, parsed_transactions, fallback_pages = parse_statement(pdf_pages)
+        if broker and not fallback_pages:
+            return jsonify({
+                'success': True,
+                'file': filename,
+                'transactions': parsed_transactions,
+                'count': len(parsed_transactions),
+                'parser': broker,
+                'note': f'Extrato {broker} processado localmente - {len(parsed_transactions)} transações extraídas'
+            })
+        
+        # Sem LLM disponível: devolve o que o parser local leu, avisando das páginas não analisadas
+        from config.configs_supaa import GOOGLE_GEMINI_API_KEY
+        if not HAVE_LLM_SUPPORT or not GOOGLE_GEMINI_API_KEY:
+            missing = 'Instale google-generativeai' if not HAVE_LLM_SUPPORT else 'Configure GOOGLE_GEMINI_API_KEY no arquivo .env'
+            logger.warning(f"LLM fallback unavailable for {len(fallback_pages)} pages: {missing}")
+            if not broker:
+                return _mock_usa_analysis(filename, f'Dados simulados - Extrato não reconhecido. {missing} para análise real')
+            return jsonify({
+                'success': True,
+                'file': filename,
+                'transactions': parsed_transactions,
+                'count': len(parsed_transactions),
+                'parser': broker,
+                'fallback_pages': [i + 1 for i in fallback_pages],
+                'warning': f'{len(fallback_pages)} página(s) não puderam ser lidas pelo parser {broker} e não foram '
+                           f'analisadas ({missing} para completar a extração)',
+                'note': f'Extrato {broker} processado localmente - {len(parsed_transactions)} transações extraídas'
+            })
+        
         # Configurar LLM (Gemini)
         try:
-            from config.configs_supaa import GOOGLE_GEMINI_API_KEY
-            
-            # Buscar API key das configurações
             api_key = GOOGLE_GEMINI_API_KEY
-            if not api_key:
-                logger.warning("GOOGLE_GEMINI_API_KEY not configured")
-                # Usar dados simulados se não houver API key
-                mock_transactions = [
-                    {
-                        'date': '2025-01-15',
-                        'asset': 'AAPL',
-                        'qty': 10.5,
-                        'price': 150.25,
-                        'total': 1577.63,
-                        'type': 'BUY'
-                    },
-                    {
-                        'date': '2025-01-16', 
-                        'asset': 'GOOGL',
-                        'qty': 5.0,
-                        'price': 2750.80,
-                        'total': 13754.00,
-                        'type': 'BUY'
-                    }
-                ]
-                
-                return jsonify({
-                    'success': True,
-                    'file': filename,
-                    'transactions': mock_transactions,
-                    'count': len(mock_transactions),
-                    'note': 'Dados simulados - Configure GOOGLE_GEMINI_API_KEY no arquivo .env para análise real'
-                })
             
-            # Configurar Gemini
-            genai.configure(api_key=api_key)
+            # Extração map-reduce: o extrato é dividido por páginas e os pedaços
+            # são enviados ao Gemini em paralelo (sem truncar o documento)
+            generate = make_gemini_generator(api_key)
             logger.info("Gemini API configured successfully")
             
-            # Prompt especializado para extrair transações de corretoras americanas
-            prompt = f"""
-Você é um especialista em análise de extratos financeiros de corretoras americanas. 
-
-Analise o seguinte extrato e extraia TODAS as transações de compra e venda de ações, ETFs ou outros ativos.
-
-Para cada transação encontrada, você deve extrair:
-- Data da transação (formato YYYY-MM-DD)
-- Símbolo do ativo (ticker como AAPL, GOOGL, SPY, etc.)
-- Quantidade de ações/cotas
-- Preço unitário em USD
-- Valor total da operação em USD
-- Tipo de operação (BUY ou SELL)
-
-IMPORTANTE:
-1. Ignore dividendos, juros, taxas e outras operações que não sejam compra/venda de ativos
-2. Retorne APENAS um array JSON válido, sem texto adicional
-3. Use números decimais para qty, price e total
-4. Use o formato de data YYYY-MM-DD
-5. Se encontrar datas em outros formatos (MM/DD/YYYY, DD/MM/YYYY), converta para YYYY-MM-DD
-6. Para símbolos de ativos, use apenas letras maiúsculas sem espaços
-
-Exemplo do formato esperado:
-[
-  {{
-    "date": "2025-01-15",
-    "asset": "AAPL",
-    "qty": 10.5,
-    "price": 150.25,
-    "total": 1577.63,
-    "type": "BUY"
-  }},
-  {{
-    "date": "2025-01-16",
-    "asset": "GOOGL", 
-    "qty": 5.0,
-    "price": 2750.80,
-    "total": 13754.00,
-    "type": "SELL"
-  }}
-]
-
-Texto do extrato para análise:
-{pdf_text[:12000]}
-"""
-            
-            # Fazer requisição para o Gemini
-            model = genai.GenerativeModel(os.getenv('GEMINI_MODEL'))
-            logger.info("Sending request to Gemini API...")
-            
-            response = model.generate_content(prompt)
-            logger.info("Received response from Gemini API")
-            
-            # Tentar extrair JSON da resposta
-            response_text = response.text.strip()
-            logger.info(f"Raw Gemini response: {response_text[:500]}...")
+            # Apenas as páginas que o parser local não leu com confiança vão ao LLM
+            llm_pages = [pdf_pages[i] for i in fallback_pages]
+            llm_transactions, raw_responses = extract_transactions(llm_pages, generate)
+            logger.info(f"Received {len(raw_responses)} responses from Gemini API")
+            transactions = merge_transactions([parsed_transactions, llm_transactions])
             
-            # Tentar encontrar JSON na resposta
-            json_start = response_text.find('[')
-            json_end = response_text.rfind(']') + 1
-            
-            if json_start >= 0 and json_end > json_start:
-                json_text = response_text[json_start:json_end]
-                logger.info(f"Extracted JSON: {json_text[:300]}...")
-                
-                try:
-                    transactions = json.loads(json_text)
-                    logger.info(f"Successfully parsed {len(transactions)} transactions")
-                    
-                    # Validar e formatar transações
-                    formatted_transactions = []
-                    for i, tx in enumerate(transactions):
-                        try:
-                            if all(key in tx for key in ['date', 'asset', 'qty', 'price', 'total']):
-                                formatted_tx = {
-                                    'date': str(tx['date']),
-                                    'asset': str(tx['asset']).upper().strip(),
-                                    'qty': float(tx['qty']),
-                                    'price': float(tx['price']),
-                                    'total': float(tx['total']),
-                                    'type': str(tx.get('type', 'BUY')).upper()
-                                }
-                                formatted_transactions.append(formatted_tx)
-                                logger.info(f"Transaction {i+1}: {formatted_tx['asset']} - {formatted_tx['qty']} @ ${formatted_tx['price']}")
-                            else:
-                                logger.warning(f"Transaction {i+1} missing required fields: {tx}")
-                        except (ValueError, TypeError) as e:
-                            logger.error(f"Error formatting transaction {i+1}: {e} - {tx}")
-                    
-                    if formatted_transactions:
-                        logger.info(f"Successfully formatted {len(formatted_transactions)} transactions")
-                        return jsonify({
-                            'success': True,
-                            'file': filename,
-                            'transactions': formatted_transactions,
-                            'count': len(formatted_transactions),
-                            'note': f'Análise realizada com Gemini AI - {len(formatted_transactions)} transações extraídas'
-                        })
-                    else:
-                        logger.warning("No valid transactions found after formatting")
-                        
-                except json.JSONDecodeError as e:
-                    logger.error(f"JSON decode error: {e}")
-                    logger.error(f"Invalid JSON: {json_text[:500]}")
-            else:
-                logger.warning("No JSON array found in Gemini response")
-                logger.warning(f"Response text: {response_text[:1000]}")
+            if transactions:
+                logger.info(f"Successfully extracted {len(transactions)} transactions")
+                return jsonify({
+                    'success': True,
+                    'file': filename,
+                    'transactions': transactions,
+                    'count': len(transactions),
+                    'chunks': len(raw_responses),
+                    'parser': broker,
+                    'note': f'Análise realizada com Gemini AI - {len(transactions)} transações extraídas'
+                })
             
             # Se chegou até aqui, não conseguiu extrair dados válidos
+            response_text = '\n'.join(raw_responses)
             logger.warning("Could not extract valid transactions from Gemini response")
             return jsonify({
                 'success': True,
@@ -2273,17 +2680,98 @@ Texto do extrato para análise:
                 'error': f'Erro na análise com IA: {str(llm_error)}'
             }), 500
         
-        finally:
-            # Limpar arquivo temporário
-            try:
-                os.unlink(temp_path)
-            except:
-                pass
-        
     except Exception as e:
         logger.error(f"Error analyzing USA investments PDF: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Limites do upload em lote
+BATCH_MAX_FILES = int(os.getenv('BATCH_MAX_FILES', 24))
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', 3))
+
+def _analyze_statement(pdf_bytes, generate):
+    """Extract transactions from one statement: local parser first, LLM for the remaining pages"""
+    pdf_pages = extract_pages(pdf_bytes)
+    broker, parsed_transactions, fallback_pages = parse_statement(pdf_pages)
+    
+    llm_transactions = []
+    if fallback_pages:
+        if generate is None:
+            raise RuntimeError('Extrato não reconhecido e GOOGLE_GEMINI_API_KEY não configurada')
+        llm_transactions, _ = extract_transactions([pdf_pages[i] for i in fallback_pages], generate)
+    
+    return broker, merge_transactions([parsed_transactions, llm_transactions])
+
+@api_bp.route('/investimentos-eua/analyze-batch', methods=['POST'])
+def analyze_usa_investments_batch():
+    """Analyze many statements (several PDFs and/or zip files) in one request.
+
+    Files are processed in parallel with bounded concurrency and the results
+    are streamed as NDJSON: one line per file as soon as it finishes, then a
+    final summary line with the trades deduped across all files.
+    """
+    try:
+        uploads = request.files.getlist('files') or request.files.getlist('file')
+        if not uploads:
+            return jsonify({'success': False, 'error': 'Nenhum arquivo enviado'}), 400
+        
+        # Ler todos os arquivos (e expandir zips) antes de começar o streaming
+        statements = []
+        try:
+            for upload in uploads:
+                name = secure_filename(upload.filename or '')
+                if name.lower().endswith('.zip'):
+                    statements.extend(read_zip_pdfs(read_upload(upload), BATCH_MAX_FILES - len(statements)))
+                elif name.lower().endswith('.pdf'):
+                    if len(statements) >= BATCH_MAX_FILES:
+                        raise ValueError(f'Limite de {BATCH_MAX_FILES} arquivos por lote excedido')
+                    statements.append((name, read_upload(upload)))
+        except InvalidArchiveError as archive_error:
+            return jsonify({'success': False, 'error': str(archive_error)}), 400
+        except ValueError as limit_error:
+            return jsonify({'success': False, 'error': str(limit_error)}), 413
+        
+        if not statements:
+            return jsonify({'success': False, 'error': 'Por favor, envie arquivos PDF ou ZIP'}), 400
+        
+        generate = None
+        if HAVE_LLM_SUPPORT:
+            from config.configs_supaa import GOOGLE_GEMINI_API_KEY
+            if GOOGLE_GEMINI_API_KEY:
+                generate = make_gemini_generator(GOOGLE_GEMINI_API_KEY)
+        
+        def stream_results():
+            per_file_transactions = []
+            with ThreadPoolExecutor(max_workers=max(1, min(BATCH_MAX_CONCURRENCY, len(statements)))) as executor:
+                futures = {executor.submit(_analyze_statement, pdf_bytes, generate): name for name, pdf_bytes in statements}
+                for future in as_completed(futures):
+                    name = futures[future]
+                    try:
+                        broker, transactions = future.result()
+                        per_file_transactions.append(transactions)
+                        result = {'type': 'file', 'success': True, 'file': name, 'parser': broker,
+                                  'transactions': transactions, 'count': len(transactions)}
+                    except Exception as e:
+                        logger.error(f"Error analyzing {name} in batch: {e}")
+                        result = {'type': 'file', 'success': False, 'file': name, 'error': str(e)}
+                    yield json.dumps(result) + '\n'
+            
+            transactions = merge_transactions(per_file_transactions)
+            total_found = sum(len(file_transactions) for file_transactions in per_file_transactions)
+            yield json.dumps({
+                'type': 'summary',
+                'success': True,
+                'files': len(statements),
+                'transactions': transactions,
+                'count': len(transactions),
+                'duplicates_removed': total_found - len(transactions)
+            }) + '\n'
+        
+        return Response(stream_with_context(stream_results()), mimetype='application/x-ndjson')
+        
+    except Exception as e:
+        logger.error(f"Error analyzing USA investments batch: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @api_bp.route('/investimentos-eua/test-direct', methods=['POST'])
 def test_direct_myprofit():
     """Test direct MyProfit API call like Postman"""
@@ -2415,9 +2903,6 @@ def insert_usa_investments():
         if not transactions:
             return jsonify({'success': False, 'error': 'Nenhuma transação fornecida'}), 400
         
-        import requests
-        import os
-        
         # Use os cookies exatos do Postman que funcionam
         working_cookies = 'AdoptVisitorId=AwFmHYA4GMDYEYC0kBG8BMiQgJycuLAMxYCGAJgKylFHqXw6lA==; RememberMe=0; _ad_token=f9zednjr5uk4bql52uonne; myProfit.Auth=bXlwcm9maXR3ZWI6TSFQNDBmMXQjMzg=; ASP.NET_SessionId=v5otwjxytuwdu5uh0a3nuw13; isV2=false; couponMenu=0; vestingMenu=0; _gcl_au=1.1.378068258.1754506028; _cfuvid=q.zo17i.HGYb1fsD0.7xBs950tef.bMOJdlRF1xuCac-1755034314939-0.0.1.1-604800000; _gid=GA1.2.688027865.1755399809; AdoptConsent=N4Ig7gpgRgzglgFwgSQCIgFwgOwAZt64AsRAtAGzkBMVpRUUAJqQIaMQDMpHAxgKw8AjAE4WAMzGDGfEABoQANzjwEAewBOyRphDF8ADh7lBpfVEG0Sw2vuzkuRNnxYcOVPiJZyQqgA4JkADsAFRYAcxhMAG0QclVkAFEwgAsqAGEAKwBxb0YWckYRYRMWKGs6Ij5sUmseYVJBbBYLKAhcHipsCG8ATSyAJQBlAAVUAFd1MYTvAEcYVDEAWVIAOQQAfQBBb2EPZtw+clIeDiJ9OiEIVkZyK/0WFgOOMSr9ImxvfWkxDkEoHlInGEZDOgj4rB4UFwpD4fBoBGwfAgwjq3ih+nsEHI1X4uHqlVKpiIghYpDxED4NygJA4EA+AF15H4EAB5MYIUIRaKMkA8VSBGAQQIBbRYADSfGC6hWADVvBAFEKOQBPXzdLAIfpigCK2EYOu8fIFSplEHU8H5mEE8jGvjySEYmwQOiouHcZPOjWCuA4GB9GCowgAdMJcOQAFogAC+QA==; __cf_bm=KR5AzUnSutFCoL6parabSr3mezj.ux69WDw88uRldhs-1755442852-1.0.1.1-BtOdGqsR_yKnvMf5EzKWs6dTvXvdIqd5IOlsl21b3fOBevMNF0Cov63FVTQCAmvMYdS4B3wJBLpnHqyHSt3TW9gFOBYm_Z3K1VeW81NQCMw; TokenMaster=6KnPqsW5svk0GHO282FmyjHVlXkFdwi.40068; Token=6KnPqsW5svk0GHO282FmyjHVlXkFdwi.40068; _clck=e33jjs%7C2%7Cfyj%7C0%7C1860; lastReminderNiver5=2025-08-17; _ga=GA1.1.829614872.1738464269; _ga_YVHQTHNQ4Y=GS2.1.s1755442853$o198$g1$t1755443341$j59$l0$h0; _clsk=115tmj6%7C1755443341744%7C3%7C1%7Cn.clarity.ms%2Fcollect; _ga_BLMTDM6H5P=GS2.2.s1755442853$o170$g1$t1755443341$j60$l0$h0; __cf_bm=zfpcrQwz_64HPpXjMSlTt8Kmz66YZJRfp0oDPn2lJrk-1755446850-1.0.1.1-xivvCjBRbJJzIck1Pth0CNFw_tNRCa2B9wt4VkZ0FAK8UxUExvAJooTeFGh5xNZnzQwXM_3X0qjwX8yjiGe0y1nqGTiqV4.rzBmaJjAvnj0; _cfuvid=JjGJ4nT6A1rG0PzsvCz5P569zZTJn9UyrOo.LRGvmZE-1755446850791-0.0.1.1-604800000'
         
@@ -2429,174 +2914,33 @@ def insert_usa_investments():
             myprofit_cookies = working_cookies
             logger.info("Using working cookies from Postman")
         
-        # Headers minimalistas como no curl
-        headers = {
-            'Cookie': myprofit_cookies
-        }
+        # Envio concorrente com sessão keep-alive, retries e ledger de idempotência
+        results = submit_transactions(transactions, myprofit_cookies)
         
-        success_count = 0
-        errors = []
-        inserted_transactions = []
+        inserted_transactions = [transactions[r['index']] for r in results if r['status'] == 'inserted']
+        skipped_count = sum(1 for r in results if r['status'] == 'skipped')
+        aborted_count = sum(1 for r in results if r['status'] == 'aborted')
+        unknown_count = sum(1 for r in results if r['status'] == 'unknown')
+        errors = [r['error'] for r in results if r['status'] in ('failed', 'unknown')]
+        success_count = len(inserted_transactions)
         
-        for i, transaction in enumerate(transactions):
-            try:
-                # Preparar dados conforme formato exato do Postman (form-data)
-                form_data = {
-                    'action': 'new',
-                    'category': 'StockExchange',
-                    'type': 'ETF_USA',
-                    'typeText': 'ETF USA',
-                    'operation': 'ManualBuy' if transaction.get('type', 'BUY') == 'BUY' else 'ManualSell',
-                    'exchange': 'Inter USA',
-                    'date': transaction.get('date', ''),
-                    'time': '',
-                    'typetax': 'null',
-                    'issuer': '',
-                    'index': 'null',
-                    'duedate': '',
-                    'tax': '',
-                    'qty': str(transaction.get('qty', 0)),
-                    'qtyFund': '',
-                    'price': str(transaction.get('price', 0)),
-                    'total': str(transaction.get('total', 0)),
-                    'docid': '0',
-                    'previoustotal': '0',
-                    'proventType': 'RENDIMENTO',
-                    'asset': transaction.get('asset', ''),
-                    'assetBase': ''
-                }
-                
-                logger.info(f"Inserting transaction {i+1}/{len(transactions)}: {transaction['asset']} - {transaction['qty']} @ ${transaction['price']}")
-                logger.info(f"Using cookies: {myprofit_cookies[:100]}...")
-                
-                # Fazer requisição real para MyProfit usando form-data como no Postman
-                response = requests.post(
-                    'https://myprofitweb.com/API/NewAsset',
-                    headers=headers,
-                    data=form_data,  # Usar data= para form-data, não json=
-                    timeout=30,
-                    allow_redirects=False  # Não seguir redirects para detectar problemas de auth
-                )
-                
-                logger.info(f"MyProfit response status: {response.status_code}")
-                logger.info(f"MyProfit response text: {response.text[:200]}...")
-                
-                if response.status_code == 200:
-                    success_count += 1
-                    inserted_transactions.append(transaction)
-                    logger.info(f"Successfully inserted transaction {i+1}: {transaction['asset']}")
-                elif response.status_code == 403:
-                    error_msg = f"Erro de autenticação ao inserir {transaction.get('asset', 'N/A')}: Cookies expirados. Atualize MYPROFIT_API_TOKEN no arquivo .env"
-                    errors.append(error_msg)
-                    logger.error(error_msg)
-                    # Para o processo em caso de 403 pois todos vão falhar
-                    break
-                else:
-                    error_msg = f"Erro ao inserir {transaction.get('asset', 'N/A')}: HTTP {response.status_code} - {response.text[:100]}"
-                    errors.append(error_msg)
-                    logger.error(error_msg)
-                
-                # Adicionar delay para não sobrecarregar a API
-                time.sleep(0.5)
-                
-            except requests.exceptions.RequestException as e:
-                error_msg = f"Erro de requisição ao inserir {transaction.get('asset', 'N/A')}: {str(e)}"
-                errors.append(error_msg)
-                logger.error(error_msg)
-            except Exception as e:
-                error_msg = f"Erro ao inserir {transaction.get('asset', 'N/A')}: {str(e)}"
-                errors.append(error_msg)
-                logger.error(error_msg)
+        for error_msg in errors:
+            logger.error(error_msg)
         
         return jsonify({
             'success': True,
             'inserted': success_count,
+            'skipped': skipped_count,
+            'aborted': aborted_count,
+            'unknown': unknown_count,
             'total': len(transactions),
             'errors': errors,
             'inserted_transactions': inserted_transactions,
-            'note': f'Inserção real no MyProfit - {success_count}/{len(transactions)} transações inseridas com sucesso',
+            'results': results,
+            'note': f'Inserção real no MyProfit - {success_count}/{len(transactions)} transações inseridas com sucesso, {skipped_count} já inseridas anteriormente',
             'auth_method': 'custom_cookies' if custom_cookies.strip() else 'env_cookies'
         })
         
     except Exception as e:
         logger.error(f"Error inserting USA investments: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
-    """Get performance data by aggregation type including dividends"""
-    try:
-        aggregation_type = request.args.get('type', 'asset')
-        
-        # Map frontend types to database aggregation types
-        type_mapping = {
-            'asset': 'asset',
-            'category': 'category',
-            'group': 'group',
-            'sector': 'sector',
-            'location': 'location'
-        }
-        
-        db_type = type_mapping.get(aggregation_type, 'asset')
-        
-        # Get performance data from database
-        response = execute_optimized_query(
-            'performance_summary', 
-            '*',
-            filters=[('eq', 'aggregation_type', db_type)],
-            order_by=('total_profit_perc', True)  # Order by total profit desc
-        )
-        
-        # Get total summary data
-        total_response = execute_optimized_query(
-            'performance_summary', 
-            '*',
-            filters=[('eq', 'aggregation_type', 'total')]
-        )
-        
-        # Enrich data with dividends (only for assets)
-        data = response.data if response.data else []
-        
-        if db_type == 'asset' and data:
-            # Get dividends data for all assets
-            dividends_response = execute_optimized_query(
-                'dividends',
-                'ticker, net_value',
-                filters=[]
-            )
-            
-            # Calculate total dividends per ticker
-            dividends_by_ticker = {}
-            if dividends_response.data:
-                for dividend in dividends_response.data:
-                    ticker = dividend['ticker']
-                    net_value = dividend['net_value'] or 0
-                    if ticker not in dividends_by_ticker:
-                        dividends_by_ticker[ticker] = 0
-                    dividends_by_ticker[ticker] += net_value
-            
-            # Enrich performance data with dividends
-            for item in data:
-                ticker = item['aggregation_label']
-                total_dividends = dividends_by_ticker.get(ticker, 0)
-                
-                # Add dividends fields
-                item['total_dividends'] = total_dividends
-                item['total_profit_with_dividends'] = item['total_profit_value'] + total_dividends
-                
-                # Calculate percentage with dividends
-                if item['total_buy_value'] > 0:
-                    item['total_profit_perc_with_dividends'] = (item['total_profit_with_dividends'] / item['total_buy_value']) * 100
-                else:
-                    item['total_profit_perc_with_dividends'] = 0
-        
-        total_data = total_response.data[0] if total_response.data else None
-        
-        return jsonify({
-            'data': data,
-            'summary': total_data,
-            'type': aggregation_type,
-            'count': len(data),
-            'last_updated': datetime.now().isoformat()
-        })
-        
-    except Exception as e:
-        logger.error(f"Error getting performance data: {e}")
-        return jsonify({'error': 'Failed to get performance data'}), 500
\ No newline at end of file
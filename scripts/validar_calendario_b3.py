@@ -0,0 +1,51 @@
+# Confere datas conhecidas do calendário de pregão da B3 e dos feriados ANBIMA.
+# Execute a partir da raiz do projeto:
+#   python scripts/validar_calendario_b3.py
+
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.business_calendar import b3_holidays, is_business_day
+
+# (data, calendário, é dia útil?, motivo)
+casos = [
+    (date(2021, 1, 25), 'b3', False, 'Aniversário de SP - B3 ainda fechava em feriados de SP'),
+    (date(2022, 1, 25), 'b3', True, 'Aniversário de SP - B3 abre a partir de 2022'),
+    (date(2023, 11, 20), 'b3', True, 'Consciência Negra - municipal em SP, houve pregão'),
+    (date(2024, 11, 20), 'b3', False, 'Consciência Negra - feriado nacional (Lei 14.759/2023)'),
+    (date(2023, 11, 20), 'anbima', True, 'Consciência Negra - não era feriado nacional em 2023'),
+    (date(2024, 11, 20), 'anbima', False, 'Consciência Negra - feriado nacional'),
+]
+
+# Datas que não podem estar na lista de feriados da B3 (2022-11-20 cai num domingo)
+fora_da_lista = [date(2022, 11, 20), date(2023, 11, 20)]
+
+
+def validar():
+    falhas = 0
+    for dia, calendario, esperado, motivo in casos:
+        calculado = bool(is_business_day(dia, calendar=calendario))
+        if calculado != esperado:
+            falhas += 1
+            print(f"❌ {dia} ({calendario}): esperado dia útil={esperado}, calculado {calculado} - {motivo}")
+        else:
+            print(f"✅ {dia} ({calendario}) - {motivo}")
+    for dia in fora_da_lista:
+        if dia in b3_holidays(dia.year):
+            falhas += 1
+            print(f"❌ {dia} não deveria ser feriado da B3")
+        else:
+            print(f"✅ {dia} fora dos feriados da B3")
+    return falhas
+
+
+if __name__ == "__main__":
+    print("🔄 Validando calendário da B3...")
+    total_falhas = validar()
+    if total_falhas:
+        print(f"❌ {total_falhas} divergências encontradas")
+        sys.exit(1)
+    print("✅ Calendário conferido")
@@ -0,0 +1,81 @@
+# Confere a apuração mensal de IR (services/ir_calculator.py) em casos calculados à mão.
+# Execute a partir da raiz do projeto:
+#   python scripts/validar_ir.py
+
+import os
+import sys
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ir_calculator import monthly_tax, SWING_TRADE
+
+CATEGORIAS = {
+    'PETR4': {'location': 'BR', 'macro_category': 'Renda Variável', 'category_l1': 'Ações'},
+    'VALE3': {'location': 'BR', 'macro_category': 'Renda Variável', 'category_l1': 'Ações'},
+    'BOVA11': {'location': 'BR', 'macro_category': 'Renda Variável', 'category_l1': 'ETF'},
+}
+
+
+def venda(data, ticker, valor, ganho):
+    return {'date': data, 'ticker': ticker, 'quantity': 1, 'proceeds': valor,
+            'cost_basis': valor - ganho, 'realized_pnl': ganho}
+
+
+# (descrição, vendas, mês, imposto esperado em swing trade)
+casos = [
+    ('Ações até R$20k: isento', [venda('2024-03-10', 'PETR4', 10000, 3000)], '2024-03', 0.0),
+    ('Ações acima de R$20k: 15% sobre o ganho', [venda('2024-03-10', 'PETR4', 25000, 3000)], '2024-03', 450.0),
+    ('Ações até R$20k + ETF: só o ganho do ETF é tributado',
+     [venda('2024-03-10', 'PETR4', 10000, 3000), venda('2024-03-11', 'BOVA11', 1000, 100)], '2024-03', 15.0),
+    ('Ações acima de R$20k + ETF: tudo tributado',
+     [venda('2024-03-10', 'PETR4', 15000, 3000), venda('2024-03-10', 'VALE3', 6000, 0),
+      venda('2024-03-11', 'BOVA11', 1000, 100)], '2024-03', 465.0),
+    ('ETF sozinho, mesmo abaixo de R$20k, é tributado', [venda('2024-03-11', 'BOVA11', 1000, 100)], '2024-03', 15.0),
+    ('Prejuízo de ações em mês isento abate ganho de ETF',
+     [venda('2024-03-10', 'PETR4', 10000, -50), venda('2024-03-11', 'BOVA11', 1000, 100)], '2024-03', 7.5),
+    ('Prejuízo de ETF é compensado no mês seguinte',
+     [venda('2024-03-11', 'BOVA11', 1000, -100), venda('2024-04-11', 'BOVA11', 1000, 300)], '2024-04', 30.0),
+]
+
+
+class LivroFake:
+    """Só o que monthly_tax lê do PositionBook"""
+
+    def __init__(self, realized):
+        self.method = 'average'
+        self.generation = uuid.uuid4().hex
+        self.realized = realized
+
+
+def validar():
+    falhas = 0
+    for descricao, vendas, mes, esperado in casos:
+        calculado = monthly_tax(LivroFake(vendas), 'v1', lambda: CATEGORIAS)[mes][SWING_TRADE]['tax_due']
+        if abs(calculado - esperado) > 0.005:
+            falhas += 1
+            print(f"❌ {descricao}: esperado R$ {esperado:.2f}, calculado R$ {calculado:.2f}")
+        else:
+            print(f"✅ {descricao}")
+
+    # Incremental: vendas novas no fim do livro recalculam só a partir do mês delas
+    livro = LivroFake([venda('2024-03-11', 'BOVA11', 1000, -100)])
+    monthly_tax(livro, 'v1', lambda: CATEGORIAS)
+    livro.realized.append(venda('2024-04-11', 'BOVA11', 1000, 300))
+    incremental = monthly_tax(livro, 'v1', lambda: CATEGORIAS)
+    completo = monthly_tax(LivroFake(list(livro.realized)), 'v1', lambda: CATEGORIAS)
+    if incremental != completo:
+        falhas += 1
+        print("❌ Apuração incremental diverge da completa")
+    else:
+        print("✅ Apuração incremental confere com a completa")
+    return falhas
+
+
+if __name__ == "__main__":
+    print("🔄 Validando apuração mensal de IR...")
+    total_falhas = validar()
+    if total_falhas:
+        print(f"❌ {total_falhas} divergências encontradas")
+        sys.exit(1)
+    print("✅ Apuração de IR conferida")
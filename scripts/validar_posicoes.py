@@ -0,0 +1,95 @@
+# Confere que o livro de posições incremental (checkpoint local) acompanha inserts,
+# edições e exclusões de transactions, comparando sempre com um replay completo.
+# Execute a partir da raiz do projeto:
+#   python scripts/validar_posicoes.py
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Checkpoints em diretório temporário, sem tocar no data/ do projeto
+os.environ['LOCAL_DATA_DIR'] = tempfile.mkdtemp(prefix='validar_posicoes_')
+
+from services.position_engine import update_book, position_rows
+
+
+class TabelaFake:
+    """transactions em memória com updated_at carimbado a cada escrita (como o trigger)"""
+
+    def __init__(self):
+        self.linhas = {}
+        self.relogio = 0
+        self.proximo_id = 1
+
+    def _carimbo(self):
+        self.relogio += 1
+        return f'2025-01-01T00:00:{self.relogio:02d}+00:00'
+
+    def inserir(self, **campos):
+        linha = {'id': self.proximo_id, **campos, 'updated_at': self._carimbo()}
+        self.linhas[linha['id']] = linha
+        self.proximo_id += 1
+        return linha['id']
+
+    def editar(self, linha_id, **campos):
+        self.linhas[linha_id].update(campos, updated_at=self._carimbo())
+
+    def excluir(self, linha_id):
+        del self.linhas[linha_id]
+
+    def livro(self, metodo='average', rebuild=False):
+        linhas = [dict(linha) for linha in self.linhas.values()]
+        ultimo = max((linha['updated_at'] for linha in linhas), default=None)
+        return update_book(
+            metodo, len(linhas), ultimo,
+            fetch_changed=lambda since: [linha for linha in linhas if linha['updated_at'] > since],
+            fetch_all=lambda: linhas,
+            rebuild=rebuild
+        )
+
+
+def resumo(book):
+    return [(row['ticker'], row['quantity'], row['total_cost'], row['realized_pnl']) for row in position_rows(book, [])]
+
+
+def validar():
+    falhas = 0
+    tabela = TabelaFake()
+    compra = tabela.inserir(ticker='PETR4', transaction_date='2025-01-02', type='Compra', quantity=100, price=30, total_value=3000)
+    tabela.livro()
+
+    passos = [
+        ('nova compra (incremental)', lambda: tabela.inserir(ticker='PETR4', transaction_date='2025-01-03', type='Compra',
+                                                             quantity=100, price=32, total_value=3200)),
+        ('edição de quantidade/preço', lambda: tabela.editar(compra, quantity=50, total_value=1500)),
+        ('exclusão + inserção (mesma contagem)', lambda: (
+            tabela.excluir(compra),
+            tabela.inserir(ticker='VALE3', transaction_date='2025-01-04', type='Compra', quantity=10, price=60, total_value=600))),
+        ('venda retroativa', lambda: tabela.inserir(ticker='PETR4', transaction_date='2025-01-03', type='Venda',
+                                                    quantity=50, price=35, total_value=1750)),
+    ]
+    for descricao, passo in passos:
+        antes = resumo(tabela.livro())
+        passo()
+        incremental = resumo(tabela.livro())
+        completo = resumo(tabela.livro(rebuild=True))
+        if incremental != completo:
+            falhas += 1
+            print(f"❌ {descricao}: incremental {incremental} != replay completo {completo}")
+        elif incremental == antes:
+            falhas += 1
+            print(f"❌ {descricao}: livro não mudou ({incremental})")
+        else:
+            print(f"✅ {descricao}")
+    return falhas
+
+
+if __name__ == "__main__":
+    print("🔄 Validando livro de posições incremental...")
+    total_falhas = validar()
+    if total_falhas:
+        print(f"❌ {total_falhas} divergências encontradas")
+        sys.exit(1)
+    print("✅ Livro incremental confere com o replay completo")
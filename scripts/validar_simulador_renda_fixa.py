@@ -0,0 +1,62 @@
+# Valida o motor local de renda fixa contra respostas gravadas da API apprendafixa
+# (exemplos do simulador_renda_fixa.md). Execute a partir da raiz do projeto:
+#   python scripts/validar_simulador_renda_fixa.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.renda_fixa_engine import simulate
+
+# (investimento enviado, resposta gravada da API)
+casos_gravados = [
+    (
+        {"corretora": "Banco Inter", "dc": 185, "du": 128, "emissor": "BANCO INTER", "incentivada": True,
+         "liquidez": "No Vencimento", "tipo": "LCI", "taxa": "13.03%", "idx": "PRÉ", "rpd": 0.0207},
+        {"preco": 80000, "rbd": 0.048616, "rbm": 1.0259, "rba": 13.03, "rbp": 6.42, "rlp": 6.42, "rld": 0.048616,
+         "rlm": 1.03, "rla": 13.03, "vb": 85135.17, "vl": 85135.17, "vrl": 5135.17, "tir": 0, "vir": 0,
+         "rpp": 2.69, "vpp": 82151.32}
+    ),
+    (
+        {"corretora": "Hurst Capital", "dc": 1080, "du": 744, "emissor": "OPERAÇÃO CONSIGNADO PÚBLICO VIII – E170",
+         "incentivada": False, "tipo": "ATIVO REAL", "taxa": "34.23%", "juros": 34.23, "idx": "PRÉ", "rpd": 0.0205},
+        {"preco": 50000.0, "rbd": 0.116888, "rbm": 2.4835, "rba": 34.23, "rbp": 138.48, "rlp": 117.71,
+         "rld": 0.104625, "rlm": 2.22, "rla": 30.15, "vb": 119242.4, "vl": 108856.04, "vrl": 58856.04,
+         "tir": 15.0, "vir": 10386.36, "rpp": 16.43, "vpp": 58216.1}
+    ),
+    (
+        {"corretora": "Hurst Capital", "dc": 720, "du": 496, "emissor": "SUPER FEDERAL PREFERENCIAL HONORÁRIOS ACIDENTE - E171/S1",
+         "incentivada": False, "tipo": "ATIVO REAL", "taxa": "33.0%", "juros": 33.0, "idx": "PRÉ", "rpd": 0.0205},
+        {"preco": 10000.0, "rbd": 0.11323, "rbm": 2.405, "rba": 33.0, "rbp": 75.3, "rlp": 62.12,
+         "rld": 0.097459, "rlm": 2.07, "rla": 27.82, "vb": 17529.58, "vl": 16211.9, "vrl": 6211.9,
+         "tir": 17.5, "vir": 1317.68, "rpp": 10.67, "vpp": 11067.48}
+    ),
+]
+
+# Tolerância relativa: a API arredonda taxas intermediárias (ex.: rpd com 4 casas)
+TOLERANCIA = 0.005
+
+
+def validar():
+    """Compara cada campo calculado localmente com a resposta gravada"""
+    falhas = 0
+    for investimento, esperado in casos_gravados:
+        resultado = simulate(investimento, esperado['preco'])
+        for campo, valor_esperado in esperado.items():
+            valor = resultado[campo]
+            limite = max(abs(valor_esperado) * TOLERANCIA, 0.01)
+            if abs(valor - valor_esperado) > limite:
+                falhas += 1
+                print(f"❌ {investimento['emissor']} - {campo}: esperado {valor_esperado}, calculado {valor}")
+        print(f"✅ {investimento['emissor']} conferido")
+    return falhas
+
+
+if __name__ == "__main__":
+    print("🔄 Validando motor local de renda fixa contra respostas gravadas...")
+    total_falhas = validar()
+    if total_falhas:
+        print(f"❌ {total_falhas} divergências encontradas")
+        sys.exit(1)
+    print("✅ Todas as respostas gravadas conferem")
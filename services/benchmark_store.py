@@ -0,0 +1,203 @@
+import os
+import csv
+import logging
+import threading
+
+import numpy as np
+
+from config.configs_supaa import LOCAL_DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# Arquivos fornecidos: data/benchmarks/<NOME>.csv (formato de download do SGS/BCB: "data";"valor")
+BENCHMARK_DIR = os.path.join(LOCAL_DATA_DIR, 'benchmarks')
+
+# Como interpretar a coluna valor de cada série
+DAILY_RATE = 'daily_rate'      # taxa diária em % por dia útil (CDI, Selic)
+LEVEL = 'level'                # fechamento do índice (IBOV, IFIX)
+MONTHLY_RATE = 'monthly_rate'  # variação mensal em %, distribuída pro rata nos dias do mês (IPCA)
+
+BENCHMARK_KINDS = {
+    'CDI': DAILY_RATE,
+    'SELIC': DAILY_RATE,
+    'IBOV': LEVEL,
+    'IFIX': LEVEL,
+    'IPCA': MONTHLY_RATE,
+}
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def _parse_date(text):
+    text = text.strip().strip('"')
+    if '/' in text:
+        day, month, year = text.split('/')
+        text = f'{year}-{int(month):02d}-{int(day):02d}'
+    return np.datetime64(text[:10], 'D').astype(np.int64)
+
+
+def _parse_value(text):
+    text = text.strip().strip('"')
+    if ',' in text:
+        text = text.replace('.', '').replace(',', '.')
+    return float(text)
+
+
+def read_source(path):
+    """(day numbers, values) from a provided CSV, sorted by date; header and blank rows are skipped"""
+    days, values = [], []
+    with open(path, encoding='utf-8-sig', newline='') as source:
+        sample = source.read(2048)
+        source.seek(0)
+        delimiter = ';' if ';' in sample else ','
+        for row in csv.reader(source, delimiter=delimiter):
+            if len(row) < 2 or not row[1].strip():
+                continue
+            try:
+                days.append(_parse_date(row[0]))
+                values.append(_parse_value(row[1]))
+            except ValueError:
+                continue
+    days, values = np.array(days, dtype=np.int64), np.array(values, dtype=np.float64)
+    order = np.argsort(days, kind='stable')
+    return days[order], values[order]
+
+
+def build_index(kind, days, values):
+    """Dense cumulative index with one entry per calendar day.
+
+    Returns (start_day, index). index[i] is the accumulated factor at the
+    close of day start_day + i, so index[b] / index[a] is the return of
+    buying at the close of a and selling at the close of b. Daily rates
+    accrue overnight: the rate of a counts, the one of b does not.
+    """
+    if len(days) == 0:
+        raise ValueError('Série sem observações')
+
+    if kind == LEVEL:
+        # Nível do último fechamento até o dia (forward-fill por busca binária)
+        calendar = np.arange(days[0], days[-1] + 1)
+        positions = np.searchsorted(days, calendar, side='right') - 1
+        return int(days[0]), values[positions] / values[0]
+
+    if kind == MONTHLY_RATE:
+        months = days.astype('datetime64[D]').astype('datetime64[M]')
+        start = months[0].astype('datetime64[D]').astype(np.int64)
+        end = (months[-1] + 1).astype('datetime64[D]').astype(np.int64)
+        calendar = np.arange(start, end)
+        calendar_months = calendar.astype('datetime64[D]').astype('datetime64[M]')
+        month_days = ((calendar_months + 1).astype('datetime64[D]') - calendar_months.astype('datetime64[D]')).astype(np.int64)
+        rates = np.zeros(len(calendar))
+        positions = np.searchsorted(months, calendar_months)
+        known = (positions < len(months)) & (months[np.minimum(positions, len(months) - 1)] == calendar_months)
+        rates[known] = values[positions[known]] / 100
+        daily = np.log1p(rates) / month_days
+        return int(start), np.exp(np.concatenate([[0.0], np.cumsum(daily)]))
+
+    if kind == DAILY_RATE:
+        start, end = days[0], days[-1] + 1
+        log_factors = np.zeros(end - start)
+        np.add.at(log_factors, days - start, np.log1p(values / 100))
+        return int(start), np.exp(np.concatenate([[0.0], np.cumsum(log_factors)]))
+
+    raise ValueError(f'Tipo de série inválido: {kind}')
+
+
+class BenchmarkSeries:
+    """Cumulative index of one benchmark with O(1) factor lookups between any two dates"""
+
+    def __init__(self, name, start, index):
+        self.name = name
+        self.start = int(start)
+        self.index = np.asarray(index, dtype=np.float64)
+
+    @property
+    def first_date(self):
+        return str(np.datetime64(self.start, 'D'))
+
+    @property
+    def last_date(self):
+        return str(np.datetime64(self.start + len(self.index) - 1, 'D'))
+
+    def _positions(self, dates):
+        days = np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+        # Fora da cobertura a série fica estável (fator 1 antes do início, último valor depois do fim)
+        return np.clip(days - self.start, 0, len(self.index) - 1)
+
+    def cumulative(self, dates):
+        """Accumulated index at each date, relative to the first observation"""
+        return self.index[self._positions(dates)]
+
+    def factor(self, start_dates, end_dates):
+        """Growth factor from the close of start to the close of end, for arrays (or scalars) of dates"""
+        return self.index[self._positions(end_dates)] / self.index[self._positions(start_dates)]
+
+    def covers(self, start_date, end_date):
+        days = np.array([start_date, end_date], dtype='datetime64[D]').astype(np.int64)
+        return bool(days[0] >= self.start and days[1] <= self.start + len(self.index) - 1)
+
+
+def _source_path(name):
+    return os.path.join(BENCHMARK_DIR, f'{name}.csv')
+
+
+def _binary_path(name):
+    return os.path.join(BENCHMARK_DIR, f'{name}.npz')
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _compile(name):
+    """Parse the provided CSV into the binary index file (atomic write-then-rename)"""
+    days, values = read_source(_source_path(name))
+    start, index = build_index(BENCHMARK_KINDS[name], days, values)
+    path = _binary_path(name)
+    with open(path + '.tmp', 'wb') as binary_file:
+        np.savez(binary_file, start=np.int64(start), index=index)
+    os.replace(path + '.tmp', path)
+    logger.info(f"Benchmark {name} compiled: {len(days)} observations, {len(index)} days")
+    return start, index
+
+
+def available_benchmarks():
+    """Benchmarks with a provided source or a compiled binary file"""
+    return [name for name in BENCHMARK_KINDS
+            if _mtime(_source_path(name)) is not None or _mtime(_binary_path(name)) is not None]
+
+
+def store_version():
+    """Modification times of every benchmark file, used in cache keys"""
+    return tuple((name, _mtime(_source_path(name)), _mtime(_binary_path(name))) for name in BENCHMARK_KINDS)
+
+
+def get_benchmark(name):
+    """BenchmarkSeries for `name`, recompiling the binary file when the CSV is newer"""
+    name = (name or '').upper()
+    if name not in BENCHMARK_KINDS:
+        raise ValueError(f'Benchmark inválido: {name}')
+
+    source_mtime, binary_mtime = _mtime(_source_path(name)), _mtime(_binary_path(name))
+    if source_mtime is None and binary_mtime is None:
+        raise ValueError(f'Série do benchmark {name} não encontrada em {BENCHMARK_DIR}')
+    signature = (source_mtime, binary_mtime)
+
+    with _loaded_lock:
+        cached = _loaded.get(name)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        if binary_mtime is None or (source_mtime is not None and source_mtime > binary_mtime):
+            start, index = _compile(name)
+            signature = (source_mtime, _mtime(_binary_path(name)))
+        else:
+            with np.load(_binary_path(name)) as binary:
+                start, index = int(binary['start']), binary['index']
+        series = BenchmarkSeries(name, start, index)
+        _loaded[name] = (signature, series)
+        return series
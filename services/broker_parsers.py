@@ -0,0 +1,162 @@
+import re
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Registro de parsers determinísticos por corretora. Cada parser declara
+# marcadores de texto que identificam o extrato e uma função que recebe o
+# texto de uma página e devolve as transações encontradas.
+_PARSERS = []
+
+# Palavras que indicam que uma página provavelmente contém operações
+TRADE_HINT_RE = re.compile(r'\b(BUY|SELL|BOUGHT|SOLD|COMPRA|VENDA)\b', re.IGNORECASE)
+# Datas no formato dos extratos; uma linha com data e palavra de operação conta como provável trade
+TRADE_DATE_RE = re.compile(r'\b\d{1,2}/\d{1,2}/\d{2,4}\b|\b\d{4}-\d{2}-\d{2}\b')
+
+# Tolerância para conferir total ~= qty * price (arredondamentos da corretora)
+TOTAL_TOLERANCE_ABS = 0.02
+TOTAL_TOLERANCE_REL = 0.005
+
+
+def register_parser(name, markers):
+    """Decorator that registers a page parser for a broker layout.
+
+    `markers` are case-insensitive strings; a statement is routed to the
+    parser when any of them appears in its first pages.
+    """
+    def decorator(parse_page):
+        _PARSERS.append({
+            'name': name,
+            'markers': [marker.lower() for marker in markers],
+            'parse_page': parse_page
+        })
+        return parse_page
+    return decorator
+
+
+def available_parsers():
+    """Names of the registered broker parsers"""
+    return [parser['name'] for parser in _PARSERS]
+
+
+def detect_broker(pages, probe_pages=3):
+    """Return the registered parser matching the statement header, or None"""
+    header = '\n'.join(pages[:probe_pages]).lower()
+    for parser in _PARSERS:
+        if any(marker in header for marker in parser['markers']):
+            return parser
+    return None
+
+
+def _to_iso_date(value):
+    for fmt in ('%m/%d/%Y', '%m/%d/%y', '%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(value, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+
+def _to_float(value):
+    return float(value.replace('$', '').replace(',', '').strip())
+
+
+def count_trade_hints(page):
+    """Lines of a page that look like trades (a trade keyword plus a date; headers do not count)"""
+    return sum(1 for line in page.split('\n') if TRADE_HINT_RE.search(line) and TRADE_DATE_RE.search(line))
+
+
+def _is_consistent(tx):
+    """Check that total matches qty * price within the broker rounding tolerance"""
+    expected = tx['qty'] * tx['price']
+    return abs(expected - tx['total']) <= max(TOTAL_TOLERANCE_ABS, abs(tx['total']) * TOTAL_TOLERANCE_REL)
+
+
+def parse_statement(pages):
+    """Run the matching broker parser over every page.
+
+    Returns (broker_name, transactions, fallback_pages) where fallback_pages
+    are the indexes of pages the parser could not read confidently (fewer
+    parsed trades than trade-like lines, or totals that do not add up) and
+    that should be sent to the LLM. When no parser matches, broker_name is None
+    and every page is a fallback page.
+    """
+    parser = detect_broker(pages)
+    if not parser:
+        return None, [], list(range(len(pages)))
+
+    transactions = []
+    fallback_pages = []
+
+    for index, page in enumerate(pages):
+        try:
+            page_transactions = parser['parse_page'](page)
+        except Exception as e:
+            logger.warning(f"Parser {parser['name']} failed on page {index + 1}: {e}")
+            fallback_pages.append(index)
+            continue
+
+        if not page_transactions:
+            if TRADE_HINT_RE.search(page):
+                # Página parece ter operações mas o layout não bateu
+                fallback_pages.append(index)
+            continue
+
+        if count_trade_hints(page) > len(page_transactions):
+            # Parte das linhas não bateu com o layout: manda a página inteira para o LLM
+            logger.info(f"Partially parsed page {index + 1} for parser {parser['name']}")
+            fallback_pages.append(index)
+            continue
+
+        if not all(_is_consistent(tx) for tx in page_transactions):
+            logger.info(f"Low-confidence page {index + 1} for parser {parser['name']}")
+            fallback_pages.append(index)
+            continue
+
+        transactions.extend(page_transactions)
+
+    logger.info(f"Parser {parser['name']}: {len(transactions)} transactions, {len(fallback_pages)} pages for LLM fallback")
+    return parser['name'], transactions, fallback_pages
+
+
+# -----------------------------
+# Inter USA (Inter&Co Securities / DriveWealth)
+# -----------------------------
+# Linhas de trade no formato tabular do extrato:
+#   08/15/2025  08/18/2025  VNQI  VANGUARD GLOBAL EX-US REAL EST  BUY  0.16611894  $47.165  $7.86
+INTER_TRADE_RE = re.compile(
+    r'^\s*(?P<trade_date>\d{2}/\d{2}/\d{2,4})\s+'
+    r'(?:\d{2}/\d{2}/\d{2,4}\s+)?'
+    r'(?P<asset>[A-Z][A-Z.\-]{0,9})\s+'
+    r'(?:.*?\s+)?'
+    r'(?P<side>BUY|SELL|BOUGHT|SOLD|COMPRA|VENDA)\s+'
+    r'(?P<qty>[\d,]*\.?\d+)\s+'
+    r'\$?(?P<price>[\d,]*\.?\d+)\s+'
+    r'\$?\(?(?P<total>[\d,]*\.?\d+)\)?\s*$',
+    re.IGNORECASE
+)
+
+SELL_SIDES = {'SELL', 'SOLD', 'VENDA'}
+
+
+@register_parser('Inter USA', markers=['Inter&Co', 'Inter & Co', 'Inter USA', 'DriveWealth'])
+def parse_inter_usa_page(text):
+    """Parse the trade table of an Inter USA statement page"""
+    transactions = []
+    for line in text.split('\n'):
+        match = INTER_TRADE_RE.match(line)
+        if not match:
+            continue
+        date = _to_iso_date(match.group('trade_date'))
+        if not date:
+            continue
+        transactions.append({
+            'date': date,
+            'asset': match.group('asset').upper(),
+            'qty': _to_float(match.group('qty')),
+            'price': _to_float(match.group('price')),
+            'total': _to_float(match.group('total')),
+            'type': 'SELL' if match.group('side').upper() in SELL_SIDES else 'BUY'
+        })
+    return transactions
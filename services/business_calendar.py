@@ -0,0 +1,157 @@
+import logging
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Faixa coberta pelos calendários pré-computados
+CALENDAR_START_YEAR = 1990
+CALENDAR_END_YEAR = 2100
+
+# 'anbima' = feriados nacionais (base da contagem de du da renda fixa)
+# 'b3' = dias sem pregão na B3
+CALENDARS = ('anbima', 'b3')
+
+_BASE = np.datetime64(f'{CALENDAR_START_YEAR}-01-01', 'D')
+_END = np.datetime64(f'{CALENDAR_END_YEAR + 1}-01-01', 'D')
+
+_calendars = {}
+_calendars_lock = threading.Lock()
+
+
+def easter(year):
+    """Easter Sunday (Gregorian calendar, anonymous algorithm)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def national_holidays(year):
+    """Feriados nacionais usados pela ANBIMA (inclui Carnaval e Corpus Christi)"""
+    easter_day = easter(year)
+    holidays = {
+        date(year, 1, 1),    # Confraternização Universal
+        easter_day - timedelta(days=48),  # Carnaval (segunda)
+        easter_day - timedelta(days=47),  # Carnaval (terça)
+        easter_day - timedelta(days=2),   # Sexta-feira Santa
+        date(year, 4, 21),   # Tiradentes
+        date(year, 5, 1),    # Dia do Trabalho
+        easter_day + timedelta(days=60),  # Corpus Christi
+        date(year, 9, 7),    # Independência
+        date(year, 10, 12),  # Nossa Senhora Aparecida
+        date(year, 11, 2),   # Finados
+        date(year, 11, 15),  # Proclamação da República
+        date(year, 12, 25),  # Natal
+    }
+    if year >= 2024:
+        holidays.add(date(year, 11, 20))  # Consciência Negra (Lei 14.759/2023)
+    return holidays
+
+
+def b3_holidays(year):
+    """Dias sem pregão na B3: feriados nacionais, feriados de São Paulo e fim de ano"""
+    holidays = national_holidays(year)
+    holidays.update({
+        date(year, 12, 24),  # Véspera de Natal
+        date(year, 12, 31),  # Último dia do ano
+    })
+    if year <= 2021:
+        # A B3 deixou de fechar nos feriados de SP a partir de 2022 (houve pregão em 20/11/2023);
+        # Consciência Negra volta como feriado nacional em 2024 (national_holidays)
+        holidays.update({date(year, 1, 25), date(year, 7, 9), date(year, 11, 20)})
+    return holidays
+
+
+HOLIDAY_RULES = {'anbima': national_holidays, 'b3': b3_holidays}
+
+
+class BusinessCalendar:
+    """Business-day calendar backed by a cumulative count array.
+
+    cumulative[i] is the number of business days in [base, base + i), so the
+    count between two dates is a difference of two lookups and works the same
+    for scalars and numpy date arrays.
+    """
+
+    def __init__(self, name):
+        holidays = sorted(
+            day
+            for year in range(CALENDAR_START_YEAR, CALENDAR_END_YEAR + 1)
+            for day in HOLIDAY_RULES[name](year)
+        )
+        self.name = name
+        self.holidays = np.array(holidays, dtype='datetime64[D]')
+
+        days = np.arange(_BASE, _END)
+        is_business = np.is_busday(days, holidays=self.holidays)
+        self.cumulative = np.zeros(len(days) + 1, dtype=np.int32)
+        np.cumsum(is_business, out=self.cumulative[1:])
+        # Índices dos dias úteis, para somar n dias úteis a uma data
+        self.business_days_index = np.flatnonzero(is_business).astype(np.int32)
+
+    def _offsets(self, dates):
+        offsets = (to_datetime64(dates) - _BASE).astype(np.int64)
+        if np.any((offsets < 0) | (offsets > len(self.cumulative) - 1)):
+            raise ValueError(f'Data fora do calendário ({CALENDAR_START_YEAR}-{CALENDAR_END_YEAR})')
+        return offsets
+
+    def business_days(self, start, end):
+        """Business days in [start, end); negative when end < start (vectorized)"""
+        count = self.cumulative[self._offsets(end)] - self.cumulative[self._offsets(start)]
+        return int(count) if np.ndim(count) == 0 else count
+
+    def is_business_day(self, dates):
+        offsets = self._offsets(dates)
+        result = self.cumulative[offsets + 1] - self.cumulative[offsets] == 1
+        return bool(result) if np.ndim(result) == 0 else result
+
+    def add_business_days(self, start, n):
+        """Date n business days after start (day 0 is start, or the next business day if it is a holiday)"""
+        position = self.cumulative[self._offsets(start)] + np.asarray(n, dtype=np.int64)
+        result = _BASE + self.business_days_index[position].astype('timedelta64[D]')
+        return result.astype(date) if np.ndim(result) == 0 else result
+
+
+def to_datetime64(dates):
+    """Convert a date, ISO string or array of them to datetime64[D]"""
+    if isinstance(dates, datetime):
+        dates = dates.date()
+    return np.asarray(dates, dtype='datetime64[D]')
+
+
+def get_calendar(name='anbima'):
+    """Return the precomputed calendar, building it once per process"""
+    if name not in HOLIDAY_RULES:
+        raise ValueError(f'Calendário desconhecido: {name}')
+    calendar = _calendars.get(name)
+    if calendar is None:
+        with _calendars_lock:
+            calendar = _calendars.get(name)
+            if calendar is None:
+                calendar = BusinessCalendar(name)
+                _calendars[name] = calendar
+                logger.info(f"Business calendar '{name}' built: {len(calendar.holidays)} holidays")
+    return calendar
+
+
+def business_days(start, end, calendar='anbima'):
+    """Business days in [start, end) for scalars or arrays of dates"""
+    return get_calendar(calendar).business_days(start, end)
+
+
+def is_business_day(dates, calendar='anbima'):
+    return get_calendar(calendar).is_business_day(dates)
+
+
+def add_business_days(start, n, calendar='anbima'):
+    return get_calendar(calendar).add_business_days(start, n)
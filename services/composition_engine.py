@@ -0,0 +1,147 @@
+import logging
+import threading
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Níveis de composição (colunas de asset_categories)
+COMPOSITION_LEVELS = ('location', 'macro_category', 'category_l1', 'category_l2', 'category_l3')
+DEFAULT_LABEL = 'Outros'
+
+_cube_state = {'version': None, 'cube': None}
+_cube_lock = threading.Lock()
+
+
+class CompositionCube:
+    """Portfolio snapshot as arrays: market value per ticker and its category code at every level.
+
+    Totals per level are a bincount over the codes, so any level (or a
+    what-if variation of the values) is aggregated in one vectorized pass.
+    """
+
+    def __init__(self, assets, categories):
+        assets = [asset for asset in assets if asset.get('ticker')]
+        self.tickers = np.array([asset['ticker'] for asset in assets], dtype=object)
+        self.ticker_index = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self.values = np.array([float(asset.get('total_market_value') or 0) for asset in assets])
+        self.prices = np.array([float(asset.get('market_price') or 0) for asset in assets])
+        self.loaded_at = datetime.now().isoformat()
+
+        self.labels, self.codes = {}, {}
+        for level in COMPOSITION_LEVELS:
+            default = 'BR' if level == 'location' else DEFAULT_LABEL
+            raw = [(categories.get(ticker) or {}).get(level) or default for ticker in self.tickers]
+            labels, codes = np.unique(np.array(raw, dtype=str), return_inverse=True)
+            self.labels[level] = labels.tolist()
+            self.codes[level] = codes.astype(np.int64)
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def _check_level(self, level):
+        if level not in COMPOSITION_LEVELS:
+            raise ValueError(f'Nível de composição inválido: {level}')
+
+    def totals(self, level, values=None):
+        """Market value per category of `level` (optionally for alternative per-ticker values)"""
+        self._check_level(level)
+        values = self.values if values is None else values
+        return np.bincount(self.codes[level], values, len(self.labels[level]))
+
+    def category_of(self, level, ticker):
+        return self.labels[level][self.codes[level][self.ticker_index[ticker]]]
+
+    def what_if(self, trades):
+        """Composition at every level before and after hypothetical trades, without touching the snapshot.
+
+        Each trade is {ticker, type (Compra|Venda), amount or quantity [+ price]};
+        tickers not in the portfolio may carry their own location/category fields.
+        """
+        values = self.values.copy()
+        new_tickers, new_values, new_categories = [], [], []
+        for trade in trades:
+            ticker = (trade.get('ticker') or '').strip()
+            if not ticker:
+                raise ValueError('Operação sem ticker')
+            if ticker not in self.ticker_index:
+                ticker = ticker.upper()
+            index = self.ticker_index.get(ticker)
+            price = float(trade.get('price') or (self.prices[index] if index is not None else 0))
+            amount = float(trade['amount']) if trade.get('amount') is not None else float(trade.get('quantity') or 0) * price
+            if amount <= 0:
+                raise ValueError(f'Operação de {ticker} sem valor (informe amount ou quantity e price)')
+            if trade.get('type', 'Compra') == 'Venda':
+                amount = -amount
+
+            if index is not None:
+                values[index] += amount
+            elif ticker in new_tickers:
+                new_values[new_tickers.index(ticker)] += amount
+            else:
+                new_tickers.append(ticker)
+                new_values.append(amount)
+                new_categories.append(trade)
+
+        if (values < -0.01).any() or any(value < -0.01 for value in new_values):
+            raise ValueError('Venda maior que a posição atual')
+
+        levels = {}
+        for level in COMPOSITION_LEVELS:
+            labels = list(self.labels[level])
+            after = self.totals(level, values)
+            default = 'BR' if level == 'location' else DEFAULT_LABEL
+            for value, trade in zip(new_values, new_categories):
+                label = trade.get(level) or default
+                if label not in labels:
+                    labels.append(label)
+                    after = np.append(after, 0.0)
+                after[labels.index(label)] += value
+            before = np.zeros(len(labels))
+            before[:len(self.labels[level])] = self.totals(level)
+            levels[level] = _comparison_rows(labels, before, after)
+
+        return {
+            'total_before': round(float(self.values.sum()), 2),
+            'total_after': round(float(values.sum() + sum(new_values)), 2),
+            'new_tickers': new_tickers,
+            'levels': levels
+        }
+
+
+def _comparison_rows(labels, before, after):
+    total_before, total_after = before.sum(), after.sum()
+    rows = []
+    for label, value_before, value_after in zip(labels, before, after):
+        perc_before = value_before / total_before * 100 if total_before > 0 else 0.0
+        perc_after = value_after / total_after * 100 if total_after > 0 else 0.0
+        rows.append({
+            'name': label,
+            'value_before': round(float(value_before), 2),
+            'value_after': round(float(value_after), 2),
+            'percentage_before': round(float(perc_before), 2),
+            'percentage_after': round(float(perc_after), 2),
+            'delta_pp': round(float(perc_after - perc_before), 2)
+        })
+    return sorted(rows, key=lambda row: row['value_after'], reverse=True)
+
+
+def cached_cube():
+    """Last loaded cube, without checking the data version (None before the first load)"""
+    with _cube_lock:
+        return _cube_state['cube']
+
+
+def get_cube(version, load):
+    """CompositionCube for the given data version; `load()` returns (assets, categories by ticker)"""
+    with _cube_lock:
+        if _cube_state['version'] == version and _cube_state['cube'] is not None:
+            return _cube_state['cube']
+
+    cube = CompositionCube(*load())
+    with _cube_lock:
+        _cube_state['version'] = version
+        _cube_state['cube'] = cube
+    logger.info(f"Composition cube loaded: {len(cube)} tickers")
+    return cube
@@ -0,0 +1,122 @@
+import logging
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Campos de data indexados (cada um com sua própria ordenação)
+CALENDAR_FIELDS = ('payment_date', 'com_date')
+# Atalhos de período aceitos pelo endpoint
+CALENDAR_RANGES = ('next_30_days', 'last_30_days', 'this_week', 'next_week', 'this_month', 'next_month', 'this_year')
+
+_calendar_state = {'version': None, 'calendar': None}
+_calendar_lock = threading.Lock()
+
+
+def _days(values):
+    """ISO dates -> day numbers; missing dates become a sentinel that sorts last"""
+    missing = np.iinfo(np.int64).max
+    return np.array([np.datetime64(value[:10], 'D').astype(np.int64) if value else missing for value in values],
+                    dtype=np.int64)
+
+
+def resolve_range(name, today=None):
+    """(start, end) inclusive dates of a named period"""
+    today = today or date.today()
+    if name == 'next_30_days':
+        return today, today + timedelta(days=30)
+    if name == 'last_30_days':
+        return today - timedelta(days=30), today
+    if name in ('this_week', 'next_week'):
+        monday = today - timedelta(days=today.weekday()) + timedelta(days=7 if name == 'next_week' else 0)
+        return monday, monday + timedelta(days=6)
+    if name in ('this_month', 'next_month'):
+        first = today.replace(day=1)
+        if name == 'next_month':
+            first = (first + timedelta(days=32)).replace(day=1)
+        return first, (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    if name == 'this_year':
+        return today.replace(month=1, day=1), today.replace(month=12, day=31)
+    raise ValueError(f'Período inválido: {name}')
+
+
+class DividendCalendar:
+    """Dividend events as arrays sorted by each date field.
+
+    A date range is two binary searches over the sorted day numbers, then a
+    slice: O(log n + k) per query instead of a scan of the table.
+    """
+
+    def __init__(self, rows):
+        self.rows = [row for row in rows if row.get('payment_date')]
+        self.order, self.days = {}, {}
+        for field in CALENDAR_FIELDS:
+            days = _days([row.get(field) for row in self.rows])
+            order = np.argsort(days, kind='stable')
+            self.order[field] = order
+            self.days[field] = days[order]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def span(self, start, end, field='payment_date'):
+        """Positions [lo, hi) in the `field` ordering with start <= date <= end"""
+        if field not in CALENDAR_FIELDS:
+            raise ValueError(f'Campo de data inválido: {field}')
+        days = self.days[field]
+        lo = np.searchsorted(days, np.datetime64(start, 'D').astype(np.int64), side='left') if start else 0
+        hi = np.searchsorted(days, np.datetime64(end, 'D').astype(np.int64), side='right') if end else \
+            np.searchsorted(days, np.iinfo(np.int64).max, side='left')
+        return int(lo), int(max(hi, lo))
+
+    def query(self, start=None, end=None, field='payment_date', status=None, ticker=None, today=None):
+        """Events in [start, end] on `field`, with the derived Pago/A Pagar status"""
+        today_iso = (today or date.today()).isoformat()
+        lo, hi = self.span(start, end, field)
+        events = []
+        for position in self.order[field][lo:hi]:
+            row = self.rows[position]
+            event_status = 'Pago' if row['payment_date'][:10] <= today_iso else 'A Pagar'
+            if (status and event_status != status) or (ticker and row.get('ticker') != ticker):
+                continue
+            events.append({
+                'id': row.get('id'),
+                'ticker': row.get('ticker'),
+                'type': row.get('type'),
+                'payment_date': row['payment_date'][:10],
+                'com_date': (row.get('com_date') or '')[:10] or None,
+                'net_value': float(row.get('net_value') or 0),
+                'status': event_status
+            })
+        return events
+
+
+def summarize(events, field='payment_date'):
+    """Totals of a calendar slice, overall and per day"""
+    by_day = {}
+    for event in events:
+        day = event.get(field)
+        if day:
+            by_day[day] = by_day.get(day, 0.0) + event['net_value']
+    return {
+        'total': round(sum(event['net_value'] for event in events), 2),
+        'total_paid': round(sum(event['net_value'] for event in events if event['status'] == 'Pago'), 2),
+        'total_pending': round(sum(event['net_value'] for event in events if event['status'] == 'A Pagar'), 2),
+        'by_day': [{'date': day, 'total': round(total, 2)} for day, total in sorted(by_day.items())]
+    }
+
+
+def get_calendar(version, load_rows):
+    """DividendCalendar for the given data version, rebuilt only when the version changes"""
+    with _calendar_lock:
+        if _calendar_state['version'] == version and _calendar_state['calendar'] is not None:
+            return _calendar_state['calendar']
+
+    calendar = DividendCalendar(load_rows())
+    with _calendar_lock:
+        _calendar_state['version'] = version
+        _calendar_state['calendar'] = calendar
+    logger.info(f"Dividend calendar index built: {len(calendar)} events")
+    return calendar
@@ -0,0 +1,264 @@
+import os
+import json
+import logging
+import threading
+from datetime import date
+
+import numpy as np
+
+from config.configs_supaa import LOCAL_DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+FORECAST_STATE_PATH = os.path.join(LOCAL_DATA_DIR, 'dividend_forecast_state.json')
+
+# Janela de ajuste: cadência e valor saem dos pagamentos dos últimos 24 meses
+FIT_WINDOW_MONTHS = 24
+# Periodicidades reconhecidas (meses entre pagamentos)
+CADENCES = (1, 2, 3, 4, 6, 12)
+# Peso do pagamento mais recente na média exponencial dos valores
+AMOUNT_SMOOTHING = 0.4
+# Crescimento anual (12m vs 12m anteriores) é limitado para não extrapolar eventos pontuais
+MAX_ANNUAL_GROWTH = 0.5
+
+FORECAST_MAX_MONTHS = 36
+
+_state_lock = threading.Lock()
+
+
+def month_number(value):
+    """'YYYY-MM[-DD]' -> months since year 0 (integer arithmetic over months)"""
+    return int(value[:4]) * 12 + int(value[5:7]) - 1
+
+
+def month_label(number):
+    return f'{number // 12:04d}-{number % 12 + 1:02d}'
+
+
+def fit_ticker(monthly, current_month):
+    """Cadence, smoothed amount and growth of one ticker from its {month number: total}.
+
+    Only months before the current one are used for the fit; months from the
+    current one on are announced payments, kept as they are. Returns None for
+    tickers without payments in the fit window.
+    """
+    history = sorted(month for month in monthly if current_month - FIT_WINDOW_MONTHS <= month < current_month)
+    announced = sorted(month for month in monthly if month >= current_month)
+    if not history:
+        return None
+
+    amounts = np.array([monthly[month] for month in history])
+    if len(history) >= 2:
+        gap = float(np.median(np.diff(history)))
+        cadence = min(CADENCES, key=lambda candidate: abs(candidate - gap))
+    else:
+        cadence = 12
+
+    level = amounts[0]
+    for amount in amounts[1:]:
+        level = AMOUNT_SMOOTHING * amount + (1 - AMOUNT_SMOOTHING) * level
+
+    # Crescimento só com os dois anos da janela inteiros no histórico (senão o ano anterior parece menor)
+    last_12 = sum(monthly[month] for month in history if month >= current_month - 12)
+    previous_12 = sum(monthly[month] for month in history if month < current_month - 12)
+    full_window = min(monthly) <= current_month - FIT_WINDOW_MONTHS
+    growth = float(np.clip(last_12 / previous_12 - 1, -MAX_ANNUAL_GROWTH, MAX_ANNUAL_GROWTH)) \
+        if full_window and previous_12 > 0 and last_12 > 0 else 0.0
+
+    return {
+        'cadence': cadence,
+        'amount': round(float(level), 6),
+        'annual_growth': round(growth, 6),
+        'last_paid_month': history[-1],
+        'anchor_month': (announced or history)[-1],
+        'payments_in_window': len(history)
+    }
+
+
+class ForecastState:
+    """Monthly dividend totals per ticker plus the fitted parameters.
+
+    New dividend rows are folded into the totals and only the tickers they
+    touch are refitted; every fit is redone when the month turns (the fit
+    window moves), when an already folded row is edited (its updated_at moves
+    past the stored marker) or when the row count no longer adds up (deletions).
+    """
+
+    def __init__(self):
+        self.monthly = {}
+        self.fits = {}
+        self.max_id = 0
+        self.applied_count = 0
+        self.last_updated = None
+        self.fitted_month = None
+
+    def add(self, dividend):
+        self.applied_count += 1
+        self.max_id = max(self.max_id, int(dividend.get('id') or 0))
+        ticker, payment_date = dividend.get('ticker'), dividend.get('payment_date')
+        if not ticker or not payment_date:
+            return None
+        months = self.monthly.setdefault(ticker, {})
+        month = month_number(payment_date)
+        months[month] = months.get(month, 0.0) + float(dividend.get('net_value') or 0)
+        return ticker
+
+    def refit(self, current_month, tickers=None):
+        for ticker in (self.monthly if tickers is None else tickers):
+            self.fits[ticker] = fit_ticker(self.monthly.get(ticker, {}), current_month)
+        self.fitted_month = current_month
+
+    def to_dict(self):
+        return {
+            'max_id': self.max_id,
+            'applied_count': self.applied_count,
+            'last_updated': self.last_updated,
+            'fitted_month': self.fitted_month,
+            'monthly': {ticker: {str(month): total for month, total in months.items()}
+                        for ticker, months in self.monthly.items()},
+            'fits': self.fits
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls()
+        state.max_id = data.get('max_id', 0)
+        state.applied_count = data.get('applied_count', 0)
+        state.last_updated = data.get('last_updated')
+        state.fitted_month = data.get('fitted_month')
+        state.monthly = {ticker: {int(month): total for month, total in months.items()}
+                         for ticker, months in data.get('monthly', {}).items()}
+        state.fits = data.get('fits', {})
+        return state
+
+
+def _load_state():
+    try:
+        with open(FORECAST_STATE_PATH, encoding='utf-8') as state_file:
+            return ForecastState.from_dict(json.load(state_file))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _save_state(state):
+    try:
+        os.makedirs(LOCAL_DATA_DIR, exist_ok=True)
+        with open(FORECAST_STATE_PATH + '.tmp', 'w', encoding='utf-8') as state_file:
+            json.dump(state.to_dict(), state_file)
+        os.replace(FORECAST_STATE_PATH + '.tmp', FORECAST_STATE_PATH)
+    except OSError as e:
+        logger.warning(f"Could not persist dividend forecast state: {e}")
+
+
+def _latest(marker, rows):
+    return max([marker] + [row['updated_at'] for row in rows if row.get('updated_at')], key=lambda value: value or '')
+
+
+def update_state(total_count, last_updated, fetch_changed, fetch_all, today=None, rebuild=False):
+    """Bring the fitted state up to date, folding in only the new dividend rows when possible.
+
+    `last_updated` is the latest dividends.updated_at (set by trigger on
+    insert and edit); `fetch_changed(since)` returns rows updated after the
+    stored marker and `fetch_all()` the whole table (used on rebuild, when a
+    changed row was already folded in, or when the counts do not add up).
+    """
+    current_month = month_number((today or date.today()).isoformat())
+    with _state_lock:
+        state = None if rebuild else _load_state()
+        changed = False
+
+        if state is not None and state.last_updated is None:
+            state = None
+        if state is not None and (state.last_updated != last_updated or state.applied_count != total_count):
+            new_rows = fetch_changed(state.last_updated)
+            edited = any(int(row.get('id') or 0) <= state.max_id for row in new_rows)
+            if edited or state.applied_count + len(new_rows) != total_count:
+                logger.info("Dividend forecast: dividends changed, refitting from scratch")
+                state = None
+            else:
+                touched = {ticker for ticker in map(state.add, new_rows) if ticker}
+                state.refit(current_month, None if state.fitted_month != current_month else touched)
+                state.last_updated = _latest(last_updated, new_rows)
+                changed = True
+                logger.info(f"Dividend forecast: {len(new_rows)} new rows, {len(touched)} tickers refitted")
+
+        if state is None:
+            state = ForecastState()
+            rows = fetch_all()
+            for dividend in rows:
+                state.add(dividend)
+            state.last_updated = _latest(last_updated, rows)
+            state.refit(current_month)
+            changed = True
+        elif state.fitted_month != current_month:
+            state.refit(current_month)
+            changed = True
+
+        if changed:
+            _save_state(state)
+        return state
+
+
+def forecast(state, months=12, held_tickers=None, categories=None, group_field='category_l1', today=None):
+    """Projected income for the next `months` months per ticker, per category and per month.
+
+    Announced rows (payment month >= current month) are used as they are;
+    other months get the fitted amount on the ticker's cadence after its last
+    payment, grown by the fitted annual growth. Tickers outside
+    `held_tickers` (sold positions) only keep their announced payments.
+    """
+    months = int(months)
+    if not 1 <= months <= FORECAST_MAX_MONTHS:
+        raise ValueError(f'Horizonte deve estar entre 1 e {FORECAST_MAX_MONTHS} meses')
+    current_month = month_number((today or date.today()).isoformat())
+    horizon = np.arange(current_month, current_month + months)
+    categories = categories or {}
+
+    tickers, matrix, sources = [], [], []
+    for ticker, fit in state.fits.items():
+        monthly = state.monthly.get(ticker, {})
+        known = np.array([monthly.get(int(month), 0.0) for month in horizon])
+        predicted = np.zeros(months)
+        if fit and (held_tickers is None or ticker in held_tickers):
+            # Próximos pagamentos: a partir do último mês com pagamento (pago ou anunciado), na cadência ajustada
+            steps = horizon - fit['anchor_month']
+            on_cadence = (steps > 0) & (steps % fit['cadence'] == 0)
+            years_ahead = (horizon - fit['last_paid_month']) / 12
+            predicted = np.where(on_cadence, fit['amount'] * (1 + fit['annual_growth']) ** years_ahead, 0.0)
+        row = np.where(known > 0, known, predicted)
+        if row.any():
+            tickers.append(ticker)
+            matrix.append(row)
+            sources.append(np.where(known > 0, 'announced', np.where(predicted > 0, 'forecast', '')))
+
+    matrix = np.array(matrix).reshape(len(tickers), months)
+    labels = [month_label(int(month)) for month in horizon]
+    groups = [(categories.get(ticker) or {}).get(group_field) or 'Outros' for ticker in tickers]
+    group_names, group_codes = np.unique(np.array(groups, dtype=str), return_inverse=True) if tickers else ([], [])
+    by_group = np.zeros((len(group_names), months))
+    np.add.at(by_group, group_codes, matrix)
+
+    announced_mask = np.array(sources).reshape(len(tickers), months) == 'announced'
+    return {
+        'months': labels,
+        'total': round(float(matrix.sum()), 2),
+        'monthly_totals': [{
+            'month': label,
+            'total': round(float(matrix[:, i].sum()), 2),
+            'announced': round(float(matrix[:, i][announced_mask[:, i]].sum()), 2),
+            'forecast': round(float(matrix[:, i][~announced_mask[:, i]].sum()), 2)
+        } for i, label in enumerate(labels)],
+        'by_ticker': sorted([{
+            'ticker': ticker,
+            'category': groups[i],
+            'total': round(float(matrix[i].sum()), 2),
+            'cadence_months': (state.fits.get(ticker) or {}).get('cadence'),
+            'monthly': {labels[j]: round(float(matrix[i, j]), 2) for j in np.flatnonzero(matrix[i])}
+        } for i, ticker in enumerate(tickers)], key=lambda row: row['total'], reverse=True),
+        'by_category': sorted([{
+            'category': str(name),
+            'total': round(float(by_group[i].sum()), 2),
+            'monthly': [round(float(value), 2) for value in by_group[i]]
+        } for i, name in enumerate(group_names)], key=lambda row: row['total'], reverse=True),
+        'group_field': group_field
+    }
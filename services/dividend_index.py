@@ -0,0 +1,129 @@
+import logging
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Janela do yield trailing (12 meses em dias corridos)
+TRAILING_DAYS = 365
+
+_index_state = {'version': None, 'index': None}
+_index_lock = threading.Lock()
+
+
+class TickerDividendIndex:
+    """Paid dividends as a tickers x months matrix, joined with cost and market value per ticker.
+
+    Built in one pass over the dividends; any ticker's monthly series,
+    trailing-12-month income and yields are then array lookups.
+    """
+
+    def __init__(self, dividends, assets, today=None):
+        self.today = today or date.today()
+        today_iso = self.today.isoformat()
+        trailing_start = (self.today - timedelta(days=TRAILING_DAYS)).isoformat()
+
+        paid = [d for d in dividends if d.get('ticker') and d.get('payment_date') and d['payment_date'][:10] <= today_iso]
+        pending = [d for d in dividends if d.get('ticker') and d.get('payment_date') and d['payment_date'][:10] > today_iso]
+        market = {asset['ticker']: asset for asset in assets if asset.get('ticker')}
+
+        self.tickers = sorted({d['ticker'] for d in dividends if d.get('ticker')} | set(market))
+        self.ticker_index = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+        month_numbers = np.array([int(d['payment_date'][:4]) * 12 + int(d['payment_date'][5:7]) - 1 for d in paid],
+                                 dtype=np.int64)
+        current_month = self.today.year * 12 + self.today.month - 1
+        self.first_month = int(month_numbers.min()) if len(paid) else current_month
+        self.months = [f'{m // 12:04d}-{m % 12 + 1:02d}' for m in range(self.first_month, current_month + 1)]
+
+        rows = np.array([self.ticker_index[d['ticker']] for d in paid], dtype=np.int64)
+        values = np.array([float(d.get('net_value') or 0) for d in paid])
+        self.matrix = np.zeros((len(self.tickers), len(self.months)))
+        np.add.at(self.matrix, (rows, month_numbers - self.first_month), values)
+
+        trailing = np.array([d['payment_date'][:10] > trailing_start for d in paid], dtype=bool)
+        self.trailing = np.bincount(rows[trailing], values[trailing], len(self.tickers)) if len(paid) else np.zeros(len(self.tickers))
+        self.pending = np.zeros(len(self.tickers))
+        if pending:
+            np.add.at(self.pending, [self.ticker_index[d['ticker']] for d in pending],
+                      [float(d.get('net_value') or 0) for d in pending])
+
+        self.cost = np.array([float((market.get(t) or {}).get('total_cost') or 0) for t in self.tickers])
+        self.market_value = np.array([float((market.get(t) or {}).get('total_market_value') or 0) for t in self.tickers])
+        self.totals = self.matrix.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.yield_on_cost = np.where(self.cost > 0, self.trailing / self.cost * 100, np.nan)
+            self.trailing_yield = np.where(self.market_value > 0, self.trailing / self.market_value * 100, np.nan)
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def summary(self, i):
+        def clean(value):
+            return round(float(value), 4) if np.isfinite(value) else None
+
+        return {
+            'ticker': self.tickers[i],
+            'total_paid': round(float(self.totals[i]), 2),
+            'total_pending': round(float(self.pending[i]), 2),
+            'trailing_12m': round(float(self.trailing[i]), 2),
+            'total_cost': round(float(self.cost[i]), 2),
+            'total_market_value': round(float(self.market_value[i]), 2),
+            'yield_on_cost_perc': clean(self.yield_on_cost[i]),
+            'trailing_yield_perc': clean(self.trailing_yield[i])
+        }
+
+    def ticker(self, ticker, start=None, end=None):
+        """Summary plus the full monthly series of one ticker (optionally within [start, end] months)"""
+        if ticker not in self.ticker_index:
+            raise KeyError(ticker)
+        i = self.ticker_index[ticker]
+        lo = self.months.index(start) if start in self.months else 0
+        hi = self.months.index(end) + 1 if end in self.months else len(self.months)
+        return {
+            **self.summary(i),
+            'monthly': [{'month': month, 'total': round(float(value), 2)}
+                        for month, value in zip(self.months[lo:hi], self.matrix[i, lo:hi])]
+        }
+
+    def all_tickers(self, tickers=None, include_monthly=False):
+        """Summaries of every ticker with dividends, sorted by trailing income"""
+        selected = [self.ticker_index[t] for t in tickers if t in self.ticker_index] if tickers is not None \
+            else np.flatnonzero((self.totals > 0) | (self.pending > 0)).tolist()
+        rows = []
+        for i in selected:
+            row = self.summary(i)
+            if include_monthly:
+                # Só meses com pagamento, para a resposta de todos os tickers não crescer com o histórico
+                row['monthly'] = {self.months[j]: round(float(self.matrix[i, j]), 2) for j in np.flatnonzero(self.matrix[i])}
+            rows.append(row)
+        return sorted(rows, key=lambda row: row['trailing_12m'], reverse=True)
+
+    def portfolio_totals(self):
+        # Yields da carteira só com os tickers em carteira (vendidos não têm custo nem valor de mercado)
+        cost, market_value = self.cost.sum(), self.market_value.sum()
+        return {
+            'trailing_12m': round(float(self.trailing.sum()), 2),
+            'yield_on_cost_perc': round(float(self.trailing[self.cost > 0].sum() / cost * 100), 4) if cost > 0 else None,
+            'trailing_yield_perc': round(float(self.trailing[self.market_value > 0].sum() / market_value * 100), 4)
+            if market_value > 0 else None
+        }
+
+
+def get_index(version, load):
+    """TickerDividendIndex for the data version; `load()` returns (dividends, assets)"""
+    today = date.today()
+    with _index_lock:
+        index = _index_state['index']
+        # A virada do dia muda o que é pago/pendente e a janela trailing
+        if _index_state['version'] == version and index is not None and index.today == today:
+            return index
+
+    index = TickerDividendIndex(*load(), today=today)
+    with _index_lock:
+        _index_state['version'] = version
+        _index_state['index'] = index
+    logger.info(f"Dividend ticker index built: {len(index)} tickers x {len(index.months)} months")
+    return index
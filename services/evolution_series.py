@@ -0,0 +1,131 @@
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = ('daily', 'weekly', 'monthly', 'auto')
+
+# Pontos máximos devolvidos em resolution=auto
+EVOLUTION_DEFAULT_POINTS = 365
+EVOLUTION_MAX_POINTS = 5000
+
+# Coluna usada pelo LTTB para escolher os pontos representativos
+PRIMARY_FIELD = 'total_patrimony'
+
+_series_state = {'version': None, 'series': None}
+_series_lock = threading.Lock()
+
+
+class EvolutionSeries:
+    """portfolio_evolution as column arrays sorted by reference_date"""
+
+    def __init__(self, rows):
+        rows = sorted((row for row in rows if row.get('reference_date')), key=lambda row: row['reference_date'])
+        self.dates = np.array([row['reference_date'][:10] for row in rows], dtype='datetime64[D]')
+        # Numéricas: colunas com algum valor e todos os valores não nulos int/float (texto é ignorado)
+        numeric, other = [], set()
+        for row in rows:
+            for field, value in row.items():
+                if value is None or field in ('id', 'reference_date'):
+                    continue
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    if field not in numeric:
+                        numeric.append(field)
+                else:
+                    other.add(field)
+        fields = [field for field in numeric if field not in other]
+        self.columns = {
+            field: np.array([np.nan if row.get(field) is None else float(row[field]) for row in rows])
+            for field in fields
+        }
+
+    def __len__(self):
+        return len(self.dates)
+
+    def window(self, start=None, end=None):
+        """Index range [lo, hi) of the rows inside [start, end] (binary search on dates)"""
+        lo = np.searchsorted(self.dates, np.datetime64(start, 'D'), side='left') if start else 0
+        hi = np.searchsorted(self.dates, np.datetime64(end, 'D'), side='right') if end else len(self.dates)
+        return int(lo), int(hi)
+
+
+def last_of_period(dates, resolution):
+    """Indexes of the last row of each week (Mon-Sun) or month"""
+    if len(dates) == 0:
+        return np.array([], dtype=np.int64)
+    if resolution == 'weekly':
+        # 1970-01-01 foi quinta-feira: +3 alinha as semanas na segunda
+        periods = (dates.astype(np.int64) + 3) // 7
+    else:
+        periods = dates.astype('datetime64[M]').astype(np.int64)
+    return np.append(np.flatnonzero(periods[1:] != periods[:-1]), len(dates) - 1)
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indexes of `threshold` points that keep the visual shape"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    y = np.where(np.isfinite(y), y, 0.0)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    # Buckets internos dividem os pontos 1..n-2
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], max(edges[bucket + 1], edges[bucket] + 1)
+        next_start, next_end = edges[bucket + 1], edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_end = max(next_end, next_start + 1)
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+
+        area = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def downsample(series, start=None, end=None, fields=None, resolution='daily', points=EVOLUTION_DEFAULT_POINTS):
+    """Rows of the evolution series in [start, end], reduced to the requested resolution"""
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f'Resolução inválida: {resolution}')
+    fields = fields or list(series.columns)
+    unknown = [field for field in fields if field not in series.columns]
+    if unknown:
+        raise ValueError(f"Campos inválidos: {', '.join(unknown)}")
+
+    lo, hi = series.window(start, end)
+    dates = series.dates[lo:hi]
+
+    if resolution in ('weekly', 'monthly'):
+        indexes = last_of_period(dates, resolution)
+    elif resolution == 'auto' and len(dates) > points:
+        primary = series.columns.get(PRIMARY_FIELD, series.columns[fields[0]])[lo:hi]
+        indexes = lttb(dates.astype(np.int64).astype(np.float64), primary, points)
+    else:
+        indexes = np.arange(len(dates))
+
+    selected_dates = dates[indexes].astype(str)
+    selected_columns = {field: series.columns[field][lo:hi][indexes] for field in fields}
+    return [
+        {'reference_date': str(reference_date),
+         **{field: (None if np.isnan(values[i]) else float(values[i])) for field, values in selected_columns.items()}}
+        for i, reference_date in enumerate(selected_dates)
+    ]
+
+
+def get_series(version, load_rows):
+    """EvolutionSeries for the given data version, loading rows only when the version changes"""
+    with _series_lock:
+        if _series_state['version'] == version and _series_state['series'] is not None:
+            return _series_state['series']
+
+    series = EvolutionSeries(load_rows())
+    with _series_lock:
+        _series_state['version'] = version
+        _series_state['series'] = series
+    logger.info(f"Portfolio evolution series loaded: {len(series)} rows")
+    return series
@@ -0,0 +1,200 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SWING_TRADE = 'swing_trade'
+FII = 'fii'
+EXTERIOR = 'exterior'
+ASSET_CLASSES = (SWING_TRADE, FII, EXTERIOR)
+
+# Regras por classe: alíquota e isenção mensal por volume de vendas
+TAX_RULES = {
+    SWING_TRADE: {'rate': 0.15, 'exemption': 20000.0},
+    FII: {'rate': 0.20, 'exemption': 0.0},
+    # Até 2023: isenção de R$35k/mês em vendas; a partir de 2024 (Lei 14.754/2023) apuração anual a 15%
+    EXTERIOR: {'rate': 0.15, 'exemption': 35000.0, 'annual_from': 2024},
+}
+
+# ETFs e BDRs na B3 não têm a isenção de R$20k
+NO_EXEMPTION_MARKERS = ('ETF', 'BDR')
+
+# Apuração em memória da última geração do livro de posições (ver monthly_tax)
+_tax_state = {'key': None, 'realized_count': 0, 'categories': None, 'results': None, 'carry_after': None}
+_state_lock = threading.Lock()
+
+
+def classify(ticker, category):
+    """Asset class of a ticker from its asset_categories row"""
+    category = category or {}
+    if (category.get('location') or 'BR') != 'BR':
+        return EXTERIOR
+    labels = ' '.join(str(category.get(field) or '') for field in ('macro_category', 'category_l1', 'category_l2')).upper()
+    if 'FII' in labels or 'IMOBILI' in labels:
+        return FII
+    return SWING_TRADE
+
+
+def _exemption_eligible(category):
+    labels = ' '.join(str((category or {}).get(field) or '') for field in ('macro_category', 'category_l1', 'category_l2')).upper()
+    return not any(marker in labels for marker in NO_EXEMPTION_MARKERS)
+
+
+def _empty_bucket():
+    return {'sales': 0.0, 'exempt_sales': 0.0, 'gain': 0.0, 'exempt_gain': 0.0, 'events': []}
+
+
+def group_by_month(realized, categories):
+    """{month: {class: {'sales', 'exempt_sales', 'gain', 'exempt_gain', 'events'}}} from realized sale events.
+
+    exempt_sales/exempt_gain cover only the swing-trade sales eligible for the
+    R$20k exemption (stocks; not ETFs/BDRs).
+    """
+    months = {}
+    for event in realized:
+        category = categories.get(event['ticker'])
+        asset_class = classify(event['ticker'], category)
+        bucket = months.setdefault(event['date'][:7], {}).setdefault(asset_class, _empty_bucket())
+        bucket['sales'] += event['proceeds']
+        if asset_class == SWING_TRADE and _exemption_eligible(category):
+            bucket['exempt_sales'] += event['proceeds']
+            bucket['exempt_gain'] += event['realized_pnl']
+        bucket['gain'] += event['realized_pnl']
+        bucket['events'].append(event)
+    return months
+
+
+def compute_month(month, month_data, carry_in):
+    """Tax of one month per class, given the losses carried in; returns (result, carry_out)"""
+    year = int(month[:4])
+    result, carry_out = {}, dict(carry_in)
+    for asset_class in ASSET_CLASSES:
+        bucket = {**_empty_bucket(), **month_data.get(asset_class, {})}
+        rules = TAX_RULES[asset_class]
+        annual = year >= rules.get('annual_from', 9999)
+        gain = round(bucket['gain'], 2)
+        carried = carry_out.get(asset_class, 0.0)
+
+        if asset_class == SWING_TRADE:
+            # Limite de R$20k só sobre as vendas de ações; ganho de ETF/BDR é sempre tributado
+            stocks_exempt = 0 < bucket['exempt_sales'] <= rules['exemption']
+            exempt_gain = round(max(bucket['exempt_gain'], 0.0), 2) if stocks_exempt else 0.0
+            exempt = stocks_exempt and bucket['exempt_sales'] == bucket['sales']
+        else:
+            exempt = not annual and bucket['sales'] > 0 and bucket['sales'] <= rules['exemption']
+            exempt_gain = max(gain, 0.0) if exempt else 0.0
+        # Resultado sujeito a imposto: prejuízos (inclusive de meses isentos) continuam compensáveis
+        result_gain = round(gain - exempt_gain, 2)
+
+        taxable, loss_used, tax_due = 0.0, 0.0, 0.0
+        if annual:
+            # Apuração anual: prejuízos são compensados em annual_report
+            pass
+        elif result_gain < 0:
+            carried += -result_gain
+        elif result_gain > 0:
+            loss_used = min(carried, result_gain)
+            carried -= loss_used
+            taxable = result_gain - loss_used
+            tax_due = taxable * rules['rate']
+
+        carry_out[asset_class] = round(carried, 2)
+        result[asset_class] = {
+            'sales': round(bucket['sales'], 2),
+            'gain': gain,
+            'exempt': exempt,
+            'exempt_gain': exempt_gain,
+            'annual_assessment': annual,
+            'loss_used': round(loss_used, 2),
+            'taxable_gain': round(taxable, 2),
+            'rate': rules['rate'],
+            'tax_due': round(tax_due, 2),
+            'loss_carry_forward': round(carried, 2),
+            'operations': len(bucket['events'])
+        }
+    return result, carry_out
+
+
+def monthly_tax(book, categories_version, load_categories):
+    """Monthly IR per class, chaining loss carry-forward across months.
+
+    Results are kept in memory per position book generation and categories
+    version. While the generation holds, the book's realized events only
+    grow at the end in date order, so a call regroups and recomputes just
+    the months from the first new sale on; earlier (closed) months and their
+    carry-out are reused as they are. A call with nothing new returns the
+    stored results. `load_categories()` returns {ticker: asset_categories
+    row} and is only called when the categories version changes.
+    """
+    key = (book.method, book.generation, categories_version)
+    realized = book.realized
+    realized_count = len(realized)
+
+    with _state_lock:
+        if _tax_state['key'] == key and _tax_state['realized_count'] == realized_count:
+            return _tax_state['results']
+
+        if _tax_state['key'] == key and _tax_state['realized_count'] < realized_count:
+            categories = _tax_state['categories']
+            first_month = min(event['date'][:7] for event in realized[_tax_state['realized_count']:realized_count])
+            results = {month: result for month, result in _tax_state['results'].items() if month < first_month}
+            carry_after = {month: carry for month, carry in _tax_state['carry_after'].items() if month < first_month}
+            carry = carry_after[max(carry_after)] if carry_after else {asset_class: 0.0 for asset_class in ASSET_CLASSES}
+            # Eventos do mês inicial em diante ficam no fim da lista
+            start = realized_count
+            while start > 0 and realized[start - 1]['date'][:7] >= first_month:
+                start -= 1
+        else:
+            categories = load_categories()
+            results, carry_after = {}, {}
+            carry = {asset_class: 0.0 for asset_class in ASSET_CLASSES}
+            first_month, start = None, 0
+
+        months = group_by_month(realized[start:realized_count], categories)
+        for month in sorted(months):
+            results[month], carry = compute_month(month, months[month], carry)
+            carry_after[month] = carry
+
+        _tax_state.update({'key': key, 'realized_count': realized_count, 'categories': categories,
+                           'results': results, 'carry_after': carry_after})
+        if first_month:
+            logger.info(f"IR: {len(months)} months recomputed from {first_month}")
+        return results
+
+
+def annual_report(monthly, year):
+    """Year totals per class; exterior from 2024 on is assessed here at 15% on the net annual gain"""
+    year = str(year)
+    months = {month: result for month, result in monthly.items() if month.startswith(year)}
+    report = {}
+    for asset_class in ASSET_CLASSES:
+        rows = [result[asset_class] for result in months.values()]
+        gain = round(sum(row['gain'] for row in rows), 2)
+        tax_due = round(sum(row['tax_due'] for row in rows), 2)
+        report[asset_class] = {
+            'sales': round(sum(row['sales'] for row in rows), 2),
+            'gain': gain,
+            'exempt_gain': round(sum(row.get('exempt_gain', 0.0) for row in rows), 2),
+            'tax_due': tax_due,
+            'loss_carry_forward': rows[-1]['loss_carry_forward'] if rows else None
+        }
+
+        annual_from = TAX_RULES[asset_class].get('annual_from')
+        if annual_from and int(year) >= annual_from:
+            # Prejuízo acumulado até a mudança de regra e de anos anteriores compensa o ganho do ano
+            before = [result[asset_class] for month, result in sorted(monthly.items()) if month < str(annual_from)]
+            carried = before[-1]['loss_carry_forward'] if before else 0.0
+            for assessed_year in range(annual_from, int(year) + 1):
+                year_gain = sum(result[asset_class]['gain'] for month, result in monthly.items()
+                                if month.startswith(str(assessed_year)))
+                net = year_gain - carried
+                carried = max(-net, 0.0)
+            report[asset_class].update({
+                'annual_assessment': True,
+                'taxable_gain': round(max(net, 0.0), 2),
+                'tax_due': round(max(net, 0.0) * TAX_RULES[asset_class]['rate'], 2),
+                'loss_carry_forward': round(carried, 2)
+            })
+    report['total_tax_due'] = round(sum(report[asset_class]['tax_due'] for asset_class in ASSET_CLASSES), 2)
+    report['months'] = months
+    return report
@@ -0,0 +1,232 @@
+import os
+import json
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Tamanho máximo de cada pedaço enviado ao modelo e paralelismo máximo
+LLM_CHUNK_CHARS = int(os.getenv('LLM_CHUNK_CHARS', 12000))
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 4))
+
+REQUIRED_FIELDS = ['date', 'asset', 'qty', 'price', 'total']
+
+# Prompt especializado para extrair transações de corretoras americanas
+PROMPT_TEMPLATE = """
+Você é um especialista em análise de extratos financeiros de corretoras americanas.
+
+Analise o seguinte extrato e extraia TODAS as transações de compra e venda de ações, ETFs ou outros ativos.
+
+Para cada transação encontrada, você deve extrair:
+- Data da transação (formato YYYY-MM-DD)
+- Símbolo do ativo (ticker como AAPL, GOOGL, SPY, etc.)
+- Quantidade de ações/cotas
+- Preço unitário em USD
+- Valor total da operação em USD
+- Tipo de operação (BUY ou SELL)
+
+IMPORTANTE:
+1. Ignore dividendos, juros, taxas e outras operações que não sejam compra/venda de ativos
+2. Retorne APENAS um array JSON válido, sem texto adicional
+3. Use números decimais para qty, price e total
+4. Use o formato de data YYYY-MM-DD
+5. Se encontrar datas em outros formatos (MM/DD/YYYY, DD/MM/YYYY), converta para YYYY-MM-DD
+6. Para símbolos de ativos, use apenas letras maiúsculas sem espaços
+7. Este texto pode ser apenas um trecho do extrato; se não houver transações, retorne []
+
+Exemplo do formato esperado:
+[
+  {{
+    "date": "2025-01-15",
+    "asset": "AAPL",
+    "qty": 10.5,
+    "price": 150.25,
+    "total": 1577.63,
+    "type": "BUY"
+  }},
+  {{
+    "date": "2025-01-16",
+    "asset": "GOOGL",
+    "qty": 5.0,
+    "price": 2750.80,
+    "total": 13754.00,
+    "type": "SELL"
+  }}
+]
+
+Texto do extrato para análise:
+{text}
+"""
+
+
+def build_prompt(text):
+    """Build the extraction prompt for one chunk of statement text"""
+    return PROMPT_TEMPLATE.format(text=text)
+
+
+def _split_oversized(text, max_chars):
+    """Split a single page that does not fit in one chunk at line boundaries"""
+    parts = []
+    current = []
+    size = 0
+    for line in text.split('\n'):
+        # Linhas gigantes (raro) são cortadas no limite
+        while len(line) > max_chars:
+            parts.append(line[:max_chars])
+            line = line[max_chars:]
+        if size + len(line) + 1 > max_chars and current:
+            parts.append('\n'.join(current))
+            current = []
+            size = 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        parts.append('\n'.join(current))
+    return parts
+
+
+def chunk_pages(pages, max_chars=LLM_CHUNK_CHARS):
+    """Group page texts into chunks of at most max_chars, splitting only at page
+    boundaries (or line boundaries when a single page is larger than a chunk)"""
+    chunks = []
+    current = []
+    size = 0
+
+    for page in pages:
+        page = page.strip()
+        if not page:
+            continue
+
+        if len(page) > max_chars:
+            if current:
+                chunks.append('\n'.join(current))
+                current = []
+                size = 0
+            chunks.extend(_split_oversized(page, max_chars))
+            continue
+
+        if size + len(page) + 1 > max_chars and current:
+            chunks.append('\n'.join(current))
+            current = []
+            size = 0
+
+        current.append(page)
+        size += len(page) + 1
+
+    if current:
+        chunks.append('\n'.join(current))
+
+    return chunks
+
+
+def format_transaction(tx):
+    """Validate and normalize a transaction returned by the model (None if invalid)"""
+    if not isinstance(tx, dict) or not all(key in tx for key in REQUIRED_FIELDS):
+        return None
+    try:
+        return {
+            'date': str(tx['date']),
+            'asset': str(tx['asset']).upper().strip(),
+            'qty': float(tx['qty']),
+            'price': float(tx['price']),
+            'total': float(tx['total']),
+            'type': str(tx.get('type', 'BUY')).upper()
+        }
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error formatting transaction: {e} - {tx}")
+        return None
+
+
+def parse_transactions(response_text):
+    """Extract and normalize the JSON array of transactions from a model response"""
+    json_start = response_text.find('[')
+    json_end = response_text.rfind(']') + 1
+
+    if json_start < 0 or json_end <= json_start:
+        logger.warning(f"No JSON array found in model response: {response_text[:300]}")
+        return []
+
+    try:
+        raw_transactions = json.loads(response_text[json_start:json_end])
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON decode error: {e} - {response_text[json_start:json_start + 300]}")
+        return []
+
+    transactions = []
+    for tx in raw_transactions:
+        formatted_tx = format_transaction(tx)
+        if formatted_tx:
+            transactions.append(formatted_tx)
+        else:
+            logger.warning(f"Skipping invalid transaction: {tx}")
+    return transactions
+
+
+def transaction_key(tx):
+    """Dedupe key for a trade: (date, asset, qty, price)"""
+    return (tx['date'], tx['asset'], round(tx['qty'], 8), round(tx['price'], 6))
+
+
+def merge_transactions(chunk_results):
+    """Merge per-chunk transaction lists, removing trades repeated across chunks.
+
+    A trade repeated inside the same chunk is kept (two identical fills on the
+    same day are legitimate); across chunks the largest per-chunk count wins,
+    so summaries that repeat earlier pages do not duplicate trades.
+    """
+    merged = []
+    kept = Counter()
+
+    for transactions in chunk_results:
+        chunk_counts = Counter(transaction_key(tx) for tx in transactions)
+        seen_in_chunk = Counter()
+        for tx in transactions:
+            key = transaction_key(tx)
+            seen_in_chunk[key] += 1
+            if seen_in_chunk[key] > kept[key]:
+                merged.append(tx)
+        for key, count in chunk_counts.items():
+            kept[key] = max(kept[key], count)
+
+    merged.sort(key=lambda tx: (tx['date'], tx['asset']))
+    return merged
+
+
+def extract_transactions(pages, generate, max_chars=LLM_CHUNK_CHARS, max_workers=LLM_MAX_CONCURRENCY):
+    """Map-reduce extraction over a statement.
+
+    `generate` is any callable taking a prompt and returning the model text
+    (the Gemini client in production, a local stub in tests). Chunks are sent
+    concurrently with bounded parallelism and the results merged/deduped.
+    Returns (transactions, raw_responses).
+    """
+    chunks = chunk_pages(pages, max_chars)
+    if not chunks:
+        return [], []
+
+    logger.info(f"Sending {len(chunks)} chunks to the model (max {max_workers} concurrent)")
+
+    def run_chunk(chunk):
+        response_text = (generate(build_prompt(chunk)) or '').strip()
+        return response_text, parse_transactions(response_text)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+        results = list(executor.map(run_chunk, chunks))
+
+    raw_responses = [response_text for response_text, _ in results]
+    transactions = merge_transactions([chunk_transactions for _, chunk_transactions in results])
+    return transactions, raw_responses
+
+
+def make_gemini_generator(api_key, model_name=None):
+    """Return a generate(prompt) callable backed by Google Gemini"""
+    import google.generativeai as genai
+
+    genai.configure(api_key=api_key)
+    model = genai.GenerativeModel(model_name or os.getenv('GEMINI_MODEL'))
+
+    def generate(prompt):
+        return model.generate_content(prompt).text
+
+    return generate
@@ -0,0 +1,229 @@
+import os
+import time
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from config.configs_supaa import LOCAL_DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+MYPROFIT_NEW_ASSET_URL = 'https://myprofitweb.com/API/NewAsset'
+
+# Paralelismo e política de retry (configuráveis via .env)
+MYPROFIT_MAX_CONCURRENCY = int(os.getenv('MYPROFIT_MAX_CONCURRENCY', 4))
+MYPROFIT_MAX_RETRIES = int(os.getenv('MYPROFIT_MAX_RETRIES', 3))
+MYPROFIT_BACKOFF_SECONDS = float(os.getenv('MYPROFIT_BACKOFF_SECONDS', 0.5))
+MYPROFIT_TIMEOUT = int(os.getenv('MYPROFIT_TIMEOUT', 30))
+
+LEDGER_PATH = os.path.join(LOCAL_DATA_DIR, 'myprofit_ledger.sqlite3')
+
+_ledger_lock = threading.Lock()
+
+
+def build_form_data(transaction):
+    """Build the MyProfit NewAsset form-data for a transaction (same fields as Postman)"""
+    return {
+        'action': 'new',
+        'category': 'StockExchange',
+        'type': 'ETF_USA',
+        'typeText': 'ETF USA',
+        'operation': 'ManualBuy' if transaction.get('type', 'BUY') == 'BUY' else 'ManualSell',
+        'exchange': 'Inter USA',
+        'date': transaction.get('date', ''),
+        'time': '',
+        'typetax': 'null',
+        'issuer': '',
+        'index': 'null',
+        'duedate': '',
+        'tax': '',
+        'qty': str(transaction.get('qty', 0)),
+        'qtyFund': '',
+        'price': str(transaction.get('price', 0)),
+        'total': str(transaction.get('total', 0)),
+        'docid': '0',
+        'previoustotal': '0',
+        'proventType': 'RENDIMENTO',
+        'asset': transaction.get('asset', ''),
+        'assetBase': ''
+    }
+
+
+def transaction_fingerprints(transactions):
+    """Stable fingerprint per transaction.
+
+    Identical fills in the same import get distinct fingerprints through an
+    occurrence counter, so re-running the same import maps back to the same keys.
+    Rows with non-numeric qty/price/total get None (they are reported as failed).
+    """
+    occurrences = Counter()
+    fingerprints = []
+    for tx in transactions:
+        try:
+            base = (
+                str(tx.get('date', '')),
+                str(tx.get('asset', '')).upper().strip(),
+                str(tx.get('type', 'BUY')).upper(),
+                round(float(tx.get('qty', 0) or 0), 8),
+                round(float(tx.get('price', 0) or 0), 6),
+                round(float(tx.get('total', 0) or 0), 2)
+            )
+        except (TypeError, ValueError, AttributeError):
+            fingerprints.append(None)
+            continue
+        occurrence = occurrences[base]
+        occurrences[base] += 1
+        fingerprints.append(hashlib.sha256(json.dumps([base, occurrence]).encode()).hexdigest())
+    return fingerprints
+
+
+def _ledger_connection():
+    os.makedirs(LOCAL_DATA_DIR, exist_ok=True)
+    connection = sqlite3.connect(LEDGER_PATH, timeout=30)
+    connection.execute(
+        'CREATE TABLE IF NOT EXISTS inserted_transactions ('
+        ' fingerprint TEXT PRIMARY KEY,'
+        ' asset TEXT,'
+        ' transaction_date TEXT,'
+        ' payload TEXT,'
+        ' inserted_at TEXT DEFAULT CURRENT_TIMESTAMP)'
+    )
+    return connection
+
+
+def already_inserted(fingerprints):
+    """Return the subset of fingerprints recorded in the idempotency ledger"""
+    if not fingerprints:
+        return set()
+    with _ledger_lock:
+        connection = _ledger_connection()
+        try:
+            found = set()
+            # SQLite limita o número de parâmetros por query
+            for start in range(0, len(fingerprints), 500):
+                batch = fingerprints[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = connection.execute(
+                    f'SELECT fingerprint FROM inserted_transactions WHERE fingerprint IN ({placeholders})', batch
+                ).fetchall()
+                found.update(row[0] for row in rows)
+            return found
+        finally:
+            connection.close()
+
+
+def record_inserted(fingerprint, transaction):
+    """Record a successfully inserted transaction in the ledger"""
+    with _ledger_lock:
+        connection = _ledger_connection()
+        try:
+            connection.execute(
+                'INSERT OR IGNORE INTO inserted_transactions (fingerprint, asset, transaction_date, payload) VALUES (?, ?, ?, ?)',
+                (fingerprint, transaction.get('asset', ''), transaction.get('date', ''), json.dumps(transaction))
+            )
+            connection.commit()
+        finally:
+            connection.close()
+
+
+def request_never_sent(error):
+    """True when the POST certainly did not reach the server (connect timeout, connection refused, DNS)"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError) or not error.args:
+        return False
+    # requests embrulha o erro do urllib3 (MaxRetryError.reason = NewConnectionError quando a conexão nem abriu)
+    cause = error.args[0]
+    return isinstance(cause, NewConnectionError) or isinstance(getattr(cause, 'reason', None), NewConnectionError)
+
+
+def create_session(cookies, pool_size=MYPROFIT_MAX_CONCURRENCY):
+    """Keep-alive session with a connection pool sized for the submission workers"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Cookie': cookies})
+    return session
+
+
+def submit_transactions(transactions, cookies, max_workers=MYPROFIT_MAX_CONCURRENCY,
+                        max_retries=MYPROFIT_MAX_RETRIES, session=None):
+    """Insert transactions into MyProfit concurrently.
+
+    - one pooled keep-alive session shared by the workers
+    - exponential backoff on 5xx and on connection errors where the request
+      never reached MyProfit (connect timeout / refused)
+    - a read timeout or dropped connection may have inserted the row already:
+      it is not resubmitted and is reported as 'unknown'
+    - a 403 aborts the whole run (cookies expired, every request would fail)
+    - transactions already in the idempotency ledger are skipped
+
+    Returns one result dict per transaction, in input order, with status
+    'inserted', 'skipped', 'failed', 'unknown' or 'aborted'.
+    """
+    fingerprints = transaction_fingerprints(transactions)
+    done = already_inserted([fingerprint for fingerprint in fingerprints if fingerprint])
+    abort_event = threading.Event()
+    session = session or create_session(cookies, max_workers)
+
+    def submit(index):
+        transaction = transactions[index]
+        fingerprint = fingerprints[index]
+        asset = transaction.get('asset', 'N/A')
+        result = {'index': index, 'asset': asset, 'fingerprint': fingerprint}
+
+        if fingerprint is None:
+            return {**result, 'status': 'failed', 'error': f"Transação {index + 1} ({asset}) com qty/price/total inválidos"}
+        if fingerprint in done:
+            return {**result, 'status': 'skipped'}
+
+        form_data = build_form_data(transaction)
+        for attempt in range(max_retries + 1):
+            if abort_event.is_set():
+                return {**result, 'status': 'aborted'}
+            try:
+                response = session.post(
+                    MYPROFIT_NEW_ASSET_URL,
+                    data=form_data,  # form-data como no Postman, não json=
+                    timeout=MYPROFIT_TIMEOUT,
+                    allow_redirects=False  # Não seguir redirects para detectar problemas de auth
+                )
+            except requests.exceptions.RequestException as e:
+                error = f"Erro de requisição ao inserir {asset}: {str(e)}"
+                if not request_never_sent(e):
+                    # O POST pode ter chegado ao MyProfit: reenviar poderia duplicar a transação
+                    logger.warning(f"{error} - insert status unknown, not retrying")
+                    return {**result, 'status': 'unknown',
+                            'error': f"{error} (a transação pode ter sido inserida; confira no MyProfit antes de reenviar)"}
+            else:
+                if response.status_code == 200:
+                    record_inserted(fingerprint, transaction)
+                    logger.info(f"Successfully inserted transaction {index + 1}: {asset}")
+                    return {**result, 'status': 'inserted'}
+                if response.status_code == 403:
+                    abort_event.set()
+                    return {**result, 'status': 'failed', 'auth_error': True,
+                            'error': f"Erro de autenticação ao inserir {asset}: Cookies expirados. Atualize MYPROFIT_API_TOKEN no arquivo .env"}
+                error = f"Erro ao inserir {asset}: HTTP {response.status_code} - {response.text[:100]}"
+                if response.status_code < 500:
+                    # Erros 4xx não melhoram com retry
+                    return {**result, 'status': 'failed', 'error': error}
+
+            if attempt < max_retries:
+                delay = MYPROFIT_BACKOFF_SECONDS * (2 ** attempt)
+                logger.warning(f"{error} - retrying in {delay:.1f}s ({attempt + 1}/{max_retries})")
+                time.sleep(delay)
+
+        return {**result, 'status': 'failed', 'error': error}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(transactions) or 1))) as executor:
+        return list(executor.map(submit, range(len(transactions))))
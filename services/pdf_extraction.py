@@ -0,0 +1,111 @@
+import io
+import os
+import math
+import zipfile
+import zlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+try:
+    import PyPDF2
+    HAVE_PDF_SUPPORT = True
+except ImportError:
+    HAVE_PDF_SUPPORT = False
+    logger.warning("PDF support not available - install PyPDF2 for full functionality")
+
+# Limites de upload/extração (configuráveis via .env)
+PDF_MAX_BYTES = int(os.getenv('PDF_MAX_BYTES', 25 * 1024 * 1024))
+PDF_MAX_PAGES = int(os.getenv('PDF_MAX_PAGES', 600))
+# A partir de quantas páginas vale a pena distribuir em processos
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', 40))
+PDF_MAX_WORKERS = int(os.getenv('PDF_MAX_WORKERS', os.cpu_count() or 2))
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class InvalidArchiveError(ValueError):
+    """Upload declared as zip that is not a readable zip archive"""
+
+
+def read_upload(file_storage, max_bytes=PDF_MAX_BYTES):
+    """Read an uploaded file into memory, enforcing the byte limit while streaming"""
+    buffer = io.BytesIO()
+    stream = file_storage.stream
+
+    while True:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer.write(chunk)
+        if buffer.tell() > max_bytes:
+            raise ValueError(f'Arquivo excede o limite de {max_bytes // (1024 * 1024)} MB')
+
+    return buffer.getvalue()
+
+
+def _extract_page_range(pdf_bytes, start, stop):
+    """Extract the text of pages [start, stop) - runs inside a worker process"""
+    reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+    return [reader.pages[i].extract_text() or '' for i in range(start, stop)]
+
+
+def extract_pages(pdf_bytes, max_pages=PDF_MAX_PAGES):
+    """Extract the text of every page of an in-memory PDF.
+
+    Small documents are read in-process; large statements are split into
+    contiguous page ranges and fanned out across a process pool.
+    Returns a list with one string per page, in order.
+    """
+    if not HAVE_PDF_SUPPORT:
+        raise RuntimeError('PyPDF2 não está instalado')
+
+    reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+    page_count = len(reader.pages)
+
+    if page_count > max_pages:
+        raise ValueError(f'PDF possui {page_count} páginas - limite é {max_pages}')
+
+    workers = min(PDF_MAX_WORKERS, math.ceil(page_count / PDF_PARALLEL_MIN_PAGES))
+    if page_count < PDF_PARALLEL_MIN_PAGES or workers < 2:
+        return [page.extract_text() or '' for page in reader.pages]
+
+    step = math.ceil(page_count / workers)
+    ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    logger.info(f"Extracting {page_count} PDF pages across {len(ranges)} processes")
+
+    pages = []
+    with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+        futures = [executor.submit(_extract_page_range, pdf_bytes, start, stop) for start, stop in ranges]
+        for future in futures:
+            pages.extend(future.result())
+
+    return pages
+
+
+def extract_text(pdf_bytes, max_pages=PDF_MAX_PAGES):
+    """Extract the full text of an in-memory PDF, one page per block"""
+    return '\n'.join(extract_pages(pdf_bytes, max_pages)) + '\n'
+
+
+def read_zip_pdfs(zip_bytes, max_files, max_bytes=PDF_MAX_BYTES):
+    """Return [(name, bytes)] for every PDF inside an in-memory zip archive"""
+    pdfs = []
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(zip_bytes))
+    except zipfile.BadZipFile as e:
+        raise InvalidArchiveError(f'Arquivo zip inválido ou corrompido: {e}')
+    with archive:
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith('.pdf'):
+                continue
+            if len(pdfs) >= max_files:
+                raise ValueError(f'Limite de {max_files} arquivos por lote excedido')
+            if info.file_size > max_bytes:
+                raise ValueError(f'{info.filename} excede o limite de {max_bytes // (1024 * 1024)} MB')
+            try:
+                pdfs.append((os.path.basename(info.filename), archive.read(info)))
+            except (zipfile.BadZipFile, zlib.error) as e:
+                raise InvalidArchiveError(f'{info.filename} corrompido no zip: {e}')
+    return pdfs
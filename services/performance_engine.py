@@ -0,0 +1,298 @@
+import logging
+import threading
+from datetime import date
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Aba da página de rentabilidade -> coluna de asset_categories
+AGGREGATION_FIELDS = {
+    'category': 'macro_category',
+    'group': 'category_l1',
+    'sector': 'category_l2',
+    'location': 'location'
+}
+
+DAYS_PER_YEAR = 365.0
+
+XIRR_LOWER = -0.9999
+XIRR_UPPER = 100.0
+XIRR_TOLERANCE = 1e-9
+XIRR_MAX_ITERATIONS = 200
+
+# Resultados por versão dos dados (contagens/últimas datas das tabelas)
+_results = {}
+_results_lock = threading.Lock()
+MAX_CACHED_VERSIONS = 4
+
+
+def _to_days(dates):
+    return np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+
+
+def xirr_batch(groups, days, amounts, group_count):
+    """Annualized money-weighted return per group, solved for all groups at once.
+
+    `groups` maps each cash flow to its group, `days` are ordinal day numbers
+    and `amounts` signed flows (investor view: contributions negative). Uses
+    Newton steps guarded by a bisection bracket, so groups that Newton would
+    push out of range still converge. Groups without a sign change in their
+    flows have no IRR and come back as NaN.
+    """
+    groups = np.asarray(groups, dtype=np.int64)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    days = np.asarray(days, dtype=np.int64)
+    result = np.full(group_count, np.nan)
+    if len(groups) == 0:
+        return result
+
+    first_day = np.full(group_count, np.iinfo(np.int64).max)
+    np.minimum.at(first_day, groups, days)
+    years = (days - first_day[groups]) / DAYS_PER_YEAR
+    scale = np.bincount(groups, np.abs(amounts), group_count)
+
+    def npv(rate):
+        discount = (1 + rate[groups]) ** -years
+        value = np.bincount(groups, amounts * discount, group_count)
+        derivative = np.bincount(groups, -years * amounts * discount / (1 + rate[groups]), group_count)
+        return value, derivative
+
+    lo = np.full(group_count, XIRR_LOWER)
+    hi = np.full(group_count, XIRR_UPPER)
+    f_lo, _ = npv(lo)
+    f_hi, _ = npv(hi)
+    active = (np.sign(f_lo) != np.sign(f_hi)) & (scale > 0)
+
+    rate = np.where(active, 0.1, np.nan)
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        for _ in range(XIRR_MAX_ITERATIONS):
+            if not active.any():
+                break
+            value, derivative = npv(np.where(active, rate, 0.0))
+            converged = active & (np.abs(value) <= XIRR_TOLERANCE * scale)
+            result[converged] = rate[converged]
+            active &= ~converged
+
+            # Estreita o intervalo com o sinal do NPV no ponto atual
+            same_as_lo = np.sign(value) == np.sign(f_lo)
+            lo = np.where(active & same_as_lo, rate, lo)
+            f_lo = np.where(active & same_as_lo, value, f_lo)
+            hi = np.where(active & ~same_as_lo, rate, hi)
+
+            newton = rate - value / derivative
+            outside = ~np.isfinite(newton) | (newton <= lo) | (newton >= hi)
+            rate = np.where(outside, (lo + hi) / 2, newton)
+
+            narrow = active & (hi - lo < XIRR_TOLERANCE)
+            result[narrow] = rate[narrow]
+            active &= ~narrow
+
+    result[active] = rate[active]
+    return result
+
+
+def allocate_flows(dates, flow_dates, flow_amounts):
+    """Net contributions per row of a sorted date series, each flow attributed to (previous date, date]"""
+    dates = np.asarray(dates).astype('datetime64[D]').astype(np.int64)
+    flows = np.zeros(len(dates))
+    if len(flow_dates):
+        positions = np.searchsorted(dates, _to_days(flow_dates), side='left')
+        inside = (positions > 0) & (positions < len(dates))
+        np.add.at(flows, positions[inside], np.asarray(flow_amounts, dtype=np.float64)[inside])
+    return flows
+
+
+def time_weighted_return(evolution, flow_dates, flow_amounts):
+    """Chained TWR over the portfolio_evolution series.
+
+    Each sub-period return strips the net contributions made in that period:
+    r_t = (V_t - F_t) / V_{t-1} - 1. Returns cumulative, annualized and the
+    last sub-period (daily) return, all as fractions.
+    """
+    evolution = [row for row in evolution if row.get('reference_date') and row.get('total_patrimony') is not None]
+    if len(evolution) < 2:
+        return None
+
+    evolution.sort(key=lambda row: row['reference_date'])
+    dates = _to_days([row['reference_date'][:10] for row in evolution])
+    values = np.array([float(row['total_patrimony'] or 0) for row in evolution])
+
+    flows = allocate_flows(dates, flow_dates, flow_amounts)
+
+    previous = values[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        period_returns = np.where(previous > 0, (values[1:] - flows[1:]) / previous - 1, 0.0)
+    cumulative = float(np.prod(1 + period_returns) - 1)
+    elapsed_years = (dates[-1] - dates[0]) / DAYS_PER_YEAR
+    annualized = (1 + cumulative) ** (1 / elapsed_years) - 1 if elapsed_years > 0 and cumulative > -1 else None
+
+    return {
+        'cumulative': cumulative,
+        'annualized': annualized,
+        'daily': float(period_returns[-1]),
+        'daily_value': float(values[-1] - values[-2] - flows[-1]),
+        'start_date': str(np.datetime64(int(dates[0]), 'D')),
+        'end_date': str(np.datetime64(int(dates[-1]), 'D'))
+    }
+
+
+def _label_for(ticker, aggregation_type, categories):
+    if aggregation_type == 'asset':
+        return ticker
+    return (categories.get(ticker) or {}).get(AGGREGATION_FIELDS[aggregation_type]) or 'Outros'
+
+
+def benchmark_equivalent(benchmark, groups, days, amounts, end_day, group_count):
+    """Value each group would have at end_day had its purchases/sales gone into the benchmark"""
+    if len(days) == 0:
+        return np.zeros(group_count)
+    factors = benchmark.factor(days.astype('datetime64[D]'), np.datetime64(int(end_day), 'D'))
+    return np.bincount(groups, -amounts * factors, group_count)
+
+
+def compute_performance(aggregation_type, transactions, assets, dividends, categories, evolution, today=None,
+                        benchmark=None):
+    """Performance rows for one aggregation (asset/category/group/sector/location) plus the total.
+
+    Per group: money gain (market value + sales - purchases), the same with
+    paid dividends, and XIRR over purchases, sales, dividends and the current
+    position as terminal flow. The total also carries the TWR of the
+    portfolio_evolution series. With a `benchmark` (BenchmarkSeries), each
+    group is compared with the same purchases and sales made in the benchmark
+    and the TWR with the benchmark over the same period.
+    """
+    if aggregation_type != 'asset' and aggregation_type not in AGGREGATION_FIELDS:
+        raise ValueError(f'Tipo de agregação inválido: {aggregation_type}')
+    today = today or date.today()
+
+    # Fluxos: (ticker, data, valor) na visão do investidor
+    tickers, flow_days, flow_amounts, kinds = [], [], [], []
+    for tx in transactions:
+        if not tx.get('transaction_date') or not tx.get('ticker'):
+            continue
+        if tx.get('type') not in ('Compra', 'Venda'):
+            logger.warning(f"Skipping transaction {tx.get('id')} of {tx['ticker']} with unknown type {tx.get('type')!r}")
+            continue
+        value = float(tx.get('total_value') or 0)
+        is_sale = tx['type'] == 'Venda'
+        tickers.append(tx['ticker'])
+        flow_days.append(tx['transaction_date'][:10])
+        flow_amounts.append(abs(value) if is_sale else -abs(value))
+        kinds.append(1 if is_sale else 0)
+    for dividend in dividends:
+        payment_date = dividend.get('payment_date')
+        if not payment_date or not dividend.get('ticker') or payment_date[:10] > today.isoformat():
+            continue
+        tickers.append(dividend['ticker'])
+        flow_days.append(payment_date[:10])
+        flow_amounts.append(float(dividend.get('net_value') or 0))
+        kinds.append(2)
+    market_values = {asset['ticker']: float(asset.get('total_market_value') or 0) for asset in assets}
+    for ticker, value in market_values.items():
+        tickers.append(ticker)
+        flow_days.append(today.isoformat())
+        flow_amounts.append(value)
+        kinds.append(3)
+
+    labels = np.array([_label_for(ticker, aggregation_type, categories) for ticker in tickers], dtype=str)
+    label_names, groups = np.unique(labels, return_inverse=True)
+    group_count = len(label_names)
+    amounts = np.array(flow_amounts, dtype=np.float64)
+    kinds = np.array(kinds, dtype=np.int64)
+    days = _to_days(flow_days) if flow_days else np.array([], dtype=np.int64)
+
+    def total_by(kind):
+        return np.bincount(groups[kinds == kind], np.abs(amounts[kinds == kind]), group_count)
+
+    buys, sales, paid_dividends, current = total_by(0), total_by(1), total_by(2), total_by(3)
+    xirr = xirr_batch(groups, days, amounts, group_count)
+
+    profit = current + sales - buys
+    profit_with_dividends = profit + paid_dividends
+    with np.errstate(divide='ignore', invalid='ignore'):
+        profit_perc = np.where(buys > 0, profit / buys * 100, 0.0)
+        profit_perc_dividends = np.where(buys > 0, profit_with_dividends / buys * 100, 0.0)
+
+    data = [{
+        'aggregation_type': aggregation_type,
+        'aggregation_label': str(label),
+        'total_buy_value': round(float(buys[i]), 2),
+        'total_sell_value': round(float(sales[i]), 2),
+        'current_total_value': round(float(current[i]), 2),
+        'total_profit_value': round(float(profit[i]), 2),
+        'total_profit_perc': round(float(profit_perc[i]), 4),
+        'total_dividends': round(float(paid_dividends[i]), 2),
+        'total_profit_with_dividends': round(float(profit_with_dividends[i]), 2),
+        'total_profit_perc_with_dividends': round(float(profit_perc_dividends[i]), 4),
+        'xirr_perc': round(float(xirr[i]) * 100, 4) if np.isfinite(xirr[i]) else None
+    } for i, label in enumerate(label_names)]
+    if benchmark is not None:
+        trades = kinds < 2
+        equivalent = benchmark_equivalent(benchmark, groups[trades], days[trades], amounts[trades],
+                                          _to_days([today.isoformat()])[0], group_count)
+        benchmark_profit = equivalent + sales - buys
+        with np.errstate(divide='ignore', invalid='ignore'):
+            benchmark_perc = np.where(buys > 0, benchmark_profit / buys * 100, 0.0)
+        for i, row in enumerate(data):
+            row['benchmark_profit_value'] = round(float(benchmark_profit[i]), 2)
+            row['benchmark_profit_perc'] = round(float(benchmark_perc[i]), 4)
+            row['excess_profit_perc'] = round(float(profit_perc_dividends[i] - benchmark_perc[i]), 4)
+    data.sort(key=lambda row: row['total_profit_perc'], reverse=True)
+
+    # Total da carteira: XIRR de todos os fluxos + TWR da evolução patrimonial
+    total_xirr = xirr_batch(np.zeros(len(amounts), dtype=np.int64), days, amounts, 1)[0]
+    trade_mask = kinds < 2
+    twr = time_weighted_return(
+        list(evolution),
+        np.array(flow_days, dtype='datetime64[D]')[trade_mask] if flow_days else [],
+        -amounts[trade_mask]
+    )
+    total_buys, total_current = float(buys.sum()), float(current.sum())
+    total_profit = float(profit.sum())
+    summary = {
+        'aggregation_type': 'total',
+        'aggregation_label': 'Total',
+        'total_buy_value': round(total_buys, 2),
+        'current_total_value': round(total_current, 2),
+        'total_profit_value': round(total_profit, 2),
+        'total_profit_perc': round(twr['cumulative'] * 100, 4) if twr else round(total_profit / total_buys * 100, 4) if total_buys else 0,
+        'total_dividends': round(float(paid_dividends.sum()), 2),
+        'total_profit_with_dividends': round(float(profit_with_dividends.sum()), 2),
+        'daily_profit_value': round(twr['daily_value'], 2) if twr else None,
+        'daily_profit_perc': round(twr['daily'] * 100, 4) if twr else None,
+        'twr_perc': round(twr['cumulative'] * 100, 4) if twr else None,
+        'twr_annualized_perc': round(float(twr['annualized']) * 100, 4) if twr and twr['annualized'] is not None else None,
+        'xirr_perc': round(float(total_xirr) * 100, 4) if np.isfinite(total_xirr) else None,
+        'period_start': twr['start_date'] if twr else None,
+        'period_end': twr['end_date'] if twr else None
+    }
+    if benchmark is not None:
+        summary['benchmark'] = benchmark.name
+        if twr:
+            benchmark_return = float(benchmark.factor(twr['start_date'], twr['end_date'])) - 1
+            summary['benchmark_perc'] = round(benchmark_return * 100, 4)
+            summary['excess_perc'] = round((twr['cumulative'] - benchmark_return) * 100, 4)
+            summary['benchmark_covers_period'] = benchmark.covers(twr['start_date'], twr['end_date'])
+    return data, summary
+
+
+def get_cached_performance(version, aggregation_type, compute):
+    """Memoize compute() per (data version, aggregation); old versions are evicted"""
+    key = (version, aggregation_type)
+    with _results_lock:
+        if key in _results:
+            return _results[key]
+
+    result = compute()
+    with _results_lock:
+        _results[key] = result
+        versions = []
+        for cached_version, _ in _results:
+            if cached_version not in versions:
+                versions.append(cached_version)
+        # Mantém só as versões mais recentes
+        for stale_version in versions[:-MAX_CACHED_VERSIONS]:
+            for cached_key in [k for k in _results if k[0] == stale_version]:
+                del _results[cached_key]
+    return result
@@ -0,0 +1,241 @@
+import os
+import json
+import logging
+import uuid
+import threading
+from collections import deque
+
+from config.configs_supaa import LOCAL_DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# Métodos de custo: preço médio ponderado (regra da Receita) ou FIFO por lotes
+COST_METHODS = ('average', 'fifo')
+
+# Quantidades abaixo disso são tratadas como posição zerada (frações de ativos dos EUA)
+QUANTITY_EPSILON = 1e-8
+
+_checkpoint_lock = threading.Lock()
+# Último livro de cada método em memória (o checkpoint em disco só é lido no primeiro uso)
+_books = {}
+
+
+def checkpoint_path(method):
+    return os.path.join(LOCAL_DATA_DIR, f'positions_checkpoint_{method}.json')
+
+
+def transaction_sort_key(tx):
+    return (str(tx.get('transaction_date') or '')[:10], int(tx.get('id') or 0))
+
+
+class PositionBook:
+    """Per-ticker positions replayed from transactions.
+
+    Keeps open lots (FIFO) or quantity/cost (average), the realized P&L of every
+    sale, a cursor (last applied date/id) and the transactions' latest
+    updated_at, so new transactions can be applied on top of a persisted
+    checkpoint instead of replaying the full history. `generation` changes on
+    every full replay: while it stays the same, `realized` only grows at the
+    end, in date order.
+    """
+
+    def __init__(self, method='average'):
+        if method not in COST_METHODS:
+            raise ValueError(f'Método de custo inválido: {method}')
+        self.method = method
+        self.positions = {}
+        self.realized = []
+        self.cursor = None
+        self.max_id = 0
+        self.applied_count = 0
+        self.last_updated = None
+        self.generation = uuid.uuid4().hex
+
+    def _position(self, ticker):
+        return self.positions.setdefault(ticker, {'quantity': 0.0, 'cost': 0.0, 'lots': []})
+
+    def apply(self, tx):
+        """Apply one Compra/Venda transaction (other types are logged and skipped)"""
+        ticker = tx.get('ticker')
+        quantity = abs(float(tx.get('quantity') or 0))
+        if tx.get('type') not in ('Compra', 'Venda'):
+            logger.warning(f"Skipping transaction {tx.get('id')} of {ticker} with unknown type {tx.get('type')!r}")
+            self._advance(tx)
+            return
+        if not ticker or quantity <= 0:
+            self._advance(tx)
+            return
+
+        total = abs(float(tx.get('total_value') or 0)) or quantity * float(tx.get('price') or 0)
+        date = str(tx.get('transaction_date') or '')[:10]
+        position = self._position(ticker)
+
+        if tx['type'] == 'Venda':
+            self._sell(ticker, position, quantity, total, date)
+        else:
+            position['quantity'] += quantity
+            position['cost'] += total
+            if self.method == 'fifo':
+                position['lots'].append([quantity, total / quantity, date])
+
+        if position['quantity'] < QUANTITY_EPSILON:
+            position.update({'quantity': 0.0, 'cost': 0.0, 'lots': []})
+        self._advance(tx)
+
+    def _advance(self, tx):
+        self.applied_count += 1
+        self.cursor = list(transaction_sort_key(tx))
+        self.max_id = max(self.max_id, int(tx.get('id') or 0))
+
+    def _sell(self, ticker, position, quantity, proceeds, date):
+        held = position['quantity']
+        covered = min(quantity, held)
+        if covered < quantity:
+            # Venda sem histórico de compra suficiente: custo zero no excedente
+            logger.warning(f"Sale of {quantity} {ticker} on {date} exceeds position of {held}")
+
+        if self.method == 'fifo':
+            lots = deque(position['lots'])
+            remaining, cost = covered, 0.0
+            while remaining > QUANTITY_EPSILON and lots:
+                lot_quantity, unit_cost, lot_date = lots[0]
+                used = min(remaining, lot_quantity)
+                cost += used * unit_cost
+                remaining -= used
+                if lot_quantity - used > QUANTITY_EPSILON:
+                    lots[0] = [lot_quantity - used, unit_cost, lot_date]
+                else:
+                    lots.popleft()
+            position['lots'] = list(lots)
+        else:
+            cost = position['cost'] / held * covered if held > 0 else 0.0
+
+        position['quantity'] = max(held - covered, 0.0)
+        position['cost'] = max(position['cost'] - cost, 0.0)
+        self.realized.append({
+            'date': date,
+            'ticker': ticker,
+            'quantity': quantity,
+            'proceeds': round(proceeds, 2),
+            'cost_basis': round(cost, 2),
+            'realized_pnl': round(proceeds - cost, 2)
+        })
+
+    def to_dict(self):
+        return {
+            'method': self.method,
+            'cursor': self.cursor,
+            'max_id': self.max_id,
+            'applied_count': self.applied_count,
+            'last_updated': self.last_updated,
+            'generation': self.generation,
+            'positions': self.positions,
+            'realized': self.realized
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        book = cls(data['method'])
+        book.cursor = data.get('cursor')
+        book.max_id = data.get('max_id', 0)
+        book.applied_count = data.get('applied_count', 0)
+        book.last_updated = data.get('last_updated')
+        book.generation = data.get('generation') or book.generation
+        book.positions = data.get('positions', {})
+        book.realized = data.get('realized', [])
+        return book
+
+
+def load_checkpoint(method):
+    try:
+        with open(checkpoint_path(method), encoding='utf-8') as checkpoint_file:
+            return PositionBook.from_dict(json.load(checkpoint_file))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_checkpoint(book):
+    """Persist the book atomically (same write-then-rename as the renda fixa snapshot)"""
+    try:
+        os.makedirs(LOCAL_DATA_DIR, exist_ok=True)
+        path = checkpoint_path(book.method)
+        with open(path + '.tmp', 'w', encoding='utf-8') as checkpoint_file:
+            json.dump(book.to_dict(), checkpoint_file)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        logger.warning(f"Could not persist positions checkpoint: {e}")
+
+
+def update_book(method, total_count, last_updated, fetch_changed, fetch_all, rebuild=False):
+    """Bring the position book up to date, incrementally when possible.
+
+    `last_updated` is the latest transactions.updated_at (set by trigger on
+    insert and edit); `fetch_changed(since)` returns the transactions updated
+    after `since` and `fetch_all()` the full history. Only brand-new
+    transactions dated after the cursor are applied incrementally; a full
+    replay happens on rebuild, on a missing checkpoint, when a changed row is
+    one already applied (edit), when a new transaction is back-dated or when
+    the row count does not add up (deletions).
+    """
+    with _checkpoint_lock:
+        book = None if rebuild else (_books.get(method) or load_checkpoint(method))
+
+        if book is not None and book.cursor is not None and book.last_updated is not None:
+            if book.last_updated == last_updated and book.applied_count == total_count:
+                _books[method] = book
+                return book
+            changed = sorted(fetch_changed(book.last_updated), key=transaction_sort_key)
+            edited = any(int(tx.get('id') or 0) <= book.max_id for tx in changed)
+            backdated = any(transaction_sort_key(tx)[0] < book.cursor[0] for tx in changed)
+            if not edited and not backdated and book.applied_count + len(changed) == total_count:
+                for tx in changed:
+                    book.apply(tx)
+                book.last_updated = max([last_updated] + [tx['updated_at'] for tx in changed if tx.get('updated_at')],
+                                        key=lambda value: value or '')
+                save_checkpoint(book)
+                _books[method] = book
+                logger.info(f"Positions ({method}): {len(changed)} new transactions applied incrementally")
+                return book
+            logger.info(f"Positions ({method}): history changed, replaying all transactions")
+
+        book = PositionBook(method)
+        history = fetch_all()
+        for tx in sorted(history, key=transaction_sort_key):
+            book.apply(tx)
+        # Marca do que foi lido (pode ser mais novo que last_updated se houve escrita no meio)
+        book.last_updated = max([last_updated] + [tx['updated_at'] for tx in history if tx.get('updated_at')],
+                                key=lambda value: value or '')
+        save_checkpoint(book)
+        _books[method] = book
+        return book
+
+
+def position_rows(book, assets):
+    """Open positions with unrealized P&L against the current market price in `assets`"""
+    market = {asset['ticker']: asset for asset in assets}
+    realized_by_ticker = {}
+    for event in book.realized:
+        realized_by_ticker[event['ticker']] = realized_by_ticker.get(event['ticker'], 0.0) + event['realized_pnl']
+
+    rows = []
+    for ticker in sorted(set(book.positions) | set(realized_by_ticker)):
+        position = book.positions.get(ticker, {'quantity': 0.0, 'cost': 0.0})
+        quantity, cost = position['quantity'], position['cost']
+        asset = market.get(ticker, {})
+        market_price = float(asset.get('market_price') or 0)
+        market_value = quantity * market_price
+        unrealized = market_value - cost if quantity > 0 and market_price > 0 else 0.0
+        rows.append({
+            'ticker': ticker,
+            'quantity': round(quantity, 8),
+            'average_price': round(cost / quantity, 6) if quantity > 0 else 0.0,
+            'total_cost': round(cost, 2),
+            'market_price': market_price,
+            'market_value': round(market_value, 2),
+            'unrealized_pnl': round(unrealized, 2),
+            'unrealized_pnl_perc': round(unrealized / cost * 100, 4) if cost > 0 else 0.0,
+            'realized_pnl': round(realized_by_ticker.get(ticker, 0.0), 2),
+            'assets_average_price': asset.get('average_price'),
+            'assets_total_symbols': asset.get('total_symbols')
+        })
+    return rows
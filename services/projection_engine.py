@@ -0,0 +1,137 @@
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from services.evolution_series import last_of_period
+from services.performance_engine import allocate_flows
+from services.risk_metrics import period_returns
+
+logger = logging.getLogger(__name__)
+
+# Limites da projeção (configuráveis via .env)
+PROJECTION_MAX_PATHS = int(os.getenv('PROJECTION_MAX_PATHS', 100000))
+PROJECTION_MAX_MONTHS = int(os.getenv('PROJECTION_MAX_MONTHS', 600))
+# A partir de quantos caminhos vale a pena distribuir em processos
+PROJECTION_PARALLEL_MIN_PATHS = int(os.getenv('PROJECTION_PARALLEL_MIN_PATHS', 20000))
+PROJECTION_MAX_WORKERS = int(os.getenv('PROJECTION_MAX_WORKERS', os.cpu_count() or 2))
+
+PERCENTILES = (5, 25, 50, 75, 95)
+# Pontos por caminho devolvidos pelos workers (bandas em horizontes longos ficam anuais)
+MAX_BAND_POINTS = 120
+# Histórico usado para a taxa de aporte e o dividend yield
+LOOKBACK_MONTHS = 12
+
+
+def monthly_history(dates, values, flow_dates, flow_amounts):
+    """Contribution-adjusted monthly returns from the evolution series (last row of each month)"""
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    month_ends = last_of_period(dates, 'monthly')
+    month_dates = dates[month_ends]
+    flows = allocate_flows(month_dates, flow_dates, flow_amounts)
+    return period_returns(np.asarray(values, dtype=np.float64)[month_ends], flows)
+
+
+def estimate_inputs(dates, values, flow_dates, flow_amounts, dividend_dates, dividend_amounts, today):
+    """Starting patrimony, monthly returns, average monthly contribution and dividend yield"""
+    returns = monthly_history(dates, values, flow_dates, flow_amounts)
+    start = np.datetime64(today, 'D') - np.timedelta64(LOOKBACK_MONTHS * 30, 'D')
+
+    flow_dates = np.asarray(flow_dates, dtype='datetime64[D]')
+    recent_flows = np.asarray(flow_amounts, dtype=np.float64)[flow_dates >= start] if len(flow_dates) else np.array([])
+    dividend_dates = np.asarray(dividend_dates, dtype='datetime64[D]')
+    recent_dividends = np.asarray(dividend_amounts, dtype=np.float64)[dividend_dates >= start] if len(dividend_dates) else np.array([])
+
+    patrimony = float(values[-1]) if len(values) else 0.0
+    return {
+        'patrimony': patrimony,
+        'returns': returns,
+        'monthly_contribution': float(recent_flows.sum()) / LOOKBACK_MONTHS,
+        'monthly_dividend_yield': float(recent_dividends.sum()) / LOOKBACK_MONTHS / patrimony if patrimony > 0 else 0.0
+    }
+
+
+def simulate_paths(seed_sequence, paths, months, patrimony, returns, monthly_contribution,
+                   dividend_yield, reinvest_dividends, method, sample_months):
+    """Simulate `paths` trajectories month by month (vectorized across paths).
+
+    Returns the patrimony of every path at `sample_months` (paths x samples).
+    Runs in worker processes, so it only takes picklable arguments.
+    """
+    rng = np.random.default_rng(seed_sequence)
+    returns = np.asarray(returns, dtype=np.float64)
+    if method == 'bootstrap':
+        draws = rng.choice(returns, size=(months, paths), replace=True)
+    else:
+        draws = rng.normal(returns.mean(), returns.std(ddof=1), size=(months, paths))
+    # Não deixa um mês sorteado levar o patrimônio abaixo de zero
+    draws = np.maximum(draws, -0.99)
+
+    sample_index = {month: i for i, month in enumerate(sample_months)}
+    samples = np.empty((paths, len(sample_months)))
+    value = np.full(paths, patrimony)
+    for month in range(1, months + 1):
+        dividends = value * dividend_yield if reinvest_dividends else 0.0
+        value = value * (1 + draws[month - 1]) + monthly_contribution + dividends
+        if month in sample_index:
+            samples[:, sample_index[month]] = value
+    return samples
+
+
+def project(inputs, months=120, paths=10000, seed=None, method='bootstrap', reinvest_dividends=True):
+    """Monte Carlo projection returning percentile bands of the patrimony.
+
+    Large path counts are split across a process pool; each chunk gets an
+    independent child of the same SeedSequence, so a given seed reproduces
+    the same bands regardless of how the work was split.
+    """
+    months = int(months)
+    paths = int(paths)
+    if not 1 <= months <= PROJECTION_MAX_MONTHS:
+        raise ValueError(f'Horizonte deve estar entre 1 e {PROJECTION_MAX_MONTHS} meses')
+    if not 1 <= paths <= PROJECTION_MAX_PATHS:
+        raise ValueError(f'Número de caminhos deve estar entre 1 e {PROJECTION_MAX_PATHS}')
+    if method not in ('bootstrap', 'normal'):
+        raise ValueError(f'Método inválido: {method}')
+    if len(inputs['returns']) < 3:
+        raise ValueError('Histórico insuficiente para projetar (mínimo de 3 meses)')
+
+    sample_months = np.unique(np.linspace(1, months, min(months, MAX_BAND_POINTS)).round().astype(int)).tolist()
+    # Divisão fixa em blocos para o resultado não depender do número de workers
+    chunk_size = PROJECTION_PARALLEL_MIN_PATHS // 4
+    chunks = [min(chunk_size, paths - start) for start in range(0, paths, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    args = (months, inputs['patrimony'], inputs['returns'], inputs['monthly_contribution'],
+            inputs['monthly_dividend_yield'], reinvest_dividends, method, sample_months)
+
+    if paths >= PROJECTION_PARALLEL_MIN_PATHS and PROJECTION_MAX_WORKERS > 1:
+        with ProcessPoolExecutor(max_workers=min(PROJECTION_MAX_WORKERS, len(chunks))) as executor:
+            futures = [executor.submit(simulate_paths, child, size, *args) for child, size in zip(seeds, chunks)]
+            samples = np.vstack([future.result() for future in futures])
+    else:
+        samples = np.vstack([simulate_paths(child, size, *args) for child, size in zip(seeds, chunks)])
+
+    bands = np.percentile(samples, PERCENTILES, axis=0)
+    contributed = inputs['patrimony'] + inputs['monthly_contribution'] * np.array(sample_months)
+    return {
+        'months': sample_months,
+        'bands': {f'p{p}': np.round(band, 2).tolist() for p, band in zip(PERCENTILES, bands)},
+        'contributed': np.round(contributed, 2).tolist(),
+        'final': {
+            'mean': round(float(samples[:, -1].mean()), 2),
+            'probability_below_contributed': round(float((samples[:, -1] < contributed[-1]).mean()), 4)
+        },
+        'assumptions': {
+            'patrimony': round(inputs['patrimony'], 2),
+            'monthly_contribution': round(inputs['monthly_contribution'], 2),
+            'monthly_dividend_yield_perc': round(inputs['monthly_dividend_yield'] * 100, 4),
+            'monthly_return_mean_perc': round(float(np.mean(inputs['returns'])) * 100, 4),
+            'monthly_return_std_perc': round(float(np.std(inputs['returns'], ddof=1)) * 100, 4),
+            'history_months': int(len(inputs['returns'])),
+            'reinvest_dividends': reinvest_dividends,
+            'method': method,
+            'paths': paths,
+            'seed': seed
+        }
+    }
@@ -0,0 +1,137 @@
+import logging
+
+import numpy as np
+
+from services.composition_engine import COMPOSITION_LEVELS
+
+logger = logging.getLogger(__name__)
+
+REBALANCE_MODES = ('buy_only', 'buy_sell')
+
+# Tolerância da soma das metas (em pontos percentuais)
+WEIGHT_SUM_TOLERANCE = 0.01
+
+
+def target_vector(labels, targets):
+    """Target weights (fractions) aligned with `labels`; targets is {category: percent} summing to 100.
+
+    Categories held but without a target get weight zero. Targets for
+    categories not held are appended to the labels (they are bought from zero).
+    """
+    unknown = [name for name in targets if name not in labels]
+    labels = list(labels) + unknown
+    weights = np.array([float(targets.get(label, 0) or 0) for label in labels])
+    if (weights < 0).any():
+        raise ValueError('Metas não podem ser negativas')
+    if abs(weights.sum() - 100) > WEIGHT_SUM_TOLERANCE:
+        raise ValueError(f'Metas devem somar 100% (soma atual: {weights.sum():.2f}%)')
+    return labels, weights / weights.sum()
+
+
+def buy_only_allocation(current, weights, contribution):
+    """Final values reachable by only buying with `contribution`, closest to the target weights.
+
+    Water-filling: final_i = max(current_i, w_i * L), with the level L chosen
+    so the finals add up to total + contribution. L is found over the sorted
+    breakpoints current_i / w_i with cumulative sums (no iteration).
+    """
+    budget = current.sum() + contribution
+    weighted = weights > 0
+    if contribution <= 0 or not weighted.any():
+        return current.copy()
+
+    breakpoints = current[weighted] / weights[weighted]
+    order = np.argsort(breakpoints)
+    sorted_breaks = breakpoints[order]
+    sorted_weights = weights[weighted][order]
+    sorted_current = current[weighted][order]
+    fixed = current[~weighted].sum()
+
+    # g(L) no k-ésimo breakpoint: os k+1 primeiros seguem a meta, os demais ficam como estão
+    weight_below = np.cumsum(sorted_weights)
+    current_below = np.cumsum(sorted_current)
+    totals_at_breaks = sorted_breaks * weight_below + (current_below[-1] - current_below) + fixed
+    # g(primeiro breakpoint) = patrimônio atual <= budget, então last >= 0
+    last = int(np.searchsorted(totals_at_breaks, budget, side='right')) - 1
+    level = (budget - fixed - (current_below[-1] - current_below[last])) / weight_below[last]
+
+    final = current.copy()
+    final[weighted] = np.maximum(current[weighted], weights[weighted] * level)
+    return final
+
+
+def rebalance(cube, level, targets, contribution=0.0, mode='buy_only'):
+    """Category orders that bring `level` to the target weights, spread over the tickers.
+
+    buy_sell reaches the targets exactly (orders = target value - current);
+    buy_only never sells and invests the contribution where it reduces the
+    deviation the most. Category orders go to the tickers pro rata to their
+    current value inside the category.
+    """
+    if level not in COMPOSITION_LEVELS:
+        raise ValueError(f'Nível de composição inválido: {level}')
+    if mode not in REBALANCE_MODES:
+        raise ValueError(f'Modo inválido: {mode}')
+    contribution = float(contribution or 0)
+    if contribution < 0 and mode == 'buy_only':
+        raise ValueError('Aporte negativo exige mode=buy_sell')
+
+    labels, weights = target_vector(cube.labels[level], targets)
+    current = np.zeros(len(labels))
+    current[:len(cube.labels[level])] = cube.totals(level)
+    total = current.sum() + contribution
+    if total <= 0:
+        raise ValueError('Carteira vazia e sem aporte')
+
+    if mode == 'buy_sell':
+        final = weights * total
+    else:
+        final = buy_only_allocation(current, weights, contribution)
+    orders = final - current
+
+    # Rateio por ativo dentro da categoria, proporcional ao valor atual
+    codes = cube.codes[level]
+    held = current[:len(cube.labels[level])]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shares = np.where(held[codes] > 0, cube.values / held[codes], 0.0)
+    ticker_orders = orders[codes] * shares
+    with np.errstate(divide='ignore', invalid='ignore'):
+        quantities = np.where(cube.prices > 0, ticker_orders / cube.prices, np.nan)
+
+    categories = [{
+        'name': label,
+        'current_value': round(float(current[i]), 2),
+        'current_perc': round(float(current[i] / current.sum() * 100), 4) if current.sum() > 0 else 0.0,
+        'target_perc': round(float(weights[i] * 100), 4),
+        'order_value': round(float(orders[i]), 2),
+        'final_value': round(float(final[i]), 2),
+        'final_perc': round(float(final[i] / total * 100), 4),
+        # Categoria sem ativos: a compra precisa de um ticker escolhido pelo usuário
+        'needs_ticker': bool(orders[i] > 0 and current[i] <= 0)
+    } for i, label in enumerate(labels)]
+    categories.sort(key=lambda row: row['order_value'], reverse=True)
+
+    active = np.flatnonzero(np.abs(ticker_orders) >= 0.01)
+    tickers = [{
+        'ticker': cube.tickers[i],
+        'category': cube.labels[level][codes[i]],
+        'side': 'Compra' if ticker_orders[i] > 0 else 'Venda',
+        'order_value': round(float(ticker_orders[i]), 2),
+        'market_price': float(cube.prices[i]),
+        'estimated_quantity': round(float(quantities[i]), 6) if np.isfinite(quantities[i]) else None
+    } for i in active[np.argsort(-np.abs(ticker_orders[active]))]]
+
+    deviation_before = np.abs(current / current.sum() - weights).sum() / 2 if current.sum() > 0 else 1.0
+    return {
+        'level': level,
+        'mode': mode,
+        'contribution': round(contribution, 2),
+        'total_before': round(float(current.sum()), 2),
+        'total_after': round(float(total), 2),
+        'total_buy': round(float(orders[orders > 0].sum()), 2),
+        'total_sell': round(float(-orders[orders < 0].sum()), 2),
+        'deviation_before_perc': round(float(deviation_before) * 100, 4),
+        'deviation_after_perc': round(float(np.abs(final / total - weights).sum() / 2) * 100, 4),
+        'categories': categories,
+        'orders': tickers
+    }
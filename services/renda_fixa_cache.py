@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+import requests
+
+from config.configs_supaa import LOCAL_DATA_DIR
+from services.renda_fixa_history import record_snapshot
+
+logger = logging.getLogger(__name__)
+
+FEATURED_INVESTMENTS_URL = 'https://api2.apprendafixa.com.br/vn/get_featured_investments'
+
+# A lista muda poucas vezes por dia: servimos do cache e revalidamos em background
+RENDA_FIXA_CACHE_TTL = int(os.getenv('RENDA_FIXA_CACHE_TTL', 30 * 60))
+RENDA_FIXA_TIMEOUT = int(os.getenv('RENDA_FIXA_TIMEOUT', 30))
+
+SNAPSHOT_PATH = os.path.join(LOCAL_DATA_DIR, 'renda_fixa_featured.json')
+
+# Headers conforme o arquivo MD
+FEATURED_HEADERS = {
+    'accept': 'application/json, text/plain, */*',
+    'accept-language': 'pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7',
+    'content-type': 'application/json',
+    'g-rcp-tkn': '03AFcWeA6wtX3blg_Uibum9MeoU_WmVT8aUILhI72vL3A70H4teAsgMPqpncyWTRdxinOkU4MniQDSF5ccf3klxBoZk_m8eq8O1ALBfNq283TN8XFCQCTnPeePK2nTFUMjrTkfZk4pPTuEzNGvE9keOpfnndH1af_LotGQiCMyAdvz_HArdC1zzuNRpiMPbreFR9lV9RcGnAGL4CQ_ecUBiHM6wwDA2ASgK4522SBBdSrT-aGxhQhurX-EIZTXEn6BW1QDC9RyLmcu7rXmog3SwTVUq5GxY7lVbUOmzKj3oJfmbaV1flVGVG5dRxOEkonWDKhEeGF53p85OmmyUZgigGFt93L0-K5GvNgckkqMnpeQbuvVlB6zlliZMK_mAvi1LKVYASMm3TTUMqr_XNDjcEjbyJvuRtj2qMxqg6edD28n8URlVTXnHP-0-xOV6W72oZRtwUdlj4mgfNUAbwDxGJyp3CM4459cY9GlQVCVncW48Sz2ik0_XOdQcYNobfGf9S8eOWoiKu8GX_9QcLXB2WsvLb9Zp6Is0evvOa7KLcik7-flR2n7qXEJUAhK0IkWVo40gPyjBVMRP9j962FAjJigAAYXltKpB34QPLh8ZtU9QR2e0qjSqeyDHdCWybq2dDbedvwhzPJPPEerPfQv6lTXoSUvL87e3r-c_97VBTzwpOyAuFdsVB8mvU3jsGk3_KYYzmAztmMOAVIa_OnsMCGuujzVKcEVurHDA-8ctXuWvF9sjS3svFK5aPp9pNJ_qXCZ8WO2to2EwR7PTYBELKtIu6lMsk-IGjR7sNzeunJNzBKrR-hRuCEsOSGC4fFLW0WGWO_xHjKpTa99Y_9Cis45ckAKSyWPv4wHbqNFNOEYfBq4_h_M1UVgJ3Oi60SVQLklTI54je-qAWZHquJrKSp0Tt_DDADG22ROFxg-DjykziJbTyfB969PS5biCpDjpc391t25dWedrCyw5gKedhUCbzUHm-uqbRcbiqhzb3yUYdktJGVqOFc',
+    'origin': 'https://apprendafixa.com.br',
+    'priority': 'u=1, i',
+    'referer': 'https://apprendafixa.com.br/',
+    'sec-ch-ua': '"Not;A=Brand";v="99", "Google Chrome";v="139", "Chromium";v="139"',
+    'sec-ch-ua-mobile': '?1',
+    'sec-ch-ua-platform': '"Android"',
+    'sec-fetch-dest': 'empty',
+    'sec-fetch-mode': 'cors',
+    'sec-fetch-site': 'same-site',
+    'user-agent': 'Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Mobile Safari/537.36'
+}
+
+# Estado do cache (um por processo, como o _cache das rotas)
+_state = {'investments': None, 'fetched_at': 0.0, 'refreshing': False}
+_state_lock = threading.Lock()
+
+
+def fetch_featured_investments():
+    """POST to apprendafixa and return the featured investments list.
+
+    Raises requests exceptions on network failures and RuntimeError on a
+    non-200 answer, so callers can map them to HTTP errors.
+    """
+    # Payload conforme o arquivo MD
+    payload = {
+        "idx": [],
+        "corretora": [],
+        "emissor": []
+    }
+
+    response = requests.post(FEATURED_INVESTMENTS_URL, headers=FEATURED_HEADERS, json=payload, timeout=RENDA_FIXA_TIMEOUT)
+    if response.status_code != 200:
+        logger.error(f"External API error: {response.status_code} - {response.text}")
+        raise RuntimeError(f'Erro ao buscar investimentos na API externa (HTTP {response.status_code})')
+    return response.json()
+
+
+def _save_snapshot(investments, fetched_at):
+    """Persist the last good list atomically so restarts and outages have data"""
+    try:
+        os.makedirs(LOCAL_DATA_DIR, exist_ok=True)
+        tmp_path = SNAPSHOT_PATH + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as snapshot_file:
+            json.dump({'fetched_at': fetched_at, 'investments': investments}, snapshot_file, ensure_ascii=False)
+        os.replace(tmp_path, SNAPSHOT_PATH)
+    except OSError as e:
+        logger.warning(f"Could not persist renda fixa snapshot: {e}")
+
+
+def _load_snapshot():
+    try:
+        with open(SNAPSHOT_PATH, encoding='utf-8') as snapshot_file:
+            snapshot = json.load(snapshot_file)
+        return snapshot['investments'], float(snapshot['fetched_at'])
+    except (OSError, ValueError, KeyError):
+        return None, 0.0
+
+
+def _store(investments, fetched_at):
+    with _state_lock:
+        _state['investments'] = investments
+        _state['fetched_at'] = fetched_at
+
+
+def refresh():
+    """Fetch from upstream and update memory + disk snapshot; returns the new list"""
+    investments = fetch_featured_investments()
+    fetched_at = time.time()
+    _store(investments, fetched_at)
+    _save_snapshot(investments, fetched_at)
+    try:
+        record_snapshot(investments, fetched_at)
+    except sqlite3.Error as e:
+        # Histórico é best-effort: não pode derrubar a listagem
+        logger.warning(f"Could not record renda fixa history: {e}")
+    logger.info(f"Renda fixa featured investments refreshed: {len(investments)} offers")
+    return investments
+
+
+def _background_refresh():
+    try:
+        refresh()
+    except Exception as e:
+        # Mantém o último snapshot bom se o upstream estiver fora
+        logger.warning(f"Background refresh of renda fixa investments failed: {e}")
+    finally:
+        with _state_lock:
+            _state['refreshing'] = False
+
+
+def get_featured_investments():
+    """Return (investments, meta) using stale-while-revalidate semantics.
+
+    Fresh data is served from memory; stale data is served immediately while a
+    single background thread revalidates it; a cold process loads the persisted
+    snapshot before falling back to a synchronous upstream fetch.
+    """
+    with _state_lock:
+        investments = _state['investments']
+        fetched_at = _state['fetched_at']
+
+    if investments is None:
+        investments, fetched_at = _load_snapshot()
+        if investments is not None:
+            _store(investments, fetched_at)
+        else:
+            investments = refresh()
+            with _state_lock:
+                fetched_at = _state['fetched_at']
+            return investments, {'fetched_at': fetched_at, 'stale': False, 'source': 'upstream'}
+
+    age = time.time() - fetched_at
+    stale = age >= RENDA_FIXA_CACHE_TTL
+    if stale:
+        with _state_lock:
+            start_refresh = not _state['refreshing']
+            _state['refreshing'] = True
+        if start_refresh:
+            threading.Thread(target=_background_refresh, name='renda-fixa-refresh', daemon=True).start()
+
+    return investments, {'fetched_at': fetched_at, 'stale': stale, 'source': 'cache'}
@@ -0,0 +1,258 @@
+import os
+import re
+import logging
+from datetime import date
+
+import numpy as np
+
+from services.business_calendar import business_days
+
+logger = logging.getLogger(__name__)
+
+# Premissas de mercado (% a.a.) - podem ser sobrescritas por request
+RENDA_FIXA_CDI_ANUAL = float(os.getenv('RENDA_FIXA_CDI_ANUAL', 14.90))
+RENDA_FIXA_IPCA_ANUAL = float(os.getenv('RENDA_FIXA_IPCA_ANUAL', 4.50))
+# Rendimento da poupança por dia útil (%), usado quando o payload não traz rpd
+RENDA_FIXA_POUPANCA_DIARIA = float(os.getenv('RENDA_FIXA_POUPANCA_DIARIA', 0.0205))
+
+BUSINESS_DAYS_PER_YEAR = 252
+BUSINESS_DAYS_PER_MONTH = 21
+
+# Produtos isentos de IR para pessoa física
+EXEMPT_TYPES = {'LCI', 'LCA', 'CRI', 'CRA', 'LIG', 'LCD'}
+
+# Tabela regressiva de IR: (dias corridos até, alíquota)
+IR_TABLE = [(180, 0.225), (360, 0.20), (720, 0.175)]
+IR_MIN_RATE = 0.15
+
+PRE = 'PRÉ'
+CDI_PERC = 'CDI%'
+CDI_PLUS = 'CDI+'
+IPCA_PLUS = 'IPCA+'
+INDEX_CODES = {PRE: 0, CDI_PERC: 1, CDI_PLUS: 2, IPCA_PLUS: 3}
+
+NUMBER_RE = re.compile(r'-?\d+(?:[.,]\d+)?')
+
+
+def normalize_index(idx, taxa=''):
+    """Map the payload idx/taxa to one of PRÉ, CDI%, CDI+ or IPCA+"""
+    idx = (idx or '').upper()
+    taxa = str(taxa or '').upper()
+    if 'IPCA' in idx or 'IPCA' in taxa:
+        return IPCA_PLUS
+    if 'CDI' in idx or 'SELIC' in idx or 'CDI' in taxa:
+        if '+' in idx or '+' in taxa:
+            return CDI_PLUS
+        return CDI_PERC
+    return PRE
+
+
+def parse_rate(investment):
+    """Contracted rate in % (taxa string like '13.03%', '110% CDI', 'IPCA + 7%' or juros)"""
+    juros = investment.get('juros')
+    if juros not in (None, ''):
+        try:
+            return float(juros)
+        except (TypeError, ValueError):
+            pass
+    match = NUMBER_RE.search(str(investment.get('taxa', '')))
+    return float(match.group().replace(',', '.')) if match else 0.0
+
+
+def ir_rate(dc):
+    """Regressive income tax rate for a holding period in calendar days (vectorized)"""
+    dc = np.asarray(dc, dtype=np.float64)
+    rate = np.full(dc.shape, IR_MIN_RATE)
+    for limit, table_rate in reversed(IR_TABLE):
+        rate = np.where(dc <= limit, table_rate, rate)
+    return rate
+
+
+def is_exempt(investment):
+    return bool(investment.get('incentivada')) or (investment.get('tipo') or '').upper().strip() in EXEMPT_TYPES
+
+
+def annual_gross_rate_by_code(codes, rate, cdi, ipca):
+    """Gross annual rate as a fraction, vectorized over index codes/rates/scenarios"""
+    codes = np.asarray(codes)
+    rate = np.asarray(rate, dtype=np.float64) / 100
+    cdi = np.asarray(cdi, dtype=np.float64) / 100
+    ipca = np.asarray(ipca, dtype=np.float64) / 100
+
+    # % do CDI incide sobre o fator diário
+    cdi_daily = ((1 + cdi) ** (1 / BUSINESS_DAYS_PER_YEAR) - 1) * rate
+    return np.select(
+        [codes == INDEX_CODES[CDI_PERC], codes == INDEX_CODES[CDI_PLUS], codes == INDEX_CODES[IPCA_PLUS]],
+        [(1 + cdi_daily) ** BUSINESS_DAYS_PER_YEAR - 1, (1 + cdi) * (1 + rate) - 1, (1 + ipca) * (1 + rate) - 1],
+        default=rate
+    )
+
+
+def annual_gross_rate(index, rate, cdi=RENDA_FIXA_CDI_ANUAL, ipca=RENDA_FIXA_IPCA_ANUAL):
+    """Gross annual rate as a fraction for an index type"""
+    return annual_gross_rate_by_code(INDEX_CODES[index], rate, cdi, ipca)
+
+
+def business_days_for(dc, start=None):
+    """Business days in the next dc calendar days (ANBIMA calendar, vectorized over dc)"""
+    start = np.datetime64(start or date.today(), 'D')
+    return business_days(start, start + np.asarray(dc, dtype='timedelta64[D]'))
+
+
+def compute_returns(annual_rate, du, dc, amount, exempt, poupanca_diaria=RENDA_FIXA_POUPANCA_DIARIA):
+    """Core return math, broadcasting over numpy arrays.
+
+    annual_rate is a fraction; du/dc are business/calendar days to maturity.
+    Returns a dict of arrays with the same fields as compute_private_investment.
+    """
+    annual_rate = np.asarray(annual_rate, dtype=np.float64)
+    du = np.asarray(du, dtype=np.float64)
+    amount = np.asarray(amount, dtype=np.float64)
+    exempt = np.asarray(exempt, dtype=bool)
+
+    growth = np.log1p(annual_rate)
+    gross_period = np.expm1(growth * du / BUSINESS_DAYS_PER_YEAR)
+    tax_rate = np.where(exempt, 0.0, ir_rate(dc))
+    net_period = gross_period * (1 - tax_rate)
+
+    safe_du = np.where(du > 0, du, 1)
+    net_growth = np.log1p(net_period) / safe_du
+
+    gross_value = amount * (1 + gross_period)
+    tax_value = (gross_value - amount) * tax_rate
+    net_value = gross_value - tax_value
+
+    poupanca_factor = (1 + np.asarray(poupanca_diaria, dtype=np.float64) / 100) ** du
+
+    return {
+        'rbd': np.expm1(growth / BUSINESS_DAYS_PER_YEAR) * 100,
+        'rbm': np.expm1(growth * BUSINESS_DAYS_PER_MONTH / BUSINESS_DAYS_PER_YEAR) * 100,
+        'rba': annual_rate * 100,
+        'rbp': gross_period * 100,
+        'rlp': net_period * 100,
+        'rld': np.expm1(net_growth) * 100,
+        'rlm': np.expm1(net_growth * BUSINESS_DAYS_PER_MONTH) * 100,
+        'rla': np.expm1(net_growth * BUSINESS_DAYS_PER_YEAR) * 100,
+        'vb': gross_value,
+        'vl': net_value,
+        'vrl': net_value - amount,
+        'tir': tax_rate * 100,
+        'vir': tax_value,
+        'rpp': (poupanca_factor - 1) * 100,
+        'vpp': amount * poupanca_factor
+    }
+
+
+# Casas decimais usadas pela API externa em cada campo
+FIELD_DECIMALS = {
+    'rbd': 6, 'rbm': 4, 'rba': 2, 'rbp': 2, 'rlp': 2, 'rld': 6, 'rlm': 2, 'rla': 2,
+    'vb': 2, 'vl': 2, 'vrl': 2, 'tir': 2, 'vir': 2, 'rpp': 2, 'vpp': 2
+}
+
+# Campos do investimento ecoados na resposta (como a API externa faz)
+ECHO_FIELDS = ['emissor', 'vencimento', 'taxa', 'liquidez', 'incentivada', 'rating', 'agencia', 'nr',
+               'qtdMinima', 'tipo', 'corretora', 'a', 'idx', 'am']
+
+
+def simulate(investment, amount, cdi=None, ipca=None, start=None):
+    """Simulate one investment locally; same response shape as compute_private_investment"""
+    cdi = RENDA_FIXA_CDI_ANUAL if cdi is None else float(cdi)
+    ipca = RENDA_FIXA_IPCA_ANUAL if ipca is None else float(ipca)
+
+    dc = int(investment.get('dc') or 0)
+    du = investment.get('du')
+    du = int(du) if du not in (None, '') else business_days_for(dc, start)
+
+    index = normalize_index(investment.get('idx'), investment.get('taxa'))
+    rate = parse_rate(investment)
+    exempt = is_exempt(investment)
+    poupanca_diaria = float(investment.get('rpd') or RENDA_FIXA_POUPANCA_DIARIA)
+
+    annual_rate = annual_gross_rate(index, rate, cdi, ipca)
+    results = compute_returns(annual_rate, du, dc, float(amount), exempt, poupanca_diaria)
+
+    simulation = {field: investment.get(field) for field in ECHO_FIELDS if field in investment}
+    simulation.update({field: round(float(value), FIELD_DECIMALS[field]) for field, value in results.items()})
+    simulation.update({
+        'preco': float(amount),
+        'dc': dc,
+        'du': du,
+        'juros': rate,
+        'indexador': index,
+        'prlt': simulation['rlp'],
+        'rpd': poupanca_diaria,
+        'tt': simulation['rba'],
+        'total': simulation['rba'],
+        'premissas': {'cdi': cdi, 'ipca': ipca}
+    })
+    if not exempt:
+        simulation['teq'] = f"LCI/LCA {round(simulation['rba'] * (1 - simulation['tir'] / 100), 2)}% {investment.get('idx', index)}"
+    return simulation
+
+
+def investment_arrays(investments, start=None):
+    """Column arrays of the simulation inputs for a list of investments"""
+    dc = np.array([int(inv.get('dc') or 0) for inv in investments])
+    du = np.array([int(inv['du']) if inv.get('du') not in (None, '') else -1 for inv in investments])
+    # du ausente: uma única consulta vetorizada ao calendário
+    missing = du < 0
+    if missing.any():
+        du[missing] = business_days_for(dc[missing], start)
+    return {
+        'codes': np.array([INDEX_CODES[normalize_index(inv.get('idx'), inv.get('taxa'))] for inv in investments]),
+        'rate': np.array([parse_rate(inv) for inv in investments]),
+        'dc': dc,
+        'du': du,
+        'exempt': np.array([is_exempt(inv) for inv in investments]),
+        'minimum': np.array([float(inv.get('qtdMinima') or 0) for inv in investments]),
+        'poupanca': np.array([float(inv.get('rpd') or RENDA_FIXA_POUPANCA_DIARIA) for inv in investments])
+    }
+
+
+def simulate_grid(investments, amounts, scenarios=None, start=None):
+    """Evaluate an investments x amounts (x rate scenarios) grid in one vectorized pass.
+
+    Returns, per scenario, N x M matrices of net value/gain, whether each amount
+    meets the investment minimum, and the rank of each investment per amount
+    (1 = highest net gain among feasible offers).
+    """
+    scenarios = scenarios or [{}]
+    cdi = np.array([float(sc.get('cdi', RENDA_FIXA_CDI_ANUAL)) for sc in scenarios])
+    ipca = np.array([float(sc.get('ipca', RENDA_FIXA_IPCA_ANUAL)) for sc in scenarios])
+    amounts = np.asarray(amounts, dtype=np.float64)
+    cols = investment_arrays(investments, start)
+
+    # Shapes: scenarios (S,1,1) x investimentos (1,N,1) x valores (1,1,M)
+    annual_rate = annual_gross_rate_by_code(cols['codes'][None, :], cols['rate'][None, :], cdi[:, None], ipca[:, None])
+    results = compute_returns(
+        annual_rate[:, :, None],
+        cols['du'][None, :, None],
+        cols['dc'][None, :, None],
+        amounts[None, None, :],
+        cols['exempt'][None, :, None],
+        cols['poupanca'][None, :, None]
+    )
+
+    feasible = amounts[None, :] >= cols['minimum'][:, None]
+    grids = []
+    for s, scenario_cdi in enumerate(cdi):
+        net_gain = results['vrl'][s]
+        ranked_gain = np.where(feasible, net_gain, -np.inf)
+        # Posição de cada investimento por valor (desc), inviáveis ficam sem rank
+        order = np.argsort(-ranked_gain, axis=0, kind='stable')
+        rank = np.empty_like(order)
+        np.put_along_axis(rank, order, np.arange(1, len(investments) + 1)[:, None], axis=0)
+
+        grids.append({
+            'cdi': float(scenario_cdi),
+            'ipca': float(ipca[s]),
+            'net_annual': np.round(results['rla'][s][:, 0], 2).tolist(),
+            'gross_value': np.round(results['vb'][s], 2).tolist(),
+            'net_value': np.round(results['vl'][s], 2).tolist(),
+            'net_gain': np.round(net_gain, 2).tolist(),
+            'feasible': feasible.tolist(),
+            'rank': np.where(feasible, rank, 0).tolist(),
+            'best': [int(order[0, m]) if feasible[order[0, m], m] else None for m in range(len(amounts))],
+            'order': np.argsort(-results['rla'][s][:, 0], kind='stable').tolist()
+        })
+    return grids
@@ -0,0 +1,188 @@
+import os
+import json
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+from config.configs_supaa import LOCAL_DATA_DIR
+from services.renda_fixa_engine import normalize_index, parse_rate
+
+logger = logging.getLogger(__name__)
+
+HISTORY_PATH = os.path.join(LOCAL_DATA_DIR, 'renda_fixa_history.sqlite3')
+
+# Campos que mudam todo dia sem a oferta mudar (prazo corrido até o vencimento)
+VOLATILE_FIELDS = {'dc', 'du'}
+
+_history_lock = threading.Lock()
+
+
+def _connection():
+    os.makedirs(LOCAL_DATA_DIR, exist_ok=True)
+    connection = sqlite3.connect(HISTORY_PATH, timeout=30)
+    connection.executescript(
+        'CREATE TABLE IF NOT EXISTS snapshots ('
+        ' id INTEGER PRIMARY KEY,'
+        ' fetched_at REAL NOT NULL,'
+        ' offer_count INTEGER NOT NULL);'
+        'CREATE TABLE IF NOT EXISTS offer_versions ('
+        ' id INTEGER PRIMARY KEY,'
+        ' offer_key TEXT NOT NULL,'
+        ' content_hash TEXT NOT NULL,'
+        ' emissor TEXT,'
+        ' idx TEXT,'
+        ' tipo TEXT,'
+        ' corretora TEXT,'
+        ' vencimento TEXT,'
+        ' rate REAL,'
+        ' first_snapshot INTEGER NOT NULL,'
+        ' last_snapshot INTEGER NOT NULL,'
+        ' payload BLOB NOT NULL);'
+        'CREATE INDEX IF NOT EXISTS idx_versions_key ON offer_versions (offer_key, last_snapshot);'
+        'CREATE INDEX IF NOT EXISTS idx_versions_emissor ON offer_versions (emissor, first_snapshot);'
+        'CREATE INDEX IF NOT EXISTS idx_versions_idx ON offer_versions (idx, first_snapshot);'
+    )
+    return connection
+
+
+def offer_key(investment):
+    """Identity of an offer across refreshes (upstream id, else its descriptive fields)"""
+    oid = (investment.get('_id') or {}).get('$oid') if isinstance(investment.get('_id'), dict) else investment.get('_id')
+    if oid:
+        return str(oid)
+    return '|'.join(str(investment.get(field, '')) for field in ('corretora', 'emissor', 'tipo', 'vencimento', 'taxa'))
+
+
+def content_hash(investment):
+    stable = {key: value for key, value in investment.items() if key not in VOLATILE_FIELDS}
+    return hashlib.sha256(json.dumps(stable, sort_keys=True, ensure_ascii=False, default=str).encode()).hexdigest()
+
+
+def record_snapshot(investments, fetched_at):
+    """Store one refresh, extending the version range of offers that did not change.
+
+    An offer seen in the previous snapshot with the same content keeps its row
+    and only last_snapshot moves forward; new or changed offers get a new
+    version row with the compressed payload.
+    """
+    with _history_lock:
+        connection = _connection()
+        try:
+            previous = connection.execute('SELECT MAX(id) FROM snapshots').fetchone()[0]
+            snapshot_id = connection.execute(
+                'INSERT INTO snapshots (fetched_at, offer_count) VALUES (?, ?)', (fetched_at, len(investments))
+            ).lastrowid
+
+            open_versions = {}
+            if previous is not None:
+                rows = connection.execute(
+                    'SELECT id, offer_key, content_hash FROM offer_versions WHERE last_snapshot = ?', (previous,)
+                ).fetchall()
+                open_versions = {(key, digest): version_id for version_id, key, digest in rows}
+
+            extended, created = [], []
+            for investment in investments:
+                key, digest = offer_key(investment), content_hash(investment)
+                version_id = open_versions.pop((key, digest), None)
+                if version_id is not None:
+                    extended.append((snapshot_id, version_id))
+                    continue
+                created.append((
+                    key, digest,
+                    investment.get('emissor'), normalize_index(investment.get('idx'), investment.get('taxa')),
+                    investment.get('tipo'), investment.get('corretora'), investment.get('vencimento'),
+                    parse_rate(investment), snapshot_id, snapshot_id,
+                    zlib.compress(json.dumps(investment, ensure_ascii=False, default=str).encode())
+                ))
+
+            connection.executemany('UPDATE offer_versions SET last_snapshot = ? WHERE id = ?', extended)
+            connection.executemany(
+                'INSERT INTO offer_versions (offer_key, content_hash, emissor, idx, tipo, corretora, vencimento,'
+                ' rate, first_snapshot, last_snapshot, payload) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                created
+            )
+            connection.commit()
+            logger.info(f"Renda fixa snapshot {snapshot_id}: {len(extended)} unchanged, {len(created)} new versions")
+            return snapshot_id
+        finally:
+            connection.close()
+
+
+def _to_timestamp(value):
+    if value in (None, ''):
+        return None
+    return datetime.fromisoformat(str(value)).timestamp()
+
+
+def _where(emissor=None, idx=None, tipo=None):
+    clauses, params = [], []
+    if emissor:
+        clauses.append('UPPER(v.emissor) LIKE ?')
+        params.append(f'%{emissor.upper()}%')
+    if idx:
+        clauses.append('v.idx = ?')
+        params.append(normalize_index(idx))
+    if tipo:
+        clauses.append('UPPER(v.tipo) = ?')
+        params.append(tipo.upper())
+    return clauses, params
+
+
+def rate_series(emissor=None, idx=None, tipo=None, start=None, end=None):
+    """Per-snapshot rate statistics of the offers matching the filters"""
+    clauses, params = _where(emissor, idx, tipo)
+    clauses.append('s.id BETWEEN v.first_snapshot AND v.last_snapshot')
+    if start:
+        clauses.append('s.fetched_at >= ?')
+        params.append(_to_timestamp(start))
+    if end:
+        clauses.append('s.fetched_at <= ?')
+        params.append(_to_timestamp(end))
+
+    with _history_lock:
+        connection = _connection()
+        try:
+            rows = connection.execute(
+                'SELECT s.id, s.fetched_at, COUNT(*), AVG(v.rate), MIN(v.rate), MAX(v.rate)'
+                ' FROM snapshots s JOIN offer_versions v ON ' + ' AND '.join(clauses) +
+                ' GROUP BY s.id ORDER BY s.id', params
+            ).fetchall()
+        finally:
+            connection.close()
+
+    return [{
+        'snapshot': snapshot_id,
+        'fetched_at': datetime.fromtimestamp(fetched_at).isoformat(),
+        'offers': count,
+        'rate_avg': round(rate_avg, 4),
+        'rate_min': rate_min,
+        'rate_max': rate_max
+    } for snapshot_id, fetched_at, count, rate_avg, rate_min, rate_max in rows]
+
+
+def offer_versions(emissor=None, idx=None, tipo=None, limit=500):
+    """Distinct offer versions with the period each was on the list"""
+    clauses, params = _where(emissor, idx, tipo)
+    where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+
+    with _history_lock:
+        connection = _connection()
+        try:
+            rows = connection.execute(
+                'SELECT v.offer_key, v.rate, f.fetched_at, l.fetched_at, v.payload FROM offer_versions v'
+                ' JOIN snapshots f ON f.id = v.first_snapshot JOIN snapshots l ON l.id = v.last_snapshot' +
+                where + ' ORDER BY v.first_snapshot DESC LIMIT ?', params + [int(limit)]
+            ).fetchall()
+        finally:
+            connection.close()
+
+    return [{
+        'offer_key': key,
+        'rate': rate,
+        'first_seen': datetime.fromtimestamp(first_seen).isoformat(),
+        'last_seen': datetime.fromtimestamp(last_seen).isoformat(),
+        'investment': json.loads(zlib.decompress(payload))
+    } for key, rate, first_seen, last_seen, payload in rows]
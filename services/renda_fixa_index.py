@@ -0,0 +1,174 @@
+import logging
+import threading
+from datetime import date
+
+import numpy as np
+
+from services.renda_fixa_cache import get_featured_investments
+from services.renda_fixa_engine import (
+    RENDA_FIXA_CDI_ANUAL, RENDA_FIXA_IPCA_ANUAL,
+    annual_gross_rate_by_code, compute_returns, investment_arrays
+)
+
+logger = logging.getLogger(__name__)
+
+# Campos categóricos com índice invertido (valor normalizado -> posições)
+CATEGORICAL_FIELDS = ('tipo', 'idx', 'corretora', 'emissor', 'liquidez')
+
+# Campos aceitos em sort=...
+SORT_FIELDS = ('rla', 'rba', 'taxa', 'dc', 'qtdMinima', 'tipo', 'emissor', 'corretora')
+
+MAX_PER_PAGE = 200
+
+_index_state = {'fetched_at': None, 'index': None}
+_index_lock = threading.Lock()
+
+
+def _normalize(value):
+    return str(value or '').strip().upper()
+
+
+class OfferIndex:
+    """Column store over one snapshot of the featured offers.
+
+    Built once per upstream refresh: categorical inverted indexes, the offers
+    sorted by maturity (range filters via searchsorted) and the net-of-tax
+    equivalent annual yield (rla) under the default CDI/IPCA premises, which
+    puts PRÉ, CDI and IPCA offers on the same scale.
+    """
+
+    def __init__(self, investments, start=None):
+        self.investments = investments
+        self.size = len(investments)
+        self.premissas = {'cdi': RENDA_FIXA_CDI_ANUAL, 'ipca': RENDA_FIXA_IPCA_ANUAL}
+
+        columns = investment_arrays(investments, start or date.today()) if investments else None
+        if columns is None:
+            self.columns = {name: np.array([]) for name in ('dc', 'rate', 'minimum', 'rba', 'rla')}
+            self.columns['incentivada'] = np.array([], dtype=bool)
+        else:
+            annual_rate = annual_gross_rate_by_code(columns['codes'], columns['rate'],
+                                                    self.premissas['cdi'], self.premissas['ipca'])
+            returns = compute_returns(annual_rate, columns['du'], columns['dc'], 1.0, columns['exempt'])
+            self.columns = {
+                'dc': columns['dc'],
+                'rate': columns['rate'],
+                'minimum': columns['minimum'],
+                'rba': np.round(returns['rba'], 2),
+                'rla': np.round(returns['rla'], 2),
+                'incentivada': np.array([bool(inv.get('incentivada')) for inv in investments])
+            }
+
+        self.text = {field: np.array([_normalize(inv.get(field)) for inv in investments], dtype=object)
+                     for field in CATEGORICAL_FIELDS}
+        self.inverted = {}
+        for field in CATEGORICAL_FIELDS:
+            positions = {}
+            for position, value in enumerate(self.text[field]):
+                positions.setdefault(value, []).append(position)
+            self.inverted[field] = {value: np.array(items) for value, items in positions.items()}
+
+        self.by_maturity = np.argsort(self.columns['dc'], kind='stable')
+        self.sorted_dc = self.columns['dc'][self.by_maturity]
+
+    def facets(self):
+        """Distinct values per categorical field (for the filter dropdowns)"""
+        return {
+            field: sorted({str(inv.get(field)) for inv in self.investments if inv.get(field)})
+            for field in ('tipo', 'idx', 'corretora', 'liquidez')
+        }
+
+    def _exact(self, field, values):
+        mask = np.zeros(self.size, dtype=bool)
+        for value in values:
+            positions = self.inverted[field].get(_normalize(value))
+            if positions is not None:
+                mask[positions] = True
+        return mask
+
+    def _contains(self, field, needle):
+        needle = _normalize(needle)
+        return np.array([needle in value for value in self.text[field]], dtype=bool)
+
+    def filter_mask(self, filters):
+        """Boolean mask of offers matching all filters"""
+        mask = np.ones(self.size, dtype=bool)
+
+        for field in ('tipo', 'idx', 'corretora'):
+            values = filters.get(field)
+            if values:
+                mask &= self._exact(field, values)
+        if filters.get('emissor'):
+            mask &= self._contains('emissor', filters['emissor'])
+        if filters.get('liquidez'):
+            mask &= self._contains('liquidez', filters['liquidez'])
+
+        dc_min, dc_max = filters.get('dc_min'), filters.get('dc_max')
+        if dc_min is not None or dc_max is not None:
+            lo = np.searchsorted(self.sorted_dc, dc_min, side='left') if dc_min is not None else 0
+            hi = np.searchsorted(self.sorted_dc, dc_max, side='right') if dc_max is not None else self.size
+            in_range = np.zeros(self.size, dtype=bool)
+            in_range[self.by_maturity[lo:hi]] = True
+            mask &= in_range
+
+        if filters.get('taxa_min') is not None:
+            mask &= self.columns['rate'] >= filters['taxa_min']
+        if filters.get('rla_min') is not None:
+            mask &= self.columns['rla'] >= filters['rla_min']
+        if filters.get('valor') is not None:
+            # Ofertas cujo aporte mínimo cabe no valor disponível
+            mask &= self.columns['minimum'] <= filters['valor']
+        if filters.get('incentivada'):
+            mask &= self.columns['incentivada']
+        return mask
+
+    def _sort_key(self, field):
+        if field == 'taxa':
+            return self.columns['rate']
+        if field == 'qtdMinima':
+            return self.columns['minimum']
+        if field in ('tipo', 'emissor', 'corretora'):
+            return self.text[field]
+        return self.columns[field]
+
+    def query(self, filters=None, sort='rla', direction='desc', page=1, per_page=20):
+        """Filter, sort and paginate; returns (offers, total, page served)
+
+        The page is clamped to [1, total pages] (1 when nothing matches).
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f'Campo de ordenação inválido: {sort}')
+        positions = np.flatnonzero(self.filter_mask(filters or {}))
+
+        key = self._sort_key(sort)[positions]
+        order = np.argsort(key, kind='stable')
+        if direction == 'desc':
+            order = order[::-1]
+        positions = positions[order]
+
+        per_page = max(1, min(int(per_page), MAX_PER_PAGE))
+        pages = max(1, (len(positions) + per_page - 1) // per_page)
+        page = min(max(1, int(page)), pages)
+        start = (page - 1) * per_page
+        offers = [
+            {**self.investments[position],
+             'rba_equivalente': float(self.columns['rba'][position]),
+             'rla_equivalente': float(self.columns['rla'][position])}
+            for position in positions[start:start + per_page]
+        ]
+        return offers, len(positions), page
+
+
+def get_offer_index():
+    """Return (index, meta) for the current cached offer list, rebuilding only after a refresh"""
+    investments, meta = get_featured_investments()
+    with _index_lock:
+        if _index_state['index'] is not None and _index_state['fetched_at'] == meta['fetched_at']:
+            return _index_state['index'], meta
+
+    index = OfferIndex(investments)
+    with _index_lock:
+        _index_state['index'] = index
+        _index_state['fetched_at'] = meta['fetched_at']
+    logger.info(f"Renda fixa offer index built: {index.size} offers")
+    return index, meta
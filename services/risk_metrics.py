@@ -0,0 +1,130 @@
+import logging
+import threading
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+logger = logging.getLogger(__name__)
+
+# Janela do retorno móvel em dias corridos (12 meses)
+ROLLING_RETURN_DAYS = 365
+
+_memo = {}
+_memo_lock = threading.Lock()
+MAX_MEMO_ENTRIES = 32
+
+
+def periods_per_year(dates):
+    """Annualization factor from the typical spacing of the series (daily/weekly/monthly)"""
+    if len(dates) < 2:
+        return 12
+    spacing = float(np.median(np.diff(dates.astype(np.int64))))
+    if spacing <= 1.5:
+        return 252
+    if spacing <= 8:
+        return 52
+    return 12
+
+
+def period_returns(values, flows):
+    """Sub-period returns with net contributions removed: (V_t - F_t) / V_{t-1} - 1"""
+    previous = values[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = (values[1:] - flows[1:]) / previous - 1
+    return np.where((previous > 0) & np.isfinite(returns), returns, 0.0)
+
+
+def rolling_std(returns, window):
+    """Rolling sample standard deviation; NaN until the window is full"""
+    result = np.full(len(returns), np.nan)
+    if len(returns) >= window > 1:
+        result[window - 1:] = sliding_window_view(returns, window).std(axis=1, ddof=1)
+    return result
+
+
+def drawdown(index):
+    peaks = np.maximum.accumulate(index)
+    return index / peaks - 1
+
+
+def rolling_period_return(dates, index, days=ROLLING_RETURN_DAYS):
+    """index_t / index_(t - days) - 1 using a binary search for the lookback point"""
+    day_numbers = dates.astype(np.int64)
+    lookback = np.searchsorted(day_numbers, day_numbers - days, side='left')
+    result = index / index[lookback] - 1
+    # Só vale quando a série cobre a janela inteira
+    result[day_numbers - day_numbers[0] < days] = np.nan
+    return result
+
+
+def compute_risk(dates, values, flows=None, risk_free=None, window=None):
+    """Volatility, drawdown, rolling 12-month return and Sharpe/Sortino for one series.
+
+    `flows` are net contributions per row (stripped from returns) and
+    `risk_free` the per-period risk-free returns (e.g. derived from
+    cdi_acum_perc); both aligned with `dates`. `window` is the rolling
+    volatility window in periods (defaults to one year of periods).
+    """
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < 3:
+        raise ValueError('Série muito curta para métricas de risco')
+    flows = np.zeros(len(values)) if flows is None else np.asarray(flows, dtype=np.float64)
+
+    ppy = periods_per_year(dates)
+    window = int(window or ppy)
+    returns = period_returns(values, flows)
+    index = np.concatenate([[1.0], np.cumprod(1 + returns)])
+    excess = returns - (np.zeros(len(returns)) if risk_free is None else np.asarray(risk_free, dtype=np.float64)[1:])
+
+    years = (dates[-1] - dates[0]).astype(np.int64) / 365.0
+    total_return = index[-1] - 1
+    annual_return = (index[-1]) ** (1 / years) - 1 if years > 0 and index[-1] > 0 else None
+    volatility = float(returns.std(ddof=1) * np.sqrt(ppy))
+    excess_std = excess.std(ddof=1)
+    downside = excess[excess < 0]
+    downside_dev = np.sqrt((downside ** 2).sum() / len(excess)) if len(excess) else 0.0
+
+    dd = drawdown(index)
+    trough = int(np.argmin(dd))
+    peak = int(np.argmax(index[:trough + 1]))
+    rolling_vol = np.concatenate([[np.nan], rolling_std(returns, window) * np.sqrt(ppy)])
+    rolling_return = rolling_period_return(dates, index)
+
+    def clean(array, digits=6):
+        return [None if not np.isfinite(value) else round(float(value), digits) for value in array]
+
+    return {
+        'periods_per_year': ppy,
+        'window': window,
+        'start_date': str(dates[0]),
+        'end_date': str(dates[-1]),
+        'total_return_perc': round(float(total_return) * 100, 4),
+        'annual_return_perc': round(float(annual_return) * 100, 4) if annual_return is not None else None,
+        'volatility_perc': round(volatility * 100, 4),
+        'max_drawdown_perc': round(float(dd[trough]) * 100, 4),
+        'max_drawdown_peak': str(dates[peak]),
+        'max_drawdown_trough': str(dates[trough]),
+        'sharpe': round(float(excess.mean() / excess_std * np.sqrt(ppy)), 4) if excess_std > 0 else None,
+        'sortino': round(float(excess.mean() / downside_dev * np.sqrt(ppy)), 4) if downside_dev > 0 else None,
+        'series': {
+            'dates': dates.astype(str).tolist(),
+            'drawdown_perc': clean(dd * 100, 4),
+            'rolling_volatility_perc': clean(rolling_vol * 100, 4),
+            'rolling_12m_return_perc': clean(rolling_return * 100, 4)
+        }
+    }
+
+
+def memoized(key, compute):
+    """Memoize compute() per key (data version + parameters)"""
+    with _memo_lock:
+        if key in _memo:
+            return _memo[key]
+    result = compute()
+    with _memo_lock:
+        _memo[key] = result
+        if len(_memo) > MAX_MEMO_ENTRIES:
+            # dict mantém ordem de inserção: descarta a entrada mais antiga
+            del _memo[next(iter(_memo))]
+    return result
@@ -0,0 +1,117 @@
+-- Consolidado de dividends por (ticker, mês) com valores pagos e a pagar
+-- Mantido por triggers em dividends e por um job diário (pg_cron) que move o que venceu de "a pagar" para "pago"
+CREATE TABLE public.dividends_monthly_rollup (
+  ticker text NOT NULL,
+  month text NOT NULL,
+  paid_value numeric NOT NULL DEFAULT 0,
+  pending_value numeric NOT NULL DEFAULT 0,
+  paid_count integer NOT NULL DEFAULT 0,
+  pending_count integer NOT NULL DEFAULT 0,
+  updated_at timestamp with time zone NOT NULL DEFAULT now(),
+  CONSTRAINT dividends_monthly_rollup_pkey PRIMARY KEY (ticker, month)
+) TABLESPACE pg_default;
+
+-- Índices para performance
+CREATE INDEX idx_dividends_monthly_rollup_month ON public.dividends_monthly_rollup(month);
+-- Usado no recálculo de uma célula (ticker, mês)
+CREATE INDEX IF NOT EXISTS idx_dividends_ticker_payment_date ON public.dividends(ticker, payment_date);
+
+-- Recalcula uma célula a partir de dividends (idempotente: serve para trigger, job e correções)
+CREATE OR REPLACE FUNCTION public.dividends_monthly_rollup_recompute(p_ticker text, p_month text) RETURNS void
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+  month_start date;
+BEGIN
+  IF p_month IS NULL THEN
+    RETURN;
+  END IF;
+  month_start := to_date(p_month, 'YYYY-MM');
+
+  DELETE FROM public.dividends_monthly_rollup WHERE ticker = p_ticker AND month = p_month;
+
+  -- Filtros sem função sobre as colunas para usar idx_dividends_ticker_payment_date;
+  -- ticker vazio é a célula dos dividendos sem ticker (ticker IS NULL)
+  INSERT INTO public.dividends_monthly_rollup (ticker, month, paid_value, pending_value, paid_count, pending_count)
+  SELECT p_ticker, p_month,
+         COALESCE(SUM(net_value) FILTER (WHERE payment_date::date <= current_date), 0),
+         COALESCE(SUM(net_value) FILTER (WHERE payment_date::date > current_date), 0),
+         COUNT(*) FILTER (WHERE payment_date::date <= current_date),
+         COUNT(*) FILTER (WHERE payment_date::date > current_date)
+  FROM public.dividends
+  WHERE (ticker = p_ticker OR (p_ticker = '' AND ticker IS NULL))
+    AND payment_date >= month_start
+    AND payment_date < month_start + interval '1 month'
+  HAVING COUNT(*) > 0;
+END;
+$$;
+
+-- Trigger de dividends: recalcula a célula antiga e a nova
+CREATE OR REPLACE FUNCTION public.dividends_monthly_rollup_on_dividend() RETURNS trigger
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.payment_date IS NOT NULL THEN
+    PERFORM public.dividends_monthly_rollup_recompute(COALESCE(OLD.ticker, ''), left(OLD.payment_date::text, 7));
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.payment_date IS NOT NULL THEN
+    IF TG_OP = 'INSERT' OR COALESCE(OLD.ticker, '') <> COALESCE(NEW.ticker, '')
+       OR OLD.payment_date IS DISTINCT FROM NEW.payment_date OR OLD.net_value IS DISTINCT FROM NEW.net_value THEN
+      PERFORM public.dividends_monthly_rollup_recompute(COALESCE(NEW.ticker, ''), left(NEW.payment_date::text, 7));
+    END IF;
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_dividends_monthly_rollup
+AFTER INSERT OR UPDATE OR DELETE ON public.dividends
+FOR EACH ROW EXECUTE FUNCTION public.dividends_monthly_rollup_on_dividend();
+
+-- Job diário: recalcula as células com pagamentos que venceram nos últimos dias
+-- (janela de 7 dias cobre execuções perdidas; o recálculo é idempotente)
+CREATE OR REPLACE FUNCTION public.dividends_monthly_rollup_settle() RETURNS integer
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+  r record;
+  cells integer := 0;
+BEGIN
+  FOR r IN
+    SELECT DISTINCT COALESCE(ticker, '') AS ticker, left(payment_date::text, 7) AS month
+    FROM public.dividends
+    WHERE payment_date::date BETWEEN current_date - 7 AND current_date
+  LOOP
+    PERFORM public.dividends_monthly_rollup_recompute(r.ticker, r.month);
+    cells := cells + 1;
+  END LOOP;
+  RETURN cells;
+END;
+$$;
+
+-- Agenda o job (pg_cron usa UTC: 03:05 UTC = 00:05 em Brasília)
+CREATE EXTENSION IF NOT EXISTS pg_cron;
+SELECT cron.schedule('dividends-monthly-rollup-settle', '5 3 * * *', $$SELECT public.dividends_monthly_rollup_settle()$$);
+
+-- Carga inicial a partir do histórico
+INSERT INTO public.dividends_monthly_rollup (ticker, month, paid_value, pending_value, paid_count, pending_count)
+SELECT COALESCE(ticker, ''), left(payment_date::text, 7),
+       COALESCE(SUM(net_value) FILTER (WHERE payment_date::date <= current_date), 0),
+       COALESCE(SUM(net_value) FILTER (WHERE payment_date::date > current_date), 0),
+       COUNT(*) FILTER (WHERE payment_date::date <= current_date),
+       COUNT(*) FILTER (WHERE payment_date::date > current_date)
+FROM public.dividends
+WHERE payment_date IS NOT NULL
+GROUP BY 1, 2;
+
+-- RLS (Row Level Security) - leitura liberada; escrita só pelos triggers/job (SECURITY DEFINER)
+ALTER TABLE public.dividends_monthly_rollup ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Enable read access for all users" ON public.dividends_monthly_rollup
+FOR SELECT USING (true);
+
+-- Comentários
+COMMENT ON TABLE public.dividends_monthly_rollup IS 'Dividendos por ticker e mês, separados em pagos e a pagar; mantido por triggers e pelo job diário';
+COMMENT ON COLUMN public.dividends_monthly_rollup.ticker IS 'Ticker do dividendo (vazio quando não informado)';
+COMMENT ON COLUMN public.dividends_monthly_rollup.month IS 'Mês de pagamento (YYYY-MM)';
+COMMENT ON COLUMN public.dividends_monthly_rollup.paid_value IS 'Soma de net_value com payment_date até hoje';
+COMMENT ON COLUMN public.dividends_monthly_rollup.pending_value IS 'Soma de net_value com payment_date futura';
+COMMENT ON COLUMN public.dividends_monthly_rollup.paid_count IS 'Quantidade de dividendos pagos da célula';
+COMMENT ON COLUMN public.dividends_monthly_rollup.pending_count IS 'Quantidade de dividendos a pagar da célula';
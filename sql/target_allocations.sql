@@ -0,0 +1,29 @@
+-- Metas de alocação por nível de composição (usadas pelo rebalanceamento)
+CREATE TABLE public.target_allocations (
+  id bigint GENERATED BY DEFAULT AS IDENTITY NOT NULL,
+  created_at timestamp with time zone NOT NULL DEFAULT now(),
+  updated_at timestamp with time zone NOT NULL DEFAULT now(),
+  level text NOT NULL,
+  category text NOT NULL,
+  target_weight numeric(7,4) NOT NULL,
+  CONSTRAINT target_allocations_pkey PRIMARY KEY (id),
+  CONSTRAINT target_allocations_level_category_key UNIQUE (level, category),
+  CONSTRAINT target_allocations_level_check CHECK (level IN ('location', 'macro_category', 'category_l1', 'category_l2', 'category_l3')),
+  CONSTRAINT target_allocations_weight_check CHECK (target_weight >= 0 AND target_weight <= 100)
+) TABLESPACE pg_default;
+
+-- Índices para performance
+CREATE INDEX idx_target_allocations_level ON public.target_allocations(level);
+
+-- RLS (Row Level Security) - ajuste conforme suas políticas
+ALTER TABLE public.target_allocations ENABLE ROW LEVEL SECURITY;
+
+-- Política básica (permitir tudo para usuários autenticados)
+CREATE POLICY "Enable all operations for authenticated users" ON public.target_allocations
+FOR ALL USING (auth.role() = 'authenticated');
+
+-- Comentários
+COMMENT ON TABLE public.target_allocations IS 'Metas de peso por categoria em cada nível de composição da carteira';
+COMMENT ON COLUMN public.target_allocations.level IS 'Nível: location, macro_category, category_l1, category_l2 ou category_l3';
+COMMENT ON COLUMN public.target_allocations.category IS 'Nome da categoria no nível (mesmo texto de asset_categories)';
+COMMENT ON COLUMN public.target_allocations.target_weight IS 'Peso alvo em % (as metas de um nível somam 100)';
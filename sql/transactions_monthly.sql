@@ -0,0 +1,153 @@
+-- Consolidado mensal de transactions por (mês, tipo, category_l1)
+-- Mantido por triggers em transactions e asset_categories; lido pelos endpoints de aportes/compras/vendas
+CREATE TABLE public.transactions_monthly (
+  month text NOT NULL,
+  type text NOT NULL,
+  category_l1 text NOT NULL,
+  total_value numeric NOT NULL DEFAULT 0,
+  transaction_count integer NOT NULL DEFAULT 0,
+  updated_at timestamp with time zone NOT NULL DEFAULT now(),
+  CONSTRAINT transactions_monthly_pkey PRIMARY KEY (month, type, category_l1)
+) TABLESPACE pg_default;
+
+-- Índices para performance
+CREATE INDEX idx_transactions_monthly_type ON public.transactions_monthly(type);
+-- Usado pelo recálculo quando a categoria de um ticker muda
+CREATE INDEX IF NOT EXISTS idx_transactions_ticker ON public.transactions(ticker);
+
+-- Soma valor e contagem numa célula (valores negativos desfazem); células zeradas são apagadas
+CREATE OR REPLACE FUNCTION public.transactions_monthly_add(
+  p_month text, p_type text, p_category_l1 text, p_value numeric, p_count integer
+) RETURNS void
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+  IF p_month IS NULL OR p_type IS NULL OR p_count = 0 THEN
+    RETURN;
+  END IF;
+
+  INSERT INTO public.transactions_monthly AS tm (month, type, category_l1, total_value, transaction_count)
+  VALUES (p_month, p_type, p_category_l1, p_value, p_count)
+  ON CONFLICT (month, type, category_l1) DO UPDATE
+    SET total_value = tm.total_value + EXCLUDED.total_value,
+        transaction_count = tm.transaction_count + EXCLUDED.transaction_count,
+        updated_at = now();
+
+  DELETE FROM public.transactions_monthly
+  WHERE month = p_month AND type = p_type AND category_l1 = p_category_l1 AND transaction_count <= 0;
+END;
+$$;
+
+-- Categoria de um ticker: asset_categories não tem ticker único, vale a linha de menor id
+-- (a mesma regra no trigger de transactions, no de asset_categories e na carga inicial)
+CREATE OR REPLACE FUNCTION public.transactions_monthly_category(p_ticker text) RETURNS text
+LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public AS $$
+  SELECT COALESCE((SELECT COALESCE(category_l1, 'Unknown') FROM public.asset_categories
+                   WHERE ticker = p_ticker ORDER BY id LIMIT 1), 'Unknown');
+$$;
+
+-- Trigger de transactions: desfaz a linha antiga e aplica a nova
+CREATE OR REPLACE FUNCTION public.transactions_monthly_on_transaction() RETURNS trigger
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.transaction_date IS NOT NULL THEN
+    PERFORM public.transactions_monthly_add(
+      left(OLD.transaction_date::text, 7), OLD.type, public.transactions_monthly_category(OLD.ticker),
+      -COALESCE(OLD.total_value, 0), -1);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.transaction_date IS NOT NULL THEN
+    PERFORM public.transactions_monthly_add(
+      left(NEW.transaction_date::text, 7), NEW.type, public.transactions_monthly_category(NEW.ticker),
+      COALESCE(NEW.total_value, 0), 1);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_transactions_monthly
+AFTER INSERT OR UPDATE OR DELETE ON public.transactions
+FOR EACH ROW EXECUTE FUNCTION public.transactions_monthly_on_transaction();
+
+-- Move as transações de um ticker de uma categoria para outra
+CREATE OR REPLACE FUNCTION public.transactions_monthly_move(p_ticker text, p_from text, p_to text) RETURNS void
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+  r record;
+BEGIN
+  IF p_ticker IS NULL OR p_from = p_to THEN
+    RETURN;
+  END IF;
+  FOR r IN
+    SELECT left(transaction_date::text, 7) AS month, type, SUM(COALESCE(total_value, 0)) AS total, COUNT(*)::integer AS cnt
+    FROM public.transactions
+    WHERE ticker = p_ticker AND transaction_date IS NOT NULL
+    GROUP BY 1, 2
+  LOOP
+    PERFORM public.transactions_monthly_add(r.month, r.type, p_from, -r.total, -r.cnt);
+    PERFORM public.transactions_monthly_add(r.month, r.type, p_to, r.total, r.cnt);
+  END LOOP;
+END;
+$$;
+
+-- Trigger de asset_categories: compara a categoria efetiva (linha de menor id) de cada ticker
+-- afetado antes e depois da mudança e só move os totais quando ela mudou
+-- (ex.: inserir uma segunda linha para um ticker já categorizado não move nada)
+CREATE OR REPLACE FUNCTION public.transactions_monthly_on_category() RETURNS trigger
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+  old_id bigint := CASE WHEN TG_OP = 'INSERT' THEN NULL ELSE OLD.id END;
+  old_ticker text := CASE WHEN TG_OP = 'INSERT' THEN NULL ELSE OLD.ticker END;
+  old_category text := CASE WHEN TG_OP = 'INSERT' THEN NULL ELSE COALESCE(OLD.category_l1, 'Unknown') END;
+  new_id bigint := CASE WHEN TG_OP = 'DELETE' THEN NULL ELSE NEW.id END;
+  new_ticker text := CASE WHEN TG_OP = 'DELETE' THEN NULL ELSE NEW.ticker END;
+  affected text;
+  before_category text;
+BEGIN
+  IF TG_OP = 'UPDATE' AND old_ticker IS NOT DISTINCT FROM new_ticker
+     AND OLD.category_l1 IS NOT DISTINCT FROM NEW.category_l1 THEN
+    RETURN NULL;
+  END IF;
+
+  FOR affected IN SELECT DISTINCT t FROM unnest(ARRAY[old_ticker, new_ticker]) AS t WHERE t IS NOT NULL LOOP
+    -- Estado anterior: linhas atuais do ticker sem a nova versão da linha, mais a versão antiga
+    SELECT COALESCE((
+      SELECT category FROM (
+        SELECT id, COALESCE(category_l1, 'Unknown') AS category
+        FROM public.asset_categories
+        WHERE ticker = affected AND id IS DISTINCT FROM new_id
+        UNION ALL
+        SELECT old_id, old_category WHERE old_ticker = affected
+      ) previous
+      ORDER BY id LIMIT 1), 'Unknown')
+    INTO before_category;
+
+    PERFORM public.transactions_monthly_move(affected, before_category, public.transactions_monthly_category(affected));
+  END LOOP;
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER trg_transactions_monthly_categories
+AFTER INSERT OR DELETE OR UPDATE OF ticker, category_l1 ON public.asset_categories
+FOR EACH ROW EXECUTE FUNCTION public.transactions_monthly_on_category();
+
+-- Carga inicial a partir do histórico
+INSERT INTO public.transactions_monthly (month, type, category_l1, total_value, transaction_count)
+SELECT left(t.transaction_date::text, 7), t.type, public.transactions_monthly_category(t.ticker),
+       SUM(COALESCE(t.total_value, 0)), COUNT(*)
+FROM public.transactions t
+WHERE t.transaction_date IS NOT NULL AND t.type IS NOT NULL
+GROUP BY 1, 2, 3;
+
+-- RLS (Row Level Security) - leitura liberada; escrita só pelos triggers (SECURITY DEFINER)
+ALTER TABLE public.transactions_monthly ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Enable read access for all users" ON public.transactions_monthly
+FOR SELECT USING (true);
+
+-- Comentários
+COMMENT ON TABLE public.transactions_monthly IS 'Totais mensais de transactions por tipo e category_l1, mantidos por triggers';
+COMMENT ON COLUMN public.transactions_monthly.month IS 'Mês da transação (YYYY-MM)';
+COMMENT ON COLUMN public.transactions_monthly.type IS 'Tipo da transação (Compra, Venda)';
+COMMENT ON COLUMN public.transactions_monthly.category_l1 IS 'category_l1 do ticker em asset_categories (linha de menor id; Unknown quando não categorizado)';
+COMMENT ON COLUMN public.transactions_monthly.total_value IS 'Soma de total_value das transações da célula';
+COMMENT ON COLUMN public.transactions_monthly.transaction_count IS 'Quantidade de transações da célula';
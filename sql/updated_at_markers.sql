@@ -0,0 +1,46 @@
+-- Coluna updated_at mantida por trigger em transactions, dividends, asset_categories e portfolio_evolution
+-- Usada pelas versões de dados da API (_data_version): (contagem, max(updated_at)) muda em
+-- qualquer insert, edição ou exclusão, ao contrário de (contagem, max(id))
+
+-- Trigger genérico: carimba a linha alterada
+CREATE OR REPLACE FUNCTION public.set_updated_at() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  NEW.updated_at := now();
+  RETURN NEW;
+END;
+$$;
+
+-- transactions
+ALTER TABLE public.transactions ADD COLUMN IF NOT EXISTS updated_at timestamp with time zone NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS idx_transactions_updated_at ON public.transactions(updated_at);
+CREATE TRIGGER trg_transactions_updated_at
+BEFORE INSERT OR UPDATE ON public.transactions
+FOR EACH ROW EXECUTE FUNCTION public.set_updated_at();
+
+-- dividends
+ALTER TABLE public.dividends ADD COLUMN IF NOT EXISTS updated_at timestamp with time zone NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS idx_dividends_updated_at ON public.dividends(updated_at);
+CREATE TRIGGER trg_dividends_updated_at
+BEFORE INSERT OR UPDATE ON public.dividends
+FOR EACH ROW EXECUTE FUNCTION public.set_updated_at();
+
+-- asset_categories
+ALTER TABLE public.asset_categories ADD COLUMN IF NOT EXISTS updated_at timestamp with time zone NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS idx_asset_categories_updated_at ON public.asset_categories(updated_at);
+CREATE TRIGGER trg_asset_categories_updated_at
+BEFORE INSERT OR UPDATE ON public.asset_categories
+FOR EACH ROW EXECUTE FUNCTION public.set_updated_at();
+
+-- portfolio_evolution (o snapshot do dia é regravado no lugar ao longo do dia)
+ALTER TABLE public.portfolio_evolution ADD COLUMN IF NOT EXISTS updated_at timestamp with time zone NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS idx_portfolio_evolution_updated_at ON public.portfolio_evolution(updated_at);
+CREATE TRIGGER trg_portfolio_evolution_updated_at
+BEFORE INSERT OR UPDATE ON public.portfolio_evolution
+FOR EACH ROW EXECUTE FUNCTION public.set_updated_at();
+
+-- Comentários
+COMMENT ON COLUMN public.transactions.updated_at IS 'Última inserção/edição da linha (trigger set_updated_at)';
+COMMENT ON COLUMN public.dividends.updated_at IS 'Última inserção/edição da linha (trigger set_updated_at)';
+COMMENT ON COLUMN public.asset_categories.updated_at IS 'Última inserção/edição da linha (trigger set_updated_at)';
+COMMENT ON COLUMN public.portfolio_evolution.updated_at IS 'Última inserção/edição da linha (trigger set_updated_at)';